@@ -0,0 +1,17 @@
+import numpy as np
+
+
+def stack_images(images):
+    """(N, H, W, C) array when every image has the same shape, otherwise the list unchanged"""
+    if isinstance(images, np.ndarray):
+        return images
+    images = list(images)
+    if images and all(img.shape == images[0].shape and img.dtype == images[0].dtype for img in images):
+        return np.stack(images)
+    return images
+
+
+def transform_each(op, images, bboxes_list):
+    """transform_batch fallback for ops that can't vectorize: op.transform on every image in turn"""
+    results = [op.transform(img, bboxes) for img, bboxes in zip(images, bboxes_list)]
+    return stack_images([img for img, _ in results]), [bboxes for _, bboxes in results]
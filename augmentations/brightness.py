@@ -1,23 +1,41 @@
+import cv2
 import numpy as np
-from PIL import Image
-import torchvision.transforms.functional as F
-import random
+from augmentations.batch import transform_each
 
 class AdjustBrightness:
-    def __init__(self, brightness_min=0.8, brightness_max=1.2):
+    def __init__(self, brightness_min=0.8, brightness_max=1.2, rng=None):
         assert 0.5 <= brightness_min <= brightness_max <= 2.0, "Ngưỡng sáng nên nằm trong [0.5, 2.0]"
         self.brightness_min = brightness_min
         self.brightness_max = brightness_max
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def sample_factor(self):
+        return self.brightness_min if self.brightness_min == self.brightness_max \
+            else self.rng.uniform(self.brightness_min, self.brightness_max)
+
+    @staticmethod
+    def luts(factors):
+        """(N, 256) uint8 tables, one per factor"""
+        # Same result as PIL ImageEnhance.Brightness (blend with black, truncated) through a lookup table
+        lut = np.arange(256, dtype=np.float32) * np.asarray(factors, dtype=np.float32).reshape(-1, 1)
+        return np.clip(lut, 0, 255).astype(np.uint8)
 
     def transform(self, img, bboxes):
-        brightness_factor = self.brightness_min if self.brightness_min == self.brightness_max \
-            else random.uniform(self.brightness_min, self.brightness_max)
+        img = cv2.LUT(img, self.luts([self.sample_factor()])[0])
+
+        return img, bboxes
 
-        if isinstance(img, np.ndarray):
-            img = Image.fromarray(img[..., ::-1])
-            img = F.adjust_brightness(img, brightness_factor)
-            img = np.asarray(img)[..., ::-1]
-        else:
-            img = F.adjust_brightness(img, brightness_factor)
+    def transform_tiled(self, img, bboxes, tiler):
+        """transform() in place on img: a lookup table needs no temporaries, so no strips either"""
+        cv2.LUT(img, self.luts([self.sample_factor()])[0], dst=img)
+        return img, bboxes
 
-        return img, bboxes
\ No newline at end of file
+    def transform_batch(self, images, bboxes_list):
+        """One factor per image, like calling transform() on each; the tables are built in one go"""
+        if not isinstance(images, np.ndarray):
+            return transform_each(self, images, bboxes_list)
+        luts = self.luts([self.sample_factor() for _ in range(len(images))])
+        out = np.empty_like(images)
+        for img, lut, dst in zip(images, luts, out):
+            cv2.LUT(img, lut, dst=dst)
+        return out, bboxes_list
@@ -1,24 +1,48 @@
-import torchvision.transforms.functional as F
 import numpy as np
 import cv2
-from PIL import Image
-import random
+from utils.utils import bgr_to_gray
+from augmentations.batch import transform_each
 
 class AdjustContrast:
-    def __init__(self, contrast_min=0.8, contrast_max=1.2):
+    def __init__(self, contrast_min=0.8, contrast_max=1.2, rng=None):
         assert 0.5 <= contrast_min <= contrast_max <= 2.0, "Ngưỡng contrast nên nằm trong [0.5, 2.0]"
         self.contrast_min = contrast_min
         self.contrast_max = contrast_max
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def sample_factor(self):
+        return self.contrast_min if self.contrast_min == self.contrast_max \
+            else self.rng.uniform(self.contrast_min, self.contrast_max)
+
+    @staticmethod
+    def lut(gray, contrast_factor, mean=None):
+        # PIL ImageEnhance.Contrast: blend with the rounded mean gray level, as a lookup table
+        mean = np.float32(int((cv2.mean(gray)[0] if mean is None else mean) + 0.5))
+        lut = mean + np.float32(contrast_factor) * (np.arange(256, dtype=np.float32) - mean)
+        return np.clip(lut, 0, 255).astype(np.uint8)
 
     def transform(self, img, bboxes):
-        contrast_factor = self.contrast_min if self.contrast_min == self.contrast_max \
-            else random.uniform(self.contrast_min, self.contrast_max)
+        contrast_factor = self.sample_factor()
+        img = cv2.LUT(img, self.lut(bgr_to_gray(img), contrast_factor))
+
+        return img, bboxes
 
-        if isinstance(img, np.ndarray):
-            img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-            img = F.adjust_contrast(img, contrast_factor)
-            img = np.asarray(img)[..., ::-1]
-        else:
-            img = F.adjust_contrast(img, contrast_factor)
+    def transform_tiled(self, img, bboxes, tiler):
+        """transform() in place; the mean gray level is summed strip by strip (cv2.mean scales the sum the same way)"""
+        contrast_factor = self.sample_factor()
+        total = sum(cv2.sumElems(bgr_to_gray(img[y0:y1]))[0] for y0, y1, _, _ in tiler.strips(img.shape, 1))
+        mean = total * (1. / (img.shape[0] * img.shape[1]))
+        cv2.LUT(img, self.lut(None, contrast_factor, mean), dst=img)
+        return img, bboxes
 
-        return img, bboxes
\ No newline at end of file
+    def transform_batch(self, images, bboxes_list):
+        """One factor per image, like calling transform() on each; grayscale of the whole batch in one call"""
+        if not isinstance(images, np.ndarray) or images.ndim != 4:
+            return transform_each(self, images, bboxes_list)
+        n, h = images.shape[:2]
+        factors = [self.sample_factor() for _ in range(n)]
+        gray = bgr_to_gray(np.ascontiguousarray(images).reshape((n * h,) + images.shape[2:])).reshape(n, h, -1)
+        out = np.empty_like(images)
+        for img, img_gray, factor, dst in zip(images, gray, factors, out):
+            cv2.LUT(img, self.lut(img_gray, factor), dst=dst)
+        return out, bboxes_list
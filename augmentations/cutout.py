@@ -1,30 +1,48 @@
-import random
+import numpy as np
+from augmentations.batch import transform_each
 
 class Cutout:
-    def __init__(self, amount=0.3):
+    def __init__(self, amount=0.3, rng=None):
         assert 0.0 <= amount <= 1.0, "amount nên nằm trong [0.0, 1.0]"
         self.amount = amount
+        self.rng = rng if rng is not None else np.random.default_rng()
 
     def transform(self, img, bboxes):
         img = img.copy()
+        return img, self._cut(img, bboxes)
+
+    def transform_tiled(self, img, bboxes, tiler):
+        """transform() in place on img, without the copy"""
+        return img, self._cut(img, bboxes)
+
+    def transform_batch(self, images, bboxes_list):
+        """Like transform() on each image, with one copy of the whole batch instead of one per image"""
+        if not isinstance(images, np.ndarray):
+            return transform_each(self, images, bboxes_list)
+        out = images.copy()
+        return out, [self._cut(img, bboxes) for img, bboxes in zip(out, bboxes_list)]
+
+    def _cut(self, img, bboxes):
+        """Zero random patches inside some of the boxes, in place"""
         bboxes = list(bboxes)
         num_select = max(1, round(self.amount * len(bboxes)))
         if len(bboxes) == 0:
-            return img, bboxes
+            return bboxes
 
-        ran_select = random.sample(bboxes, min(num_select, len(bboxes)))
+        select_idx = self.rng.choice(len(bboxes), min(num_select, len(bboxes)), replace=False)
+        ran_select = [bboxes[i] for i in select_idx]
 
         for box in ran_select:
             x1, y1, x2, y2 = map(int, box[:4])
             w, h = x2 - x1, y2 - y1
-            mask_w = int(w * random.uniform(0.2, 0.7))
-            mask_h = int(h * random.uniform(0.2, 0.7))
+            mask_w = int(w * self.rng.uniform(0.2, 0.7))
+            mask_h = int(h * self.rng.uniform(0.2, 0.7))
             if mask_w == 0 or mask_h == 0:
                 continue
-            mask_x1 = random.randint(x1, x2 - mask_w)
-            mask_y1 = random.randint(y1, y2 - mask_h)
+            mask_x1 = int(self.rng.integers(x1, x2 - mask_w + 1))
+            mask_y1 = int(self.rng.integers(y1, y2 - mask_h + 1))
             mask_x2 = mask_x1 + mask_w
             mask_y2 = mask_y1 + mask_h
             img[mask_y1:mask_y2, mask_x1:mask_x2, :] = 0
 
-        return img, bboxes
\ No newline at end of file
+        return bboxes
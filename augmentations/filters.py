@@ -1,26 +1,49 @@
 import cv2
-import random
+import numpy as np
+from augmentations.batch import transform_each
+
+FILTER_TYPES = ("blur", "gaussian", "median")
 
 class Filters:
-    def __init__(self):
-        pass
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
 
-    def transform(self, img, bboxes):
-        filter_list = ["blur", "gaussian", "median"]
-        f_type = random.choice(filter_list)
+    def sample_filter(self, h):
+        """(filter type, odd kernel size) for an image of height h"""
+        f_type = FILTER_TYPES[self.rng.integers(len(FILTER_TYPES))]
 
-        temp = max(3, int(img.shape[0] / 100))
+        temp = max(3, int(h / 100))
         fsize = temp if temp % 2 == 1 else temp + 1
+        return f_type, fsize
 
-        image = img.copy()
+    @staticmethod
+    def apply(img, f_type, fsize):
         if fsize < 3:
-            return image, bboxes
+            return img.copy()
 
         if f_type == "blur":
-            return cv2.blur(image, (fsize, fsize)), bboxes
+            return cv2.blur(img, (fsize, fsize))
         elif f_type == "gaussian":
-            return cv2.GaussianBlur(image, (fsize, fsize), 0), bboxes
+            return cv2.GaussianBlur(img, (fsize, fsize), 0)
         elif f_type == "median":
-            return cv2.medianBlur(image, fsize), bboxes
+            return cv2.medianBlur(img, fsize)
         else:
-            return image, bboxes
\ No newline at end of file
+            return img.copy()
+
+    def transform(self, img, bboxes):
+        f_type, fsize = self.sample_filter(img.shape[0])
+        return self.apply(img, f_type, fsize), bboxes
+
+    def transform_tiled(self, img, bboxes, tiler):
+        """transform() strip by strip. Each strip is filtered with fsize // 2 rows of halo from its
+        neighbours, so the rows kept are the same as filtering the whole image"""
+        f_type, fsize = self.sample_filter(img.shape[0])
+        img_out = np.empty_like(img)
+        channels = img.shape[2] if img.ndim == 3 else 1
+        for y0, y1, top, bottom in tiler.strips(img.shape, bytes_per_pixel=channels, halo=fsize // 2):
+            img_out[y0:y1] = self.apply(img[top:bottom], f_type, fsize)[y0 - top:y1 - top]
+        return img_out, bboxes
+
+    def transform_batch(self, images, bboxes_list):
+        """Per image: filtering the batch as one tall image would blur across image borders"""
+        return transform_each(self, images, bboxes_list)
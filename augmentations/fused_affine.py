@@ -0,0 +1,103 @@
+import cv2
+import numpy as np
+from utils.utils import get_corners, get_enclosing_box, clip_box
+from augmentations.batch import transform_each
+
+# Matrices from get_matrix() use the bbox convention (pixel i spans [i, i + 1)),
+# warpAffine samples at pixel centres, so conjugate by a half-pixel shift
+_TO_EDGE = np.array([[1, 0, 0.5], [0, 1, 0.5], [0, 0, 1]], dtype=np.float64)
+_TO_CENTER = np.array([[1, 0, -0.5], [0, 1, -0.5], [0, 0, 1]], dtype=np.float64)
+
+
+def affine_maps(M_inv, x0, x1, y0, y1, out=None):
+    """cv2.remap float32 maps of output pixels [x0, x1) x [y0, y1) under the 2x3 output -> input matrix M_inv.
+
+    Every coordinate is computed from its absolute pixel position in float64, so a strip's maps do
+    not depend on how the output was split.
+    """
+    xs = np.arange(x0, x1, dtype=np.float64)
+    ys = np.arange(y0, y1, dtype=np.float64)
+    maps = out if out is not None else np.empty((2, y1 - y0, x1 - x0), dtype=np.float32)
+    for k in range(2):
+        np.add((M_inv[k, 0] * xs)[None, :], (M_inv[k, 1] * ys + M_inv[k, 2])[:, None], out=maps[k],
+               casting='same_kind')
+    return maps
+
+
+def is_geometric(augmentation):
+    """True for ops that can be expressed as an affine matrix (they implement get_matrix)"""
+    return hasattr(augmentation, 'get_matrix')
+
+
+class FusedAffine:
+    """Apply a chain of geometric ops (Rotate, Scale, Shear, Translate, HorizontalFlip) as one warp.
+
+    The random matrices of the ops are composed into a single 3x3 transform, the image is
+    resampled once with cv2.warpAffine and the bbox corners are transformed once.
+
+    Boxes are clipped once, at the end, with the strictest `clip_alpha` of the chain (each op's
+    own threshold, None for ops that never clip), unless clip_alpha is given. A single fused op
+    therefore drops the same boxes as the op itself. A chain can differ from running the ops one
+    by one, which clip (and re-enclose rotated boxes) after every step.
+    """
+
+    def __init__(self, augmentations, clip_alpha=None):
+        assert all(is_geometric(aug) for aug in augmentations), "FusedAffine chỉ nhận các phép biến đổi hình học"
+        self.augmentations = augmentations
+        if clip_alpha is None:
+            clip_alpha = max((aug.clip_alpha for aug in augmentations if getattr(aug, 'clip_alpha', None) is not None),
+                             default=None)
+        self.clip_alpha = clip_alpha
+
+    def get_matrix(self, h, w):
+        M = np.eye(3)
+        for augmentation in self.augmentations:
+            M_aug, (w, h) = augmentation.get_matrix(h, w)
+            M = M_aug @ M
+        return M, (w, h)
+
+    def transform(self, img, bboxes):
+        M, (w, h) = self.get_matrix(*img.shape[:2])
+
+        img_out = np.empty((h, w) + img.shape[2:], dtype=img.dtype)
+        cv2.warpAffine(img, (_TO_CENTER @ M @ _TO_EDGE)[:2], (w, h), dst=img_out)
+        return img_out, self._transform_bboxes(bboxes, M, w, h)
+
+    def transform_tiled(self, img, bboxes, tiler):
+        """transform() with the warp done as one cv2.remap per output strip (see augmentations.tiled).
+
+        Only the strip's float32 maps are held besides the input and output. Remap coordinates are
+        computed in float64 rather than with warpAffine's internal arithmetic, so a few pixels may
+        differ by a rounding step from transform(); the output does not depend on the strip size.
+        With tiler.exact this is transform() itself.
+        """
+        if tiler.exact:
+            return self.transform(img, bboxes)
+        M, (w, h) = self.get_matrix(*img.shape[:2])
+        M_inv = cv2.invertAffineTransform((_TO_CENTER @ M @ _TO_EDGE)[:2])
+
+        img_out = np.empty((h, w) + img.shape[2:], dtype=img.dtype)
+        maps = None
+        for y0, y1, _, _ in tiler.strips((h, w), bytes_per_pixel=8):
+            if maps is None or maps.shape[1] != y1 - y0:
+                maps = np.empty((2, y1 - y0, w), dtype=np.float32)
+            affine_maps(M_inv, 0, w, y0, y1, out=maps)
+            cv2.remap(img, maps[0], maps[1], cv2.INTER_LINEAR, dst=img_out[y0:y1])
+        return img_out, self._transform_bboxes(bboxes, M, w, h)
+
+    def _transform_bboxes(self, bboxes, M, w, h):
+        bboxes = np.asarray(bboxes, dtype=np.float32)
+        if bboxes.ndim != 2 or len(bboxes) == 0:
+            return bboxes
+
+        corners = get_corners(bboxes).reshape(-1, 2)
+        corners = corners @ M[:2, :2].T + M[:2, 2]
+        corners = np.hstack((corners.reshape(-1, 8), bboxes[:, 4:]))
+        bboxes_out = get_enclosing_box(corners).astype(np.float32)
+        if self.clip_alpha is None:
+            return bboxes_out
+        return clip_box(bboxes_out, [0, 0, w, h], self.clip_alpha)
+
+    def transform_batch(self, images, bboxes_list):
+        """Per-image fallback, see augmentations.batch.transform_each"""
+        return transform_each(self, images, bboxes_list)
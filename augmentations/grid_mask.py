@@ -1,59 +1,172 @@
+import functools
+import cv2
 import numpy as np
-from PIL import Image
+from utils.utils import get_pil_rotation_matrix
+from augmentations.batch import transform_each
+from augmentations.fused_affine import affine_maps
+
+# Rotated masks are cached as bool arrays (1 byte per pixel), e.g. ~2 MB each at 1080p
+MASK_CACHE_SIZE = 32
+# Larger masks (4K images, whole canvases in exact tiled mode) are rebuilt on every call instead,
+# so the cache holds at most MASK_CACHE_SIZE * MASK_CACHE_MAX_PIXELS bytes (~66 MB) per process
+MASK_CACHE_MAX_PIXELS = 1920 * 1080
+
+
+def _stripes(size, d, l, st):
+    """Bool vector over an oversized mask side: True on the stripes [d * i + st, d * i + st + l), i < size // d"""
+    idx = np.arange(size) - st
+    return (idx >= 0) & (idx < d * (size // d)) & (idx % d < l)
+
+
+def rotated_grid_mask(h, w, d, l, offsets, angle, use_h=True, use_w=True, mode=0):
+    """Bool (h, w) array, True where GridMask zeroes the image, for a grid rotated by `angle` degrees.
+
+    The grid is drawn on a 1.5x oversized canvas, rotated like PIL's Image.rotate (nearest,
+    corners filled as masked) and centre-cropped. The result is read-only, and cached up to
+    MASK_CACHE_MAX_PIXELS pixels.
+    """
+    if h * w > MASK_CACHE_MAX_PIXELS:
+        return _build_rotated_grid_mask(h, w, d, l, offsets, angle, use_h, use_w, mode)
+    return _cached_rotated_grid_mask(h, w, d, l, offsets, angle, use_h, use_w, mode)
+
+
+def _build_rotated_grid_mask(h, w, d, l, offsets, angle, use_h, use_w, mode):
+    hh, ww = int(1.5 * h), int(1.5 * w)
+    st_h, st_w = offsets
+    rows = _stripes(hh, d, l, st_h) if use_h else np.zeros(hh, bool)
+    cols = _stripes(ww, d, l, st_w) if use_w else np.zeros(ww, bool)
+    keep = np.logical_not(rows[:, None] | cols[None, :]).view(np.uint8)
+
+    keep = cv2.warpAffine(keep, _crop_rotation_matrix(h, w, angle), (w, h),
+                          flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+    mask = keep == 0 if mode == 0 else keep != 0
+    mask.flags.writeable = False
+    return mask
+
+
+_cached_rotated_grid_mask = functools.lru_cache(maxsize=MASK_CACHE_SIZE)(_build_rotated_grid_mask)
+
+
+def _crop_rotation_matrix(h, w, angle):
+    """Output -> oversized canvas mapping: warp straight into the centre crop by shifting with the crop offset"""
+    hh, ww = int(1.5 * h), int(1.5 * w)
+    M = get_pil_rotation_matrix(ww, hh, angle)
+    M[:, 2] += M[:, :2] @ [(ww - w) // 2, (hh - h) // 2]
+    return M
+
+
+def rotated_grid_mask_rows(h, w, d, l, offsets, angle, y0, y1, use_h=True, use_w=True, mode=0):
+    """Rows y0:y1 of rotated_grid_mask, sampling the stripes at each pixel's rounded canvas position
+    instead of warping the oversized canvas. A pixel right on a stripe edge may round the other way
+    than warpAffine's fixed-point coordinates."""
+    hh, ww = int(1.5 * h), int(1.5 * w)
+    st_h, st_w = offsets
+    rows = _stripes(hh, d, l, st_h) if use_h else np.zeros(hh, bool)
+    cols = _stripes(ww, d, l, st_w) if use_w else np.zeros(ww, bool)
+
+    maps = affine_maps(_crop_rotation_matrix(h, w, angle), 0, w, y0, y1)
+    ix = np.floor(maps[0] + 0.5).astype(np.int32)
+    iy = np.floor(maps[1] + 0.5).astype(np.int32)
+    del maps
+    # Outside the canvas counts as masked, like warpAffine's zero border on the keep image
+    inside = (ix >= 0) & (ix < ww) & (iy >= 0) & (iy < hh)
+    masked = ~inside | rows.take(iy, mode='clip') | cols.take(ix, mode='clip')
+    return masked if mode == 0 else ~masked
+
 
 class GridMask:
-    def __init__(self, use_h=True, use_w=True, rotate=1, offset=False, ratio=0.5, mode=0, prob=0.7):
+    def __init__(self, use_h=True, use_w=True, rotate=1, offset=False, ratio=0.5, mode=0, prob=0.7, rng=None):
         assert 0 < ratio < 1, "ratio nên nằm trong (0, 1)"
         assert 0 <= prob <= 1, "prob nên nằm trong [0, 1]"
         self.use_h = use_h
         self.use_w = use_w
         self.rotate = max(1, int(rotate))
+        # Random offsets in [-1, 1) truncate to 0 on uint8 images, so masked pixels are 0 either way
         self.offset = offset
         self.ratio = ratio
         self.mode = mode
         self.prob = prob
+        self.rng = rng if rng is not None else np.random.default_rng()
 
     def set_prob(self, prob=0.5):
         assert 0 <= prob <= 1, "prob nên nằm trong [0, 1]"
         self.prob = prob
 
-    def transform(self, img, bboxes):
-        if np.random.rand() > self.prob:
+    def sample_params(self, h, w):
+        """(d, l, (st_h, st_w), angle) of the grid for an h x w image, or None when it is skipped"""
+        if self.rng.random() > self.prob:
+            return None
+
+        d1, d2 = 2, min(h, w)
+        d = int(self.rng.integers(d1, d2))
+        l = int(self.rng.integers(1, d)) if self.ratio == 1 else min(max(int(d * self.ratio + 0.5), 1), d - 1)
+        st_h, st_w = int(self.rng.integers(d)), int(self.rng.integers(d))
+        r = int(self.rng.integers(self.rotate))
+        return d, l, (st_h, st_w), r
+
+    def transform(self, img, bboxes, out=None):
+        """img with the grid stripes zeroed, as a new image or written into `out` (pass out=img for in place)"""
+        if out is None:
+            out = img.copy()
+        elif out is not img:
+            np.copyto(out, img)
+        params = self.sample_params(*img.shape[:2])
+        if params is None:
+            return out, bboxes
+
+        h, w = img.shape[:2]
+        d, l, offsets, r = params
+        if r != 0:
+            mask = rotated_grid_mask(h, w, d, l, offsets, r, self.use_h, self.use_w, self.mode)
+        else:
+            mask = self._separable_mask(h, w, d, l, offsets, 0, h)
+
+        # out - out under a single-channel mask zeroes the masked pixels in place
+        cv2.subtract(out, out, dst=out, mask=mask.view(np.uint8))
+        return out, bboxes
+
+    def transform_tiled(self, img, bboxes, tiler):
+        """transform() strip by strip, building only each strip's mask (no oversized canvas).
+
+        A rotated grid is built whole, as in transform(), when tiler.exact (see augmentations.tiled).
+        """
+        params = self.sample_params(*img.shape[:2])
+        if params is None:
             return img, bboxes
 
         h, w = img.shape[:2]
-        d1, d2 = 2, min(h, w)
+        d, l, offsets, r = params
+        if r != 0 and tiler.exact:
+            mask = rotated_grid_mask(h, w, d, l, offsets, r, self.use_h, self.use_w, self.mode)
+            cv2.subtract(img, img, dst=img, mask=mask.view(np.uint8))
+            return img, bboxes
+        for y0, y1, _, _ in tiler.strips(img.shape, bytes_per_pixel=24 if r != 0 else 1):
+            if r != 0:
+                mask = rotated_grid_mask_rows(h, w, d, l, offsets, r, y0, y1, self.use_h, self.use_w, self.mode)
+            else:
+                mask = self._separable_mask(h, w, d, l, offsets, y0, y1)
+            strip = img[y0:y1]
+            cv2.subtract(strip, strip, dst=strip, mask=mask.view(np.uint8))
+        return img, bboxes
+
+    def _separable_mask(self, h, w, d, l, offsets, y0, y1):
+        """Rows y0:y1 of the unrotated mask: stripes of the centre crop combined by an outer OR"""
         hh, ww = int(1.5 * h), int(1.5 * w)
-        d = np.random.randint(d1, d2)
-        l = np.random.randint(1, d) if self.ratio == 1 else min(max(int(d * self.ratio + 0.5), 1), d - 1)
-
-        mask = np.ones((hh, ww), np.float32)
-        st_h, st_w = np.random.randint(d), np.random.randint(d)
-        if self.use_h:
-            for i in range(hh // d):
-                s, t = d * i + st_h, min(d * i + st_h + l, hh)
-                mask[s:t, :] = 0
-        if self.use_w:
-            for i in range(ww // d):
-                s, t = d * i + st_w, min(d * i + st_w + l, ww)
-                mask[:, s:t] = 0
-
-        r = np.random.randint(self.rotate)
-        mask_img = Image.fromarray(np.uint8(mask * 255))
-        mask_img = mask_img.rotate(r)
-        mask = np.asarray(mask_img) / 255.0
-        mask = mask[(hh - h) // 2:(hh - h) // 2 + h, (ww - w) // 2:(ww - w) // 2 + w]
-
-        if self.mode == 1:
-            mask = 1 - mask
-        mask = np.expand_dims(mask.astype(np.float32), axis=2)
-        mask = np.tile(mask, [1, 1, 3])
-
-        if self.offset:
-            offset = 2 * (np.random.rand(h, w, 3) - 0.5)
-            img = img * mask + (1 - mask) * offset
-        else:
-            img = img * mask
+        top, left = (hh - h) // 2, (ww - w) // 2
+        st_h, st_w = offsets
+        rows = _stripes(hh, d, l, st_h)[top + y0:top + y1] if self.use_h else np.zeros(y1 - y0, bool)
+        cols = _stripes(ww, d, l, st_w)[left:left + w] if self.use_w else np.zeros(w, bool)
+        return rows[:, None] | cols[None, :] if self.mode == 0 else ~rows[:, None] & ~cols[None, :]
 
-        img = img.astype(np.uint8)
-        return img, bboxes
\ No newline at end of file
+    def transform_batch(self, images, bboxes_list, out=None):
+        """transform() on every image of the batch, with one copy of the whole batch (or into `out`)"""
+        if not isinstance(images, np.ndarray) or images.ndim != 4:
+            return transform_each(self, images, bboxes_list)
+        if out is None:
+            out = images.copy()
+        elif out is not images:
+            np.copyto(out, images)
+        for img in out:
+            self.transform(img, None, out=img)
+        return out, bboxes_list
@@ -1,23 +1,45 @@
 import numpy as np
+from augmentations.batch import transform_each
 
 class HorizontalFlip:
-    def __init__(self):
-        pass
+    # Output canvas holds every box, nothing is clipped (see FusedAffine)
+    clip_alpha = None
+
+    def __init__(self, rng=None):
+        self.rng = rng
+
+    def get_matrix(self, h, w):
+        """3x3 matrix equivalent to transform(), and the (width, height) of its output"""
+        return np.array([[-1, 0, w], [0, 1, 0], [0, 0, 1]], dtype=np.float64), (w, h)
 
     def transform(self, img, bboxes):
         img_flipped = img[:, ::-1, :]
+        return img_flipped, self._flip_bboxes(bboxes, img.shape[1])
+
+    def transform_tiled(self, img, bboxes, tiler):
+        """transform(): the flip is a strided view, no copy to tile"""
+        return self.transform(img, bboxes)
+
+    def transform_batch(self, images, bboxes_list):
+        """Flip a (N, H, W, C) batch as one strided view"""
+        if not isinstance(images, np.ndarray):
+            return transform_each(self, images, bboxes_list)
+        w = images.shape[2]
+        return images[:, :, ::-1, :], [self._flip_bboxes(bboxes, w) for bboxes in bboxes_list]
+
+    @staticmethod
+    def _flip_bboxes(bboxes, w):
         if bboxes is None or len(bboxes) == 0:
-            return img_flipped, bboxes
+            return bboxes
 
         bboxes = np.asarray(bboxes)
         if bboxes.ndim == 1:
             bboxes = bboxes.reshape(-1, 4)
 
-        w = img.shape[1]
         # Lật bbox theo chiều ngang
         x_min = w - bboxes[:, 2]
         x_max = w - bboxes[:, 0]
         bboxes[:, 0] = np.minimum(x_min, x_max)
         bboxes[:, 2] = np.maximum(x_min, x_max)
 
-        return img_flipped, bboxes
\ No newline at end of file
+        return bboxes
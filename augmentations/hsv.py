@@ -1,18 +1,35 @@
-import random
+import cv2
 import numpy as np
+from augmentations.batch import transform_each
+
+# Upper bound of each HSV channel (OpenCV hue is in [0, 179])
+_CHANNEL_MAX = np.array([179, 255, 255], dtype=np.int16)
 
 class RandomHSV:
-    def __init__(self, hue=10, saturation=30, brightness=30):
+    def __init__(self, hue=10, saturation=30, brightness=30, rng=None):
         # Đảm bảo các tham số là tuple (min, max)
         self.hue = (-hue, hue) if not isinstance(hue, tuple) else hue
         self.saturation = (-saturation, saturation) if not isinstance(saturation, tuple) else saturation
         self.brightness = (-brightness, brightness) if not isinstance(brightness, tuple) else brightness
+        self.rng = rng if rng is not None else np.random.default_rng()
 
-    def transform(self, img, bboxes):
+    def sample_offsets(self):
         # Random giá trị
-        h = random.randint(*self.hue) if self.hue[0] != self.hue[1] else self.hue[0]
-        s = random.randint(*self.saturation) if self.saturation[0] != self.saturation[1] else self.saturation[0]
-        v = random.randint(*self.brightness) if self.brightness[0] != self.brightness[1] else self.brightness[0]
+        h = int(self.rng.integers(self.hue[0], self.hue[1] + 1)) if self.hue[0] != self.hue[1] else self.hue[0]
+        s = int(self.rng.integers(self.saturation[0], self.saturation[1] + 1)) if self.saturation[0] != self.saturation[1] else self.saturation[0]
+        v = int(self.rng.integers(self.brightness[0], self.brightness[1] + 1)) if self.brightness[0] != self.brightness[1] else self.brightness[0]
+        return h, s, v
+
+    @staticmethod
+    def luts(offsets):
+        """(N, 256, 1, 3) uint8 tables, one per (h, s, v) offset triple"""
+        # Add-and-clip per channel is a 3-channel lookup table
+        offsets = np.asarray(offsets, dtype=np.int16).reshape(-1, 3)
+        luts = np.clip(np.arange(256, dtype=np.int16)[None, :, None] + offsets[:, None, :], 0, _CHANNEL_MAX)
+        return luts.astype(np.uint8).reshape(len(offsets), 256, 1, 3)
+
+    def transform(self, img, bboxes):
+        h, s, v = self.sample_offsets()
 
         img = img.astype(int)
         img[..., 0] = np.clip(img[..., 0] + h, 0, 179)
@@ -20,4 +37,19 @@ class RandomHSV:
         img[..., 2] = np.clip(img[..., 2] + v, 0, 255)
         img = img.astype(np.uint8)
 
-        return img, bboxes
\ No newline at end of file
+        return img, bboxes
+
+    def transform_tiled(self, img, bboxes, tiler):
+        """transform() in place as a lookup table, instead of the int64 copy of the whole image"""
+        cv2.LUT(img, self.luts([self.sample_offsets()])[0], dst=img)
+        return img, bboxes
+
+    def transform_batch(self, images, bboxes_list):
+        """Offsets drawn per image like transform(), applied as one lookup table per image"""
+        if not isinstance(images, np.ndarray) or images.ndim != 4 or images.shape[3] != 3:
+            return transform_each(self, images, bboxes_list)
+        luts = self.luts([self.sample_offsets() for _ in range(len(images))])
+        out = np.empty_like(images)
+        for img, lut, dst in zip(images, luts, out):
+            cv2.LUT(img, lut, dst=dst)
+        return out, bboxes_list
@@ -1,24 +1,42 @@
-import torchvision.transforms.functional as F
 import numpy as np
 import cv2
-from PIL import Image
-import random
+from augmentations.batch import transform_each
+from augmentations.tiled import apply_strips
 
 class LightingNoise:
-    def __init__(self):
-        pass
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
 
-    def transform(self, img, bboxes):
+    def sample_from_to(self):
+        """mixChannels pairs for a random channel permutation"""
         perms = [(0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0)]
-        swap = random.choice(perms)
+        swap = perms[self.rng.integers(len(perms))]
+
+        # swap indexes RGB channels, img is BGR: output channel k takes input channel 2 - swap[2 - k]
+        from_to = []
+        for k in range(3):
+            from_to += [2 - swap[2 - k], k]
+        return from_to
+
+    def transform(self, img, bboxes):
+        from_to = self.sample_from_to()
+        img_out = np.empty_like(img)
+        cv2.mixChannels([img], [img_out], from_to)
 
-        if isinstance(img, np.ndarray):
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(img)
+        return img_out, bboxes
 
-        img_tensor = F.to_tensor(img)
-        img_tensor = img_tensor[swap, :, :]
-        img = F.to_pil_image(img_tensor)
-        img = np.array(img)[:, :, ::-1]
+    def transform_tiled(self, img, bboxes, tiler):
+        """transform() in place, through a copy of one strip at a time"""
+        from_to = self.sample_from_to()
+        return apply_strips(lambda strip: cv2.mixChannels([strip.copy()], [strip], from_to), img, tiler,
+                            bytes_per_pixel=img.shape[2] if img.ndim == 3 else 1), bboxes
 
-        return img, bboxes
\ No newline at end of file
+    def transform_batch(self, images, bboxes_list):
+        """One permutation per image like transform(), written straight into a single output batch"""
+        if not isinstance(images, np.ndarray) or images.ndim != 4:
+            return transform_each(self, images, bboxes_list)
+        images = np.ascontiguousarray(images)
+        out = np.empty_like(images)
+        for img, dst in zip(images, out):
+            cv2.mixChannels([img], [dst], self.sample_from_to())
+        return out, bboxes_list
@@ -1,23 +1,34 @@
-import torchvision.transforms.functional as F
+import cv2
 import numpy as np
-import torch
-from PIL import Image
 
 class Mixup:
-    def __init__(self, lambd=0.3):
+    """Blend an image with a partner image from the same split and keep the boxes of both.
+
+    Multi-image op: main.py passes num_images - 1 partner samples (see utils/image_cache.py).
+    """
+
+    num_images = 2
+
+    def __init__(self, lambd=0.3, rng=None):
         assert 0.0 <= lambd <= 1.0, "lambda nên nằm trong [0, 1]"
         self.lambd = lambd
+        self.rng = rng
 
     def transform(self, img1, bboxes1, img2, bboxes2):
         # Đảm bảo hai ảnh cùng kích thước
-        if img1.size != img2.size:
-            img2 = img2.resize(img1.size, Image.BILINEAR)
+        bboxes2 = np.asarray(bboxes2, dtype=np.float32).reshape(-1, 5)
+        if img2.shape[:2] != img1.shape[:2]:
+            (h1, w1), (h2, w2) = img1.shape[:2], img2.shape[:2]
+            img2 = cv2.resize(img2, (w1, h1), interpolation=cv2.INTER_LINEAR)
+            bboxes2 = bboxes2 * np.array([w1 / w2, h1 / h2, w1 / w2, h1 / h2, 1], dtype=np.float32)
+
+        # Blend in uint8; the -0.4999 offset truncates like the previous float to_pil_image round trip
+        # (float32 rounding moves <1% of pixels by one level)
+        img = cv2.addWeighted(img1, self.lambd, img2, 1. - self.lambd, -0.4999)
 
-        t1 = F.to_tensor(img1)
-        t2 = F.to_tensor(img2)
-        mix_img = t1 * self.lambd + t2 * (1. - self.lambd)
-        img = F.to_pil_image(mix_img)
-        img = np.array(img)[:, :, ::-1]
+        mix_bboxes = np.concatenate((np.asarray(bboxes1, dtype=np.float32).reshape(-1, 5), bboxes2), axis=0)
+        return img, mix_bboxes
 
-        mix_bboxes = np.concatenate((bboxes1, bboxes2), axis=0)
-        return img, mix_bboxes
\ No newline at end of file
+    def transform_multi(self, images, bboxes_list):
+        """transform() on the first two images of the group"""
+        return self.transform(images[0], bboxes_list[0], images[1], bboxes_list[1])
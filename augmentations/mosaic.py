@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+from utils.utils import clip_box
+
+class Mosaic:
+    """4-image mosaic: the canvas is cut into quadrants around a random centre and each quadrant is
+    filled by one image, scaled to cover it and cropped at the corner that touches the centre.
+
+    Multi-image op like Mixup (num_images - 1 partners come from the same split). Each quadrant is
+    resized straight into its view of the preallocated canvas, from only the part of the image that
+    lands in it.
+    """
+
+    num_images = 4
+
+    def __init__(self, size=640, center_min=0.25, center_max=0.75, clip_alpha=0.25, rng=None):
+        assert 0 < center_min <= center_max < 1, "center_min, center_max nên nằm trong (0, 1)"
+        self.size = int(size)
+        self.center_min = center_min
+        self.center_max = center_max
+        self.clip_alpha = clip_alpha
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def sample_center(self):
+        xc, yc = self.rng.uniform(self.center_min, self.center_max, 2) * self.size
+        return min(max(int(xc), 1), self.size - 1), min(max(int(yc), 1), self.size - 1)
+
+    def transform_multi(self, images, bboxes_list, out=None):
+        """Mosaic of the first four images; `out` is reused as the canvas when it has the right shape"""
+        s = self.size
+        shape = (s, s) + images[0].shape[2:]
+        canvas = out if out is not None and out.shape == shape and out.dtype == images[0].dtype \
+            else np.empty(shape, dtype=images[0].dtype)
+        xc, yc = self.sample_center()
+
+        quadrants = [(0, 0, xc, yc), (xc, 0, s, yc), (0, yc, xc, s), (xc, yc, s, s)]
+        bboxes_out = []
+        for i, (img, bboxes) in enumerate(zip(images[:4], bboxes_list[:4])):
+            x1, y1, x2, y2 = quadrants[i]
+            rw, rh = x2 - x1, y2 - y1
+            h, w = img.shape[:2]
+            # Scale to cover the quadrant, then keep the image corner at the centre (left images
+            # keep their right side, top images their bottom)
+            scale = max(rw / w, rh / h)
+            sw, sh = min(w, max(1, round(rw / scale))), min(h, max(1, round(rh / scale)))
+            sx = w - sw if i in (0, 2) else 0
+            sy = h - sh if i in (0, 1) else 0
+            cv2.resize(img[sy:sy + sh, sx:sx + sw], (rw, rh), dst=canvas[y1:y2, x1:x2],
+                       interpolation=cv2.INTER_LINEAR)
+
+            bboxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 5)
+            if len(bboxes) == 0:
+                continue
+            fx, fy = rw / sw, rh / sh
+            bboxes = bboxes * np.array([fx, fy, fx, fy, 1], dtype=np.float32) + \
+                np.array([x1 - sx * fx, y1 - sy * fy, x1 - sx * fx, y1 - sy * fy, 0], dtype=np.float32)
+            bboxes = bboxes[(bboxes[:, 2] > x1) & (bboxes[:, 0] < x2) & (bboxes[:, 3] > y1) & (bboxes[:, 1] < y2)]
+            bboxes_out.append(clip_box(bboxes, [x1, y1, x2, y2], self.clip_alpha))
+
+        bboxes_out = np.concatenate(bboxes_out).astype(np.float32) if bboxes_out else np.zeros((0, 5), np.float32)
+        return canvas, bboxes_out
@@ -1,28 +1,132 @@
 import numpy as np
 import cv2
+from augmentations.batch import transform_each
+from augmentations.tiled import apply_strips
+
+NOISE_TYPES = ("gauss", "sp", "poisson", "speckle")
+
 
 class Noisy:
-    def __init__(self, noise_type="gauss", mean=0, std=10, prob=0.05):
+    """Add noise to a uint8 image.
+
+    gauss:   additive N(mean, std)
+    sp:      salt and pepper, each pixel turns black or white with probability prob / 2
+    poisson: shot noise, N(0, v) at pixel value v (Gaussian approximation of Poisson(v))
+    speckle: multiplicative, N(0, std * v / 255) at pixel value v
+
+    Noise is drawn with cv2.randn (int16 for gauss, float32 otherwise) into buffers kept
+    between calls and added with saturation into a new output image (or `out`), so the only
+    full-size allocation once the buffers exist is the output itself.
+
+    bank_size > 0 enables a high-throughput mode that tiles randomly offset windows of a
+    precomputed bank_size x bank_size noise bank instead of drawing every value.
+    """
+
+    def __init__(self, noise_type="gauss", mean=0, std=10, prob=0.05, bank_size=0, rng=None):
+        assert noise_type in NOISE_TYPES, f"noise_type nên là một trong {NOISE_TYPES}"
+        assert bank_size >= 0, "bank_size phải >= 0"
         self.noise_type = noise_type
         self.mean = mean
         self.std = std
         self.prob = prob
+        self.bank_size = int(bank_size)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self._noise = None
+        self._noise16 = None
+        self._scale = None
+        self._bank = None
+
+    def transform(self, img, bboxes, out=None):
+        """Noisy copy of img, or written into `out` (pass out=img for in place); img is only read"""
+        img = np.ascontiguousarray(img)
+        if out is None:
+            out = np.empty_like(img)
+        if self.noise_type == "sp":
+            if out is not img:
+                np.copyto(out, img)
+            return self._salt_and_pepper(out), bboxes
+        if self.noise_type == "gauss" and self.bank_size == 0:
+            # N(mean, std) drawn, rounded and saturated straight into int16
+            self._noise16 = self._buffer(self._noise16, img.shape, np.int16)
+            self._randn(self._noise16, self.mean, self.std)
+            return cv2.add(img, self._noise16, dst=out, dtype=cv2.CV_8U), bboxes
 
-    def transform(self, img, bboxes):
-        image = img.copy()
+        noise = self._standard_noise(img.shape)
         if self.noise_type == "gauss":
-            gauss = np.random.normal(self.mean, self.std, image.shape).astype(np.float32)
-            noisy = image.astype(np.float32) + gauss
-            noisy = np.clip(noisy, 0, 255).astype(np.uint8)
-            return noisy, bboxes
-
-        elif self.noise_type == "sp":
-            probs = np.random.rand(*image.shape[:2])
-            if image.ndim == 2:
-                black, white = 0, 255
-            else:
-                black = np.zeros(image.shape[2], dtype='uint8')
-                white = np.full(image.shape[2], 255, dtype='uint8')
-            image[probs < (self.prob / 2)] = black
-            image[probs > 1 - (self.prob / 2)] = white
-            return image, bboxes
\ No newline at end of file
+            np.multiply(noise, self.std, out=noise)
+            np.add(noise, self.mean, out=noise)
+        else:
+            # Per-pixel noise std looked up from the pixel value
+            values = np.arange(256, dtype=np.float32)
+            lut = np.sqrt(values) if self.noise_type == "poisson" else values * np.float32(self.std / 255)
+            self._scale = self._buffer(self._scale, img.shape)
+            cv2.LUT(img, lut, dst=self._scale)
+            cv2.multiply(noise, self._scale, dst=noise)
+
+        return cv2.add(img, noise, dst=out, dtype=cv2.CV_8U), bboxes
+
+    def transform_tiled(self, img, bboxes, tiler):
+        """transform() in place, strip by strip, so the noise buffers are strip sized.
+
+        Noise is drawn per strip, which is distributed like transform() but not the same values.
+        """
+        img = np.ascontiguousarray(img)
+        channels = img.shape[2] if img.ndim == 3 else 1
+        return apply_strips(lambda strip: self.transform(strip, None, out=strip), img, tiler,
+                            bytes_per_pixel=8 * channels), bboxes
+
+    def transform_batch(self, images, bboxes_list, out=None):
+        """Noise the (N, H, W, C) batch as a single (N * H, W, C) image, into a new batch or `out`.
+
+        Noise is independent per pixel, so this is distributed exactly like transform() on every
+        image, but it takes one cv2.randn / add call and one set of buffers for the whole batch.
+        """
+        if not isinstance(images, np.ndarray) or images.ndim != 4:
+            return transform_each(self, images, bboxes_list)
+        n, h = images.shape[:2]
+        images = np.ascontiguousarray(images)
+        out = np.empty_like(images) if out is None else out
+        tall_shape = (n * h,) + images.shape[2:]
+        tall, _ = self.transform(images.reshape(tall_shape), None, out=out.reshape(tall_shape))
+        return tall.reshape(images.shape), bboxes_list
+
+    def _salt_and_pepper(self, img):
+        # Sample the affected pixel indices instead of drawing a uniform value per pixel
+        pixels = img.reshape(img.shape[0] * img.shape[1], -1)
+        for value in (0, 255):
+            count = self.rng.binomial(len(pixels), self.prob / 2)
+            pixels[self.rng.integers(len(pixels), size=count)] = value
+        return img
+
+    @staticmethod
+    def _buffer(buf, shape, dtype=np.float32):
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=dtype)
+        return buf
+
+    def _randn(self, buf, mean, std):
+        # cv2.randn uses OpenCV's per-thread RNG; reseed it from self.rng so seeded runs repeat
+        cv2.setRNGSeed(int(self.rng.integers(2 ** 31)))
+        channels = buf.shape[2] if buf.ndim == 3 else 1
+        cv2.randn(buf, (mean,) * channels, (std,) * channels)
+
+    def _standard_noise(self, shape):
+        """N(0, 1) float32 noise of `shape` in the reusable buffer"""
+        self._noise = self._buffer(self._noise, shape)
+        if self.bank_size == 0:
+            self._randn(self._noise, 0, 1)
+            return self._noise
+
+        size = self.bank_size
+        channels = shape[2:]
+        if self._bank is None or self._bank.shape[2:] != channels:
+            # Stored 2x2 tiled so every window at an offset in [0, size) is a plain slice
+            self._bank = np.tile(self.rng.standard_normal((size, size) + channels, dtype=np.float32),
+                                 (2, 2) + (1,) * len(channels))
+        h, w = shape[:2]
+        for y in range(0, h, size):
+            for x in range(0, w, size):
+                oy, ox = self.rng.integers(size, size=2)
+                th, tw = min(size, h - y), min(size, w - x)
+                self._noise[y:y + th, x:x + tw] = self._bank[oy:oy + th, ox:ox + tw]
+        return self._noise
@@ -0,0 +1,63 @@
+import importlib
+
+# Config section name -> (module, class). Modules are only imported when an op is first
+# created, so a disabled op never costs its import
+OPS = {
+    'AdjustBrightness': ('augmentations.brightness', 'AdjustBrightness'),
+    'AdjustContrast': ('augmentations.contrast', 'AdjustContrast'),
+    'AdjustSaturation': ('augmentations.saturation', 'AdjustSaturation'),
+    'Cutout': ('augmentations.cutout', 'Cutout'),
+    'Filters': ('augmentations.filters', 'Filters'),
+    'GridMask': ('augmentations.grid_mask', 'GridMask'),
+    'HorizontalFlip': ('augmentations.horizontal_flip', 'HorizontalFlip'),
+    'RandomHSV': ('augmentations.hsv', 'RandomHSV'),
+    'LightingNoise': ('augmentations.lighting_noise', 'LightingNoise'),
+    'Mixup': ('augmentations.mixup', 'Mixup'),
+    'Mosaic': ('augmentations.mosaic', 'Mosaic'),
+    'Noisy': ('augmentations.noisy', 'Noisy'),
+    'Resize': ('augmentations.resize', 'Resize'),
+    'RotateOnlyBboxes': ('augmentations.rotate_only_bboxes', 'RotateOnlyBboxes'),
+    'Rotate': ('augmentations.rotate', 'Rotate'),
+    'Scale': ('augmentations.scale', 'Scale'),
+    'Shear': ('augmentations.shear', 'Shear'),
+    'SmallObjectAugmentation': ('augmentations.small_object_augmentation', 'SmallObjectAugmentation'),
+    'Translate': ('augmentations.translate', 'Translate'),
+}
+
+# Webapp ids -> config section name
+ALIASES = {
+    'brightness': 'AdjustBrightness',
+    'contrast': 'AdjustContrast',
+    'saturation': 'AdjustSaturation',
+    'cutout': 'Cutout',
+    'filters': 'Filters',
+    'grid_mask': 'GridMask',
+    'horizontal_flip': 'HorizontalFlip',
+    'hsv': 'RandomHSV',
+    'lighting_noise': 'LightingNoise',
+    'mixup': 'Mixup',
+    'mosaic': 'Mosaic',
+    'noisy': 'Noisy',
+    'resize': 'Resize',
+    'rotate_only_bboxes': 'RotateOnlyBboxes',
+    'rotate': 'Rotate',
+    'scale': 'Scale',
+    'shear': 'Shear',
+    'small_object_augmentation': 'SmallObjectAugmentation',
+    'translate': 'Translate',
+}
+
+
+def get_op_class(name):
+    """Class for a config section name or webapp id, importing its module on first use"""
+    name = ALIASES.get(name, name)
+    if name not in OPS:
+        raise KeyError(f'Unknown augmentation: {name}')
+    module_name, class_name = OPS[name]
+    # import_module is cached in sys.modules and holds the import lock, so this is thread safe
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_op(name, **params):
+    """Instantiate the op registered as `name` with the given constructor params"""
+    return get_op_class(name)(**params)
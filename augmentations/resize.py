@@ -1,30 +1,26 @@
 import numpy as np
-from utils.utils import letterbox_image
+from utils.utils import letterbox_image, letterbox_batch, letterbox_bboxes, letterbox_params
 
 class Resize:
-    def __init__(self, inp_dim=512):
+    def __init__(self, inp_dim=512, pad_color=0, rng=None):
         self.inp_dim = int(inp_dim)
+        # Scalar or BGR tuple for the letterbox borders; from config a number or "b, g, r"
+        if isinstance(pad_color, str):
+            pad_color = tuple(int(float(c)) for c in pad_color.strip("()[]").split(","))
+            assert len(pad_color) in (1, 3), "pad_color nên là một số hoặc 3 giá trị b, g, r"
+            pad_color = pad_color[0] if len(pad_color) == 1 else pad_color
+        self.pad_color = pad_color
+        self.rng = rng
 
     def transform(self, img, bboxes):
-        # Get the original width and height of the image
-        w, h = img.shape[1], img.shape[0]
-        
         # Resize the image to fit the desired input dimension while maintaining the aspect ratio
-        img = letterbox_image(img, self.inp_dim)
-        
-        # Calculate the scale factor to adjust the bounding box coordinates accordingly
-        scale = min(self.inp_dim / h, self.inp_dim / w)
-        bboxes = np.asarray(bboxes, dtype=np.float32)
-        bboxes[:, :4] *= scale
+        img_out = letterbox_image(img, self.inp_dim, self.pad_color)
 
-        # Calculate the new width and height after scaling
-        new_w, new_h = scale * w, scale * h
-        del_w, del_h = (self.inp_dim - new_w) / 2, (self.inp_dim - new_h) / 2
-        bboxes[:, [0, 2]] += del_w
-        bboxes[:, [1, 3]] += del_h
+        # Scale and shift the boxes by the same amounts as the image
+        bboxes, = letterbox_bboxes([bboxes], letterbox_params([img.shape], self.inp_dim))
+        return img_out, bboxes
 
-        # Convert the resized image back to uint8 data type
-        img = img.astype(np.uint8)
-        
-        # Return the resized image and adjusted bounding boxes
-        return img, bboxes
\ No newline at end of file
+    def transform_batch(self, images, bboxes_list, out=None):
+        """Letterbox many images into one (N, inp_dim, inp_dim, C) array, reusing `out` when given"""
+        batch, params = letterbox_batch(images, self.inp_dim, self.pad_color, out=out)
+        return batch, letterbox_bboxes(bboxes_list, params)
@@ -1,16 +1,29 @@
 import cv2
 import numpy as np
-import random
-from utils.utils import get_corners, rotate_box, rotate_im, get_enclosing_box, clip_box
+from utils.utils import get_corners, rotate_box, rotate_im, get_enclosing_box, clip_box, get_rotation_matrix
+from augmentations.batch import transform_each
 
 class Rotate:
-    def __init__(self, angle_min=-10, angle_max=10):
+    # Boxes keeping less than this fraction of their area after clipping are dropped (see FusedAffine)
+    clip_alpha = 0.25
+
+    def __init__(self, angle_min=-10, angle_max=10, rng=None):
         assert angle_min <= angle_max, "angle_min phải <= angle_max"
         self.angle_min = angle_min
         self.angle_max = angle_max
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def sample_angle(self):
+        return self.angle_min if self.angle_min == self.angle_max else self.rng.uniform(self.angle_min, self.angle_max)
+
+    def get_matrix(self, h, w):
+        """Random 3x3 matrix equivalent to transform() (rotate on the enlarged canvas, then resize back)"""
+        M, nW, nH = get_rotation_matrix(h, w, self.sample_angle())
+        S = np.diag([w / nW, h / nH, 1.0])
+        return S @ np.vstack((M, [0, 0, 1])), (w, h)
 
     def transform(self, img, bboxes):
-        angle = self.angle_min if self.angle_min == self.angle_max else random.uniform(self.angle_min, self.angle_max)
+        angle = self.sample_angle()
         h, w = img.shape[:2]
         cx, cy = w // 2, h // 2
 
@@ -25,5 +38,9 @@ class Rotate:
         img_rot = cv2.resize(img_rot, (w, h))
         new_bbox[:, :4] /= [scale_x, scale_y, scale_x, scale_y]
 
-        bboxes_out = clip_box(new_bbox, [0, 0, w, h], 0.25)
+        bboxes_out = clip_box(new_bbox, [0, 0, w, h], self.clip_alpha)
         return img_rot, bboxes_out
+
+    def transform_batch(self, images, bboxes_list):
+        """Per-image fallback, see augmentations.batch.transform_each"""
+        return transform_each(self, images, bboxes_list)
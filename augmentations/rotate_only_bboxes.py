@@ -1,29 +1,36 @@
-import torchvision.transforms.functional as F
 import numpy as np
+import cv2
+from utils.utils import get_pil_rotation_matrix
+from augmentations.batch import transform_each
 
 class RotateOnlyBboxes:
-    def __init__(self, angle=5):
+    def __init__(self, angle=5, rng=None):
         self.angle = angle
+        self.rng = rng
 
     def transform(self, img, bboxes):
-        img_tensor = F.to_tensor(img)
+        img_out = img.copy()
         boxes = np.asarray(bboxes).copy()
+        h, w = img.shape[:2]
 
         for box in boxes:
             x_min, y_min, x_max, y_max = map(int, box[:4])
             # Giới hạn bbox trong biên ảnh
             x_min = max(0, x_min)
             y_min = max(0, y_min)
-            x_max = min(img_tensor.shape[2] - 1, x_max)
-            y_max = min(img_tensor.shape[1] - 1, y_max)
+            x_max = min(w - 1, x_max)
+            y_max = min(h - 1, y_max)
             if x_max <= x_min or y_max <= y_min:
                 continue
 
-            bbox = img_tensor[:, y_min:y_max+1, x_min:x_max+1]
-            bbox_img = F.to_pil_image(bbox)
-            bbox_img = bbox_img.rotate(self.angle)
-            img_tensor[:, y_min:y_max+1, x_min:x_max+1] = F.to_tensor(bbox_img)
+            patch = img_out[y_min:y_max+1, x_min:x_max+1]
+            size = (patch.shape[1], patch.shape[0])
+            patch[...] = cv2.warpAffine(patch, get_pil_rotation_matrix(*size, self.angle), size,
+                                        flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP,
+                                        borderMode=cv2.BORDER_CONSTANT, borderValue=0)
 
-        img_out = F.to_pil_image(img_tensor)
-        img_out = np.array(img_out)[:, :, ::-1]
-        return img_out, boxes
\ No newline at end of file
+        return img_out, boxes
+
+    def transform_batch(self, images, bboxes_list):
+        """Per-image fallback, see augmentations.batch.transform_each"""
+        return transform_each(self, images, bboxes_list)
@@ -1,24 +1,48 @@
-import torchvision.transforms.functional as F
 import numpy as np
 import cv2
-from PIL import Image
-import random
+from utils.utils import bgr_to_gray
+from augmentations.batch import transform_each
+from augmentations.tiled import apply_strips
 
 class AdjustSaturation:
-    def __init__(self, saturation_min=0.8, saturation_max=1.2):
+    def __init__(self, saturation_min=0.8, saturation_max=1.2, rng=None):
         assert 0.5 <= saturation_min <= saturation_max <= 2.0, "Ngưỡng saturation nên nằm trong [0.5, 2.0]"
         self.saturation_min = saturation_min
         self.saturation_max = saturation_max
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def sample_factor(self):
+        return self.saturation_min if self.saturation_min == self.saturation_max \
+            else self.rng.uniform(self.saturation_min, self.saturation_max)
 
     def transform(self, img, bboxes):
-        saturation_factor = self.saturation_min if self.saturation_min == self.saturation_max \
-            else random.uniform(self.saturation_min, self.saturation_max)
+        saturation_factor = self.sample_factor()
 
-        if isinstance(img, np.ndarray):
-            img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-            img = F.adjust_saturation(img, saturation_factor)
-            img = np.asarray(img)[..., ::-1]
-        else:
-            img = F.adjust_saturation(img, saturation_factor)
+        # PIL ImageEnhance.Color: blend with the grayscale image. addWeighted rounds,
+        # the -0.4999 offset makes it truncate like PIL's blend
+        gray = cv2.cvtColor(bgr_to_gray(img), cv2.COLOR_GRAY2BGR)
+        img = cv2.addWeighted(img, saturation_factor, gray, 1 - saturation_factor, -0.4999)
 
         return img, bboxes
+
+    def transform_tiled(self, img, bboxes, tiler):
+        """transform() in place, strip by strip (the grayscale blend is pixel-local)"""
+        saturation_factor = self.sample_factor()
+
+        def blend(strip):
+            gray = cv2.cvtColor(bgr_to_gray(strip), cv2.COLOR_GRAY2BGR)
+            cv2.addWeighted(strip, saturation_factor, gray, 1 - saturation_factor, -0.4999, dst=strip)
+
+        return apply_strips(blend, img, tiler, bytes_per_pixel=4), bboxes
+
+    def transform_batch(self, images, bboxes_list):
+        """One factor per image, like calling transform() on each; grayscale of the whole batch in one call"""
+        if not isinstance(images, np.ndarray) or images.ndim != 4 or images.shape[3] != 3:
+            return transform_each(self, images, bboxes_list)
+        factors = [self.sample_factor() for _ in range(len(images))]
+        tall = np.ascontiguousarray(images).reshape((-1,) + images.shape[2:])
+        gray = cv2.cvtColor(bgr_to_gray(tall), cv2.COLOR_GRAY2BGR).reshape(images.shape)
+        out = np.empty_like(images)
+        for img, img_gray, factor, dst in zip(images, gray, factors, out):
+            cv2.addWeighted(img, factor, img_gray, 1 - factor, -0.4999, dst=dst)
+        return out, bboxes_list
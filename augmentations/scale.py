@@ -1,21 +1,34 @@
 import cv2
 import numpy as np
-import random
 from utils.utils import clip_box
+from augmentations.batch import transform_each
 
 class Scale:
-    def __init__(self, scale_x_min=0.8, scale_x_max=1.2, scale_y_min=0.8, scale_y_max=1.2):
+    # Boxes keeping less than this fraction of their area after clipping are dropped (see FusedAffine)
+    clip_alpha = 0.2
+
+    def __init__(self, scale_x_min=0.8, scale_x_max=1.2, scale_y_min=0.8, scale_y_max=1.2, rng=None):
         assert 0.5 <= scale_x_min <= scale_x_max <= 2.0, "scale_x nên nằm trong [0.5, 2.0]"
         assert 0.5 <= scale_y_min <= scale_y_max <= 2.0, "scale_y nên nằm trong [0.5, 2.0]"
         self.scale_x_min = scale_x_min
         self.scale_x_max = scale_x_max
         self.scale_y_min = scale_y_min
         self.scale_y_max = scale_y_max
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def sample_scale(self):
+        scale_x = self.scale_x_min if self.scale_x_min == self.scale_x_max else self.rng.uniform(self.scale_x_min, self.scale_x_max)
+        scale_y = self.scale_y_min if self.scale_y_min == self.scale_y_max else self.rng.uniform(self.scale_y_min, self.scale_y_max)
+        return scale_x, scale_y
+
+    def get_matrix(self, h, w):
+        """Random 3x3 matrix equivalent to transform() (scale anchored at the top-left corner)"""
+        scale_x, scale_y = self.sample_scale()
+        return np.diag([scale_x, scale_y, 1.0]), (w, h)
 
     def transform(self, img, bboxes):
         img_shape = img.shape
-        scale_x = self.scale_x_min if self.scale_x_min == self.scale_x_max else random.uniform(self.scale_x_min, self.scale_x_max)
-        scale_y = self.scale_y_min if self.scale_y_min == self.scale_y_max else random.uniform(self.scale_y_min, self.scale_y_max)
+        scale_x, scale_y = self.sample_scale()
 
         img_scaled = cv2.resize(img, None, fx=scale_x, fy=scale_y)
         bboxes = np.asarray(bboxes, dtype=np.float32)
@@ -32,5 +45,9 @@ class Scale:
             # Nếu ảnh lớn hơn, crop về đúng shape gốc
             img_out = img_scaled[:img_shape[0], :img_shape[1], :]
 
-        bboxes = clip_box(bboxes, [0, 0, img_shape[1], img_shape[0]], 0.2)
+        bboxes = clip_box(bboxes, [0, 0, img_shape[1], img_shape[0]], self.clip_alpha)
         return img_out, bboxes
+
+    def transform_batch(self, images, bboxes_list):
+        """Per-image fallback, see augmentations.batch.transform_each"""
+        return transform_each(self, images, bboxes_list)
@@ -1,13 +1,91 @@
-import random
+import functools
+import numpy as np
+from augmentations.fused_affine import FusedAffine, is_geometric
+from augmentations.batch import stack_images, transform_each
+from augmentations.tiled import transform_tiled
 
 class Sequence:
-    def __init__(self, augmentations, probs=1):
+    def __init__(self, augmentations, probs=1, rng=None, fuse_geometric=False):
         self.augmentations = augmentations
         self.probs = probs
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # Run consecutive geometric ops as a single warp (see FusedAffine)
+        self.fuse_geometric = fuse_geometric
 
-    def transform(self, images, bboxes):
+    def transform(self, images, bboxes, tiler=None):
+        """Apply the ops in turn; with a tiler, through their transform_tiled (in place, see augmentations.tiled)"""
+        apply = (lambda op, img, b: op.transform(img, b)) if tiler is None else \
+            functools.partial(transform_tiled, tiler=tiler)
+        pending = []
         for i, augmentation in enumerate(self.augmentations):
             prob = self.probs[i] if isinstance(self.probs, list) else self.probs
-            if prob > 0 and random.random() < prob:
-                images, bboxes = augmentation.transform(images, bboxes)
+            if not (prob > 0 and self.rng.random() < prob):
+                continue
+            if self.fuse_geometric and is_geometric(augmentation):
+                pending.append(augmentation)
+                continue
+            if pending:
+                images, bboxes = apply(FusedAffine(pending), images, bboxes)
+            pending = []
+            images, bboxes = apply(augmentation, images, bboxes)
+        if pending:
+            images, bboxes = apply(FusedAffine(pending), images, bboxes)
         return images, bboxes
+
+    def transform_tiled(self, images, bboxes, tiler):
+        return self.transform(images, bboxes, tiler=tiler)
+
+    def transform_batch(self, images, bboxes_list):
+        """Batched transform(): every image draws its own probs, each op runs once on the images that
+        selected it through its transform_batch (per-image transform for ops without one)"""
+        n = len(images)
+        bboxes_list = list(bboxes_list)
+        source, pending = images, []
+        for i, augmentation in enumerate(self.augmentations):
+            prob = self.probs[i] if isinstance(self.probs, list) else self.probs
+            selected = self.rng.random(n) < prob if prob > 0 else np.zeros(n, dtype=bool)
+            if not selected.any():
+                continue
+            if self.fuse_geometric and is_geometric(augmentation):
+                pending.append((augmentation, selected))
+                continue
+            images, bboxes_list = self._apply_fused_batch(pending, images, bboxes_list)
+            pending = []
+            images, bboxes_list = self._apply_batch(augmentation, selected, images, bboxes_list, source)
+        return self._apply_fused_batch(pending, images, bboxes_list)
+
+    @staticmethod
+    def _apply_batch(augmentation, selected, images, bboxes_list, source):
+        batch_fn = getattr(augmentation, 'transform_batch', None) or functools.partial(transform_each, augmentation)
+        if selected.all():
+            return batch_fn(images, bboxes_list)
+
+        idx = np.flatnonzero(selected)
+        subset = images[idx] if isinstance(images, np.ndarray) else [images[i] for i in idx]
+        subset, subset_bboxes = batch_fn(subset, [bboxes_list[i] for i in idx])
+        bboxes_list = list(bboxes_list)
+        for i, bboxes in zip(idx, subset_bboxes):
+            bboxes_list[i] = bboxes
+        if isinstance(images, np.ndarray) and isinstance(subset, np.ndarray) and subset.shape[1:] == images.shape[1:] \
+                and subset.dtype == images.dtype:
+            # Scatter in place, unless that would write into the caller's batch
+            if isinstance(source, np.ndarray) and np.may_share_memory(images, source):
+                images = images.copy()
+            images[idx] = subset
+            return images, bboxes_list
+        images = list(images)
+        for i, img in zip(idx, subset):
+            images[i] = img
+        return stack_images(images), bboxes_list
+
+    @staticmethod
+    def _apply_fused_batch(pending, images, bboxes_list):
+        """Per image: one warp for the geometric ops that image selected"""
+        if not pending:
+            return images, bboxes_list
+        images, bboxes_list = list(images), list(bboxes_list)
+        for i in range(len(images)):
+            augmentations = [augmentation for augmentation, selected in pending if selected[i]]
+            if augmentations:
+                images[i], bboxes_list[i] = FusedAffine(augmentations).transform(images[i], bboxes_list[i])
+        return stack_images(images), bboxes_list
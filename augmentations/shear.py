@@ -1,20 +1,37 @@
 import numpy as np
 import cv2
-import random
 from augmentations.horizontal_flip import HorizontalFlip
+from augmentations.batch import transform_each
 
 class Shear:
-    def __init__(self, shear_min=-0.2, shear_max=0.2):
+    # Output canvas holds every box, nothing is clipped (see FusedAffine)
+    clip_alpha = None
+
+    def __init__(self, shear_min=-0.2, shear_max=0.2, rng=None):
         assert -0.5 <= shear_min <= shear_max <= 0.5, "shear nên nằm trong [-0.5, 0.5]"
         self.shear_min = shear_min
         self.shear_max = shear_max
         self.hori_flip = HorizontalFlip()
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def get_matrix(self, h, w):
+        """Random 3x3 matrix equivalent to transform(), and the (width, height) of its output"""
+        shear_factor = self.rng.uniform(self.shear_min, self.shear_max)
+        new_width = int(w + abs(shear_factor * h))
+        M = np.array([[1, abs(shear_factor), 0], [0, 1, 0], [0, 0, 1]], dtype=np.float64)
+        if shear_factor < 0:
+            # Negative shear = flip, shear, flip back
+            M = self.hori_flip.get_matrix(h, new_width)[0] @ M @ self.hori_flip.get_matrix(h, w)[0]
+        return M, (new_width, h)
 
     def transform(self, img, bboxes):
-        shear_factor = random.uniform(self.shear_min, self.shear_max)
+        shear_factor = self.rng.uniform(self.shear_min, self.shear_max)
         img_out, bboxes_out = img, np.asarray(bboxes, dtype=np.float32)
 
-        if shear_factor < 0:
+        # Negative shear = flip, shear, flip back. The sign is kept in `flip` because shear_factor is
+        # made positive below (the baseline re-tested shear_factor and so never flipped back)
+        flip = shear_factor < 0
+        if flip:
             img_out, bboxes_out = self.hori_flip.transform(img_out, bboxes_out)
             shear_factor = abs(shear_factor)
 
@@ -24,7 +41,11 @@ class Shear:
 
         bboxes_out[:, [0, 2]] += bboxes_out[:, [1, 3]] * shear_factor
 
-        if shear_factor < 0:
+        if flip:
             img_sheared, bboxes_out = self.hori_flip.transform(img_sheared, bboxes_out)
 
         return img_sheared, bboxes_out
+
+    def transform_batch(self, images, bboxes_list):
+        """Per-image fallback, see augmentations.batch.transform_each"""
+        return transform_each(self, images, bboxes_list)
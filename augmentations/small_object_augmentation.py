@@ -1,45 +1,49 @@
 import numpy as np
-import random
+from augmentations.batch import transform_each
 
 class SmallObjectAugmentation:
-    def __init__(self, thresh=256*256, prob=0.7, copy_times=3, epochs=30, all_objects=False, one_object=False):
+    def __init__(self, thresh=256*256, prob=0.7, copy_times=3, epochs=30, all_objects=False, one_object=False, rng=None):
         self.thresh = thresh
         self.prob = prob
         self.copy_times = 1 if (all_objects or one_object) else copy_times
         self.epochs = epochs
         self.all_objects = all_objects
         self.one_object = one_object
+        self.rng = rng if rng is not None else np.random.default_rng()
 
     def is_small_object(self, h, w):
         return h * w <= self.thresh
 
-    def compute_overlap(self, annot_a, annot_b):
-        if annot_a is None:
-            return False
-        left_max = max(annot_a[0], annot_b[0])
-        top_max = max(annot_a[1], annot_b[1])
-        right_min = min(annot_a[2], annot_b[2])
-        bottom_min = min(annot_a[3], annot_b[3])
-        inter = max(0, right_min - left_max) * max(0, bottom_min - top_max)
-        return inter != 0
-
-    def do_not_overlap(self, new_annot, annots):
-        return not any(self.compute_overlap(new_annot, annot) for annot in annots)
+    @staticmethod
+    def overlaps(candidates, annots):
+        """Bool per candidate: True if it intersects any of annots with a positive area"""
+        if len(annots) == 0:
+            return np.zeros(len(candidates), dtype=bool)
+        inter_w = np.minimum(candidates[:, None, 2], annots[None, :, 2]) - np.maximum(candidates[:, None, 0], annots[None, :, 0])
+        inter_h = np.minimum(candidates[:, None, 3], annots[None, :, 3]) - np.maximum(candidates[:, None, 1], annots[None, :, 1])
+        return ((inter_w > 0) & (inter_h > 0)).any(axis=1)
 
     def create_copy_annot(self, h, w, annot, annots):
+        """First of `epochs` random positions for a copy of annot that lies in the image and
+        overlaps none of annots, or None. All positions are drawn and checked as one batch."""
         annot = annot.astype(np.int32)
         annot_h, annot_w = annot[3] - annot[1], annot[2] - annot[0]
-        for _ in range(self.epochs):
-            random_x = np.random.randint(int(annot_w / 2), int(w - annot_w / 2))
-            random_y = np.random.randint(int(annot_h / 2), int(h - annot_h / 2))
-            xmin, ymin = random_x - annot_w // 2, random_y - annot_h // 2
-            xmax, ymax = xmin + annot_w, ymin + annot_h
-            if xmin < 0 or xmax > w or ymin < 0 or ymax > h:
-                continue
-            new_annot = np.array([xmin, ymin, xmax, ymax, annot[4]], dtype=np.int32)
-            if self.do_not_overlap(new_annot, annots):
-                return new_annot
-        return None
+        low_x, high_x = int(annot_w / 2), int(w - annot_w / 2)
+        low_y, high_y = int(annot_h / 2), int(h - annot_h / 2)
+        if low_x >= high_x or low_y >= high_y:
+            return None
+
+        candidates = np.empty((self.epochs, 4), dtype=np.int64)
+        candidates[:, 0] = self.rng.integers(low_x, high_x, self.epochs) - annot_w // 2
+        candidates[:, 1] = self.rng.integers(low_y, high_y, self.epochs) - annot_h // 2
+        candidates[:, 2] = candidates[:, 0] + annot_w
+        candidates[:, 3] = candidates[:, 1] + annot_h
+        inside = (candidates[:, 0] >= 0) & (candidates[:, 2] <= w) & (candidates[:, 1] >= 0) & (candidates[:, 3] <= h)
+        free = inside & ~self.overlaps(candidates, annots)
+        if not free.any():
+            return None
+        xmin, ymin, xmax, ymax = candidates[np.argmax(free)]
+        return np.array([xmin, ymin, xmax, ymax, annot[4]], dtype=np.int32)
 
     def add_patch_in_img(self, annot, copy_annot, image):
         copy_annot = copy_annot.astype(np.int32)
@@ -49,13 +53,14 @@ class SmallObjectAugmentation:
     def transform(self, img, bboxes):
         if self.all_objects and self.one_object:
             return img, bboxes
-        if np.random.rand() > self.prob:
+        if self.rng.random() > self.prob:
             return img, bboxes
 
         h, w = img.shape[:2]
         annots = np.asarray(bboxes)
-        small_object_list = [idx for idx, annot in enumerate(annots)
-                             if self.is_small_object(annot[3] - annot[1], annot[2] - annot[0])]
+        if annots.ndim != 2 or len(annots) == 0:
+            return img, bboxes
+        small_object_list = np.flatnonzero(self.is_small_object(annots[:, 3] - annots[:, 1], annots[:, 2] - annots[:, 0]))
         l = len(small_object_list)
         if l == 0:
             return img, bboxes
@@ -65,18 +70,24 @@ class SmallObjectAugmentation:
         elif self.one_object:
             copy_object_num = 1
         else:
-            copy_object_num = np.random.randint(1, l + 1)
+            copy_object_num = int(self.rng.integers(1, l + 1))
 
-        random_list = random.sample(small_object_list, copy_object_num)
+        random_list = self.rng.choice(small_object_list, copy_object_num, replace=False)
         select_annots = annots[random_list, :]
-        annots_list = annots.tolist()
+
+        # Existing boxes plus room for every copy; placed copies are appended in order
+        placed = np.empty((len(annots) + copy_object_num * self.copy_times, 5), dtype=np.float64)
+        placed[:len(annots)] = annots[:, :5]
+        count = len(annots)
         for annot in select_annots:
-            annot_h, annot_w = annot[3] - annot[1], annot[2] - annot[0]
-            if not self.is_small_object(annot_h, annot_w):
-                continue
             for _ in range(self.copy_times):
-                new_annot = self.create_copy_annot(h, w, annot, annots_list)
+                new_annot = self.create_copy_annot(h, w, annot, placed[:count])
                 if new_annot is not None:
                     img = self.add_patch_in_img(new_annot, annot, img)
-                    annots_list.append(new_annot)
-        return img, np.array(annots_list, dtype=np.int32)
\ No newline at end of file
+                    placed[count] = new_annot
+                    count += 1
+        return img, placed[:count].astype(np.int32)
+
+    def transform_batch(self, images, bboxes_list):
+        """Per-image fallback, see augmentations.batch.transform_each"""
+        return transform_each(self, images, bboxes_list)
@@ -0,0 +1,60 @@
+from augmentations.fused_affine import FusedAffine, is_geometric
+
+
+class Tiler:
+    """Full-width row strips of an image, sized so that an op's per-strip temporaries fit in memory_mb.
+
+    Images larger than memory_mb (see needs_tiling) go through transform_tiled instead of transform:
+    ops draw their random parameters once per image, then work strip by strip, in place where the
+    op is pixel-local. Full-width strips keep every strip contiguous and need no horizontal halo.
+
+    Geometric ops and rotated GridMask can only resample per strip with their own float64
+    coordinates, not warpAffine's fixed-point ones, so a few pixels differ from transform(). With
+    exact=True (the default) they run whole instead and the output is identical to transform(),
+    at the cost of their temporaries not being bounded by memory_mb; exact=False bounds them.
+    """
+
+    def __init__(self, memory_mb=512, min_rows=16, exact=True):
+        assert memory_mb > 0, "memory_mb phải > 0"
+        self.memory_bytes = int(memory_mb * 2 ** 20)
+        self.min_rows = max(1, int(min_rows))
+        self.exact = exact
+
+    def needs_tiling(self, img):
+        return img.nbytes > self.memory_bytes
+
+    def rows(self, shape, bytes_per_pixel):
+        """Rows per strip for an op needing `bytes_per_pixel` of temporaries per output pixel"""
+        per_row = max(1, shape[1] * bytes_per_pixel)
+        return max(self.min_rows, self.memory_bytes // per_row)
+
+    def strips(self, shape, bytes_per_pixel, halo=0):
+        """Yield (y0, y1, top, bottom): output rows y0:y1, read from rows top:bottom (y0:y1 plus `halo`)"""
+        h = shape[0]
+        step = max(1, self.rows(shape, bytes_per_pixel) - 2 * halo)
+        for y0 in range(0, h, step):
+            y1 = min(h, y0 + step)
+            yield y0, y1, max(0, y0 - halo), min(h, y1 + halo)
+
+
+def transform_tiled(op, img, bboxes, tiler):
+    """op.transform_tiled(img, bboxes, tiler), which may modify img in place.
+
+    Geometric ops without their own run as op.transform when tiler.exact, otherwise as a
+    FusedAffine (one remap per strip instead of Rotate's enlarged canvas); other ops without one
+    (Resize, SmallObjectAugmentation) fall back to op.transform.
+    """
+    tiled_fn = getattr(op, 'transform_tiled', None)
+    if tiled_fn is None and is_geometric(op) and not tiler.exact:
+        tiled_fn = FusedAffine([op]).transform_tiled
+    if tiled_fn is None:
+        return op.transform(img, bboxes)
+    return tiled_fn(img, bboxes, tiler)
+
+
+def apply_strips(fn, img, tiler, bytes_per_pixel):
+    """fn(strip) on consecutive row strips of img, in place (fn writes its result into the strip view)"""
+    for y0, y1, _, _ in tiler.strips(img.shape, bytes_per_pixel):
+        fn(img[y0:y1])
+    return img
+
@@ -1,21 +1,31 @@
 import numpy as np
-import random
 from utils.utils import clip_box
+from augmentations.batch import transform_each
 
 class Translate:
-    def __init__(self, translate_min=0.1, translate_max=0.2, diff=False):
+    # Boxes keeping less than this fraction of their area after clipping are dropped (see FusedAffine)
+    clip_alpha = 0.25
+
+    def __init__(self, translate_min=0.1, translate_max=0.2, diff=False, rng=None):
         assert 0 < translate_min < translate_max < 1, "Translate factors phải nằm trong khoảng (0,1)"
         self.translate_min = translate_min
         self.translate_max = translate_max
         self.diff = diff
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def sample_shift(self, h, w):
+        translate_factor_x = self.rng.uniform(self.translate_min, self.translate_max)
+        translate_factor_y = self.rng.uniform(self.translate_min, self.translate_max) if self.diff else translate_factor_x
+        return int(translate_factor_x * w), int(translate_factor_y * h)
+
+    def get_matrix(self, h, w):
+        """Random 3x3 matrix equivalent to transform()"""
+        shift_x, shift_y = self.sample_shift(h, w)
+        return np.array([[1, 0, shift_x], [0, 1, shift_y], [0, 0, 1]], dtype=np.float64), (w, h)
 
     def transform(self, img, bboxes):
         img_shape = img.shape
-        translate_factor_x = random.uniform(self.translate_min, self.translate_max)
-        translate_factor_y = random.uniform(self.translate_min, self.translate_max) if self.diff else translate_factor_x
-
-        shift_x = int(translate_factor_x * img_shape[1])
-        shift_y = int(translate_factor_y * img_shape[0])
+        shift_x, shift_y = self.sample_shift(img_shape[0], img_shape[1])
 
         canvas = np.zeros(img_shape, dtype=np.uint8)
         y1, y2 = max(0, shift_y), min(img_shape[0], img_shape[0] + shift_y)
@@ -26,6 +36,10 @@ class Translate:
 
         bboxes = np.asarray(bboxes, dtype=np.float32)
         bboxes[:, :4] += [shift_x, shift_y, shift_x, shift_y]
-        bboxes = clip_box(bboxes, [0, 0, img_shape[1], img_shape[0]], 0.25)
+        bboxes = clip_box(bboxes, [0, 0, img_shape[1], img_shape[0]], self.clip_alpha)
 
         return img_out, bboxes
+
+    def transform_batch(self, images, bboxes_list):
+        """Per-image fallback, see augmentations.batch.transform_each"""
+        return transform_each(self, images, bboxes_list)
@@ -0,0 +1,131 @@
+"""
+Benchmark transform_batch against a Python loop of transform() calls
+
+For every op, a batch of N same-size images (what Resize produces) is run
+through `[op.transform(img, b) for ...]` and through `op.transform_batch`,
+each with a fresh Generator from the same seed. Ops that draw their random
+parameters per image in the same order must give identical outputs; Noisy
+draws the batch noise jointly, so only its statistics are compared.
+
+    python benchmarks/bench_batch.py
+    python benchmarks/bench_batch.py --batch 64 --size 512 --repeats 10 --out batch.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from augmentations.registry import create_op
+from augmentations.sequence import Sequence
+
+# name -> (config section, params, transform_batch output must equal the loop)
+OPS = {
+    'AdjustBrightness': ('AdjustBrightness', {}, True),
+    'AdjustContrast': ('AdjustContrast', {}, True),
+    'AdjustSaturation': ('AdjustSaturation', {}, True),
+    'Cutout': ('Cutout', {}, True),
+    'GridMask': ('GridMask', {'prob': 1.0}, True),
+    'HorizontalFlip': ('HorizontalFlip', {}, True),
+    'RandomHSV': ('RandomHSV', {}, True),
+    'LightingNoise': ('LightingNoise', {}, True),
+    'Noisy': ('Noisy', {}, False),
+    'Noisy[sp]': ('Noisy', {'noise_type': 'sp'}, False),
+    'Filters': ('Filters', {}, True),
+    'Rotate': ('Rotate', {}, True),
+}
+
+
+def make_batch(n, size, n_boxes, rng):
+    images = rng.integers(0, 256, (n, size, size, 3), dtype=np.uint8)
+    bboxes_list = []
+    for _ in range(n):
+        xy = rng.uniform(0, size * 0.7, (n_boxes, 2))
+        wh = rng.uniform(16, size * 0.3, (n_boxes, 2))
+        cls = rng.integers(0, 3, (n_boxes, 1))
+        bboxes_list.append(np.hstack([xy, xy + wh, cls]).astype(np.float32))
+    return images, bboxes_list
+
+
+def loop(op, images, bboxes_list):
+    results = [op.transform(img, bboxes) for img, bboxes in zip(images, bboxes_list)]
+    return np.stack([img for img, _ in results]), [bboxes for _, bboxes in results]
+
+
+def timed(fn, op_factory, images, bboxes_list, repeats):
+    timings, result = [], None
+    for _ in range(repeats):
+        op = op_factory()
+        batch = images.copy()
+        boxes = [b.copy() for b in bboxes_list]
+        start = time.perf_counter()
+        result = fn(op, batch, boxes)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000, result
+
+
+def check(name, exact, ref, out):
+    ref_images, ref_boxes = ref
+    out_images, out_boxes = out
+    assert np.asarray(out_images).shape == ref_images.shape, f"{name}: sai kích thước batch"
+    if exact:
+        assert np.array_equal(np.asarray(out_images), ref_images), f"{name}: ảnh khác với transform()"
+        for a, b in zip(ref_boxes, out_boxes):
+            assert np.array_equal(np.asarray(a), np.asarray(b)), f"{name}: bbox khác với transform()"
+    else:
+        diff = abs(float(np.asarray(out_images, dtype=np.float32).mean()) - float(ref_images.mean()))
+        assert diff < 1.0, f"{name}: phân phối nhiễu lệch ({diff:.3f})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark transform_batch against per-image transform()')
+    parser.add_argument('--batch', type=int, default=32)
+    parser.add_argument('--size', type=int, default=512)
+    parser.add_argument('--boxes', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write the JSON report here (default: stdout)')
+    args = parser.parse_args()
+
+    images, bboxes_list = make_batch(args.batch, args.size, args.boxes, np.random.default_rng(args.seed))
+    results = []
+    for name, (section, params, exact) in OPS.items():
+        factory = lambda: create_op(section, **params, rng=np.random.default_rng(args.seed))
+        loop_ms, ref = timed(loop, factory, images, bboxes_list, args.repeats)
+        batch_ms, out = timed(lambda op, imgs, boxes: op.transform_batch(imgs, boxes), factory, images,
+                              bboxes_list, args.repeats)
+        check(name, exact, ref, out)
+        results.append({'op': name, 'loop_ms': round(loop_ms, 2), 'batch_ms': round(batch_ms, 2),
+                        'speedup': round(loop_ms / max(batch_ms, 1e-3), 2), 'exact': exact})
+        print(f"{name:<20} loop {loop_ms:>9.2f} ms  batch {batch_ms:>9.2f} ms  x{results[-1]['speedup']}",
+              file=sys.stderr)
+
+    # Sequence: per-image probs, so compare timings only
+    sections = ['AdjustBrightness', 'AdjustContrast', 'HorizontalFlip', 'RandomHSV', 'Noisy']
+    factory = lambda: Sequence([create_op(s, rng=np.random.default_rng(args.seed)) for s in sections], probs=0.5,
+                               rng=np.random.default_rng(args.seed))
+    loop_ms, _ = timed(loop, factory, images, bboxes_list, args.repeats)
+    batch_ms, out = timed(lambda op, imgs, boxes: op.transform_batch(imgs, boxes), factory, images, bboxes_list,
+                          args.repeats)
+    assert np.asarray(out[0]).shape == images.shape, "Sequence: sai kích thước batch"
+    results.append({'op': 'Sequence[photometric,p=0.5]', 'loop_ms': round(loop_ms, 2), 'batch_ms': round(batch_ms, 2),
+                    'speedup': round(loop_ms / max(batch_ms, 1e-3), 2), 'exact': False})
+    print(f"{'Sequence[p=0.5]':<20} loop {loop_ms:>9.2f} ms  batch {batch_ms:>9.2f} ms  x{results[-1]['speedup']}",
+          file=sys.stderr)
+
+    text = json.dumps({'batch': args.batch, 'size': args.size, 'repeats': args.repeats, 'results': results}, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
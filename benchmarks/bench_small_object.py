@@ -0,0 +1,160 @@
+"""
+Benchmark SmallObjectAugmentation placement on dense scenes
+
+Compares the batched collision check with the previous per-candidate Python
+loop (kept below as ReferenceSmallObjectAugmentation) on synthetic crowd /
+shelf images with many small boxes. Reports ms per call and how many copies
+got placed, and checks that every placed copy is inside the image and free
+of overlaps.
+
+    python benchmarks/bench_small_object.py
+    python benchmarks/bench_small_object.py --boxes 100 300 1000 --repeats 5
+
+The reference takes minutes per call at 1000 boxes, hence the smaller default.
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from augmentations.small_object_augmentation import SmallObjectAugmentation
+
+
+class ReferenceSmallObjectAugmentation(SmallObjectAugmentation):
+    """Previous implementation: one Python overlap test per (candidate, box) pair"""
+
+    def compute_overlap(self, annot_a, annot_b):
+        if annot_a is None:
+            return False
+        left_max = max(annot_a[0], annot_b[0])
+        top_max = max(annot_a[1], annot_b[1])
+        right_min = min(annot_a[2], annot_b[2])
+        bottom_min = min(annot_a[3], annot_b[3])
+        inter = max(0, right_min - left_max) * max(0, bottom_min - top_max)
+        return inter != 0
+
+    def do_not_overlap(self, new_annot, annots):
+        return not any(self.compute_overlap(new_annot, annot) for annot in annots)
+
+    def create_copy_annot(self, h, w, annot, annots):
+        annot = annot.astype(np.int32)
+        annot_h, annot_w = annot[3] - annot[1], annot[2] - annot[0]
+        for _ in range(self.epochs):
+            random_x = self.rng.integers(int(annot_w / 2), int(w - annot_w / 2))
+            random_y = self.rng.integers(int(annot_h / 2), int(h - annot_h / 2))
+            xmin, ymin = random_x - annot_w // 2, random_y - annot_h // 2
+            xmax, ymax = xmin + annot_w, ymin + annot_h
+            if xmin < 0 or xmax > w or ymin < 0 or ymax > h:
+                continue
+            new_annot = np.array([xmin, ymin, xmax, ymax, annot[4]], dtype=np.int32)
+            if self.do_not_overlap(new_annot, annots):
+                return new_annot
+        return None
+
+    def transform(self, img, bboxes):
+        if self.all_objects and self.one_object:
+            return img, bboxes
+        if self.rng.random() > self.prob:
+            return img, bboxes
+
+        h, w = img.shape[:2]
+        annots = np.asarray(bboxes)
+        small_object_list = [idx for idx, annot in enumerate(annots)
+                             if self.is_small_object(annot[3] - annot[1], annot[2] - annot[0])]
+        l = len(small_object_list)
+        if l == 0:
+            return img, bboxes
+        if self.all_objects:
+            copy_object_num = l
+        elif self.one_object:
+            copy_object_num = 1
+        else:
+            copy_object_num = int(self.rng.integers(1, l + 1))
+
+        random_list = self.rng.choice(small_object_list, copy_object_num, replace=False)
+        select_annots = annots[random_list, :]
+        annots_list = annots.tolist()
+        for annot in select_annots:
+            for _ in range(self.copy_times):
+                new_annot = self.create_copy_annot(h, w, annot, annots_list)
+                if new_annot is not None:
+                    img = self.add_patch_in_img(new_annot, annot, img)
+                    annots_list.append(new_annot)
+        return img, np.array(annots_list, dtype=np.int32)
+
+
+def dense_scene(n_boxes, rng, width=1920, height=1080):
+    """Shelf-like scene: n_boxes boxes of 16-64 px scattered over the image"""
+    img = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    bw = rng.integers(16, 65, n_boxes)
+    bh = rng.integers(16, 65, n_boxes)
+    x1 = rng.integers(0, width - bw)
+    y1 = rng.integers(0, height - bh)
+    cls = rng.integers(0, 5, n_boxes)
+    return img, np.stack([x1, y1, x1 + bw, y1 + bh, cls], axis=1).astype(np.float32)
+
+
+def check_placement(boxes_in, boxes_out, width, height):
+    """Copies must lie in the image and not overlap any earlier box"""
+    for i in range(len(boxes_in), len(boxes_out)):
+        box = boxes_out[i]
+        assert 0 <= box[0] and 0 <= box[1] and box[2] <= width and box[3] <= height, "bbox nằm ngoài ảnh"
+        earlier = boxes_out[:i, :4]
+        overlap = (np.minimum(box[2], earlier[:, 2]) - np.maximum(box[0], earlier[:, 0]) > 0) & \
+                  (np.minimum(box[3], earlier[:, 3]) - np.maximum(box[1], earlier[:, 1]) > 0)
+        assert not overlap.any(), "bbox bị chồng lấn"
+
+
+def run(cls, img, bboxes, repeats, seed, **params):
+    timings, placed = [], []
+    for i in range(repeats):
+        op = cls(prob=1.0, rng=np.random.default_rng([seed, i]), **params)
+        img_in = img.copy()
+        start = time.perf_counter()
+        _, boxes_out = op.transform(img_in, bboxes.copy())
+        timings.append(time.perf_counter() - start)
+        check_placement(bboxes, boxes_out, img.shape[1], img.shape[0])
+        placed.append(len(boxes_out) - len(bboxes))
+    return {'ms_per_op': round(float(np.median(timings)) * 1000, 2), 'copies_placed': float(np.mean(placed))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SmallObjectAugmentation on dense scenes')
+    parser.add_argument('--boxes', nargs='+', type=int, default=[50, 300])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write the JSON report here (default: stdout)')
+    args = parser.parse_args()
+
+    modes = {'default': {}, 'all_objects': {'all_objects': True}, 'one_object': {'one_object': True}}
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for n_boxes in args.boxes:
+        img, bboxes = dense_scene(n_boxes, rng)
+        for mode, params in modes.items():
+            row = {'boxes': n_boxes, 'mode': mode,
+                   'reference': run(ReferenceSmallObjectAugmentation, img, bboxes, args.repeats, args.seed, **params),
+                   'batched': run(SmallObjectAugmentation, img, bboxes, args.repeats, args.seed, **params)}
+            row['speedup'] = round(row['reference']['ms_per_op'] / max(row['batched']['ms_per_op'], 1e-3), 1)
+            results.append(row)
+            print(f"{n_boxes:>5} boxes {mode:<12} reference {row['reference']['ms_per_op']:>10.2f} ms "
+                  f"({row['reference']['copies_placed']:.0f} copies)  batched {row['batched']['ms_per_op']:>8.2f} ms "
+                  f"({row['batched']['copies_placed']:.0f} copies)  x{row['speedup']}", file=sys.stderr)
+
+    text = json.dumps({'repeats': args.repeats, 'seed': args.seed, 'results': results}, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
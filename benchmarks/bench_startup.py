@@ -0,0 +1,112 @@
+"""
+Startup benchmark: import time and memory of the entry points
+
+Each scenario runs in a fresh interpreter and reports wall time, peak RSS and
+whether torch got imported. The 'eager' scenario imports every module in
+augmentations/ up front, as main.py and the webapp did before the lazy registry
+(augmentations/registry.py). The ops no longer import torchvision, so the
+'baseline' scenario adds the torchvision import they had before, to show the
+startup cost of the original code; it is skipped when torchvision is not
+installed.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeats 5 --out startup.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib.util
+import subprocess
+import configparser
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child; prints the measurements as one JSON line
+CHILD = r'''
+import sys, time, json, resource
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': elapsed, 'max_rss_kb': rss, 'torch': 'torch' in sys.modules}}))
+'''
+
+EAGER = 'import importlib\nfrom augmentations.registry import OPS\n' \
+        'for module, _ in OPS.values(): importlib.import_module(module)'
+
+SCENARIOS = {
+    'main: import': 'import main',
+    'main: Augmentation(config)': 'import main\nmain.Augmentation({config!r})',
+    'webapp: AugmentationService()': 'from webapp.augmentation_service import AugmentationService\n'
+                                     'AugmentationService().create_single_augmentation("brightness")',
+    'eager: every op module': EAGER,
+    'baseline: eager + torchvision': 'import torchvision.transforms.functional\n' + EAGER,
+}
+
+# Scenarios that need an optional package, skipped without it
+REQUIRES = {'baseline: eager + torchvision': 'torchvision'}
+
+
+def write_config(tmp_dir):
+    """config.cfg with path_dataset/path_save moved into tmp_dir (Augmentation creates the output folders)"""
+    config = configparser.ConfigParser()
+    config.read(os.path.join(ROOT, 'config.cfg'))
+    config['MAIN']['path_dataset'] = os.path.join(tmp_dir, 'dataset')
+    config['MAIN']['path_save'] = os.path.join(tmp_dir, 'out')
+    path = os.path.join(tmp_dir, 'config.cfg')
+    with open(path, 'w') as f:
+        config.write(f)
+    return path
+
+
+def run_scenario(code, repeats):
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT, code=code)], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        process_seconds = time.perf_counter() - start
+        runs.append({**json.loads(out.stdout.strip().splitlines()[-1]), 'process_seconds': process_seconds})
+    return {
+        'import_ms': round(float(np.median([run['seconds'] for run in runs])) * 1000, 1),
+        'process_ms': round(float(np.median([run['process_seconds'] for run in runs])) * 1000, 1),
+        'max_rss_mb': round(max(run['max_rss_kb'] for run in runs) / 1024, 1),
+        'torch_imported': runs[-1]['torch'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark startup time of main.py and the webapp service')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--out', help='write the JSON report here (default: stdout)')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_path = write_config(tmp_dir)
+        for name, code in SCENARIOS.items():
+            if name in REQUIRES and importlib.util.find_spec(REQUIRES[name]) is None:
+                print(f"{name:<32} skipped ({REQUIRES[name]} not installed)", file=sys.stderr)
+                continue
+            row = {'scenario': name, **run_scenario(code.format(config=config_path), args.repeats)}
+            results.append(row)
+            print(f"{name:<32} {row['import_ms']:>9.1f} ms import {row['process_ms']:>9.1f} ms process "
+                  f"{row['max_rss_mb']:>8.1f} MB  torch={row['torch_imported']}", file=sys.stderr)
+
+    text = json.dumps({'python': sys.version.split()[0], 'repeats': args.repeats, 'results': results}, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
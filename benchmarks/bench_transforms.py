@@ -0,0 +1,244 @@
+"""
+Throughput benchmark for the transforms in augmentations/
+
+Runs every op (and a few Sequence chains) over synthetic images at several
+resolutions and box counts, plus the sample data in assets/, and reports
+images/sec, ms/op and peak traced memory as JSON.
+
+    python benchmarks/bench_transforms.py --out baseline.json
+    python benchmarks/bench_transforms.py --compare baseline.json --threshold 0.15
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from augmentations.brightness import AdjustBrightness
+from augmentations.contrast import AdjustContrast
+from augmentations.saturation import AdjustSaturation
+from augmentations.cutout import Cutout
+from augmentations.filters import Filters
+from augmentations.grid_mask import GridMask
+from augmentations.horizontal_flip import HorizontalFlip
+from augmentations.hsv import RandomHSV
+from augmentations.lighting_noise import LightingNoise
+from augmentations.mixup import Mixup
+from augmentations.noisy import Noisy
+from augmentations.resize import Resize
+from augmentations.rotate_only_bboxes import RotateOnlyBboxes
+from augmentations.rotate import Rotate
+from augmentations.scale import Scale
+from augmentations.sequence import Sequence
+from augmentations.shear import Shear
+from augmentations.small_object_augmentation import SmallObjectAugmentation
+from augmentations.translate import Translate
+from augmentations.fused_affine import FusedAffine
+from utils.utils import get_info_bbox_pascalvoc, get_info_bbox_yolo
+
+RESOLUTIONS = {'640': (640, 480), '1920': (1920, 1080), '4K': (3840, 2160)}
+BOX_COUNTS = (1, 10, 100)
+VOC_LABEL_MAPPING = {'bike': 0, 'dog': 1, 'car': 2}
+
+
+class PairTransform:
+    """Adapts Mixup's two-image signature by blending the input with itself"""
+
+    def __init__(self, op):
+        self.op = op
+
+    def transform(self, img, bboxes):
+        return self.op.transform(img, bboxes, img.copy(), bboxes.copy())
+
+
+def build_ops(seed=0):
+    rng = np.random.default_rng(seed)
+    ops = {
+        'AdjustBrightness': AdjustBrightness(rng=rng),
+        'AdjustContrast': AdjustContrast(rng=rng),
+        'AdjustSaturation': AdjustSaturation(rng=rng),
+        'Cutout': Cutout(rng=rng),
+        'Filters': Filters(rng=rng),
+        'GridMask': GridMask(prob=1.0, rng=rng),
+        'HorizontalFlip': HorizontalFlip(rng=rng),
+        'RandomHSV': RandomHSV(rng=rng),
+        'LightingNoise': LightingNoise(rng=rng),
+        'Mixup': PairTransform(Mixup(rng=rng)),
+        'Noisy': Noisy(rng=rng),
+        'Noisy[sp]': Noisy(noise_type='sp', rng=rng),
+        'Noisy[poisson]': Noisy(noise_type='poisson', rng=rng),
+        'Noisy[speckle]': Noisy(noise_type='speckle', rng=rng),
+        'Noisy[bank]': Noisy(bank_size=256, rng=rng),
+        'Resize': Resize(rng=rng),
+        'RotateOnlyBboxes': RotateOnlyBboxes(rng=rng),
+        'Rotate': Rotate(rng=rng),
+        'Scale': Scale(rng=rng),
+        'Shear': Shear(rng=rng),
+        'SmallObjectAugmentation': SmallObjectAugmentation(prob=1.0, rng=rng),
+        'Translate': Translate(rng=rng),
+    }
+    photometric = ['AdjustBrightness', 'AdjustContrast', 'AdjustSaturation', 'RandomHSV', 'Noisy']
+    geometric = ['HorizontalFlip', 'Scale', 'Rotate', 'Shear', 'Translate']
+    ops['Sequence[photometric]'] = Sequence([ops[name] for name in photometric], rng=rng)
+    ops['Sequence[geometric]'] = Sequence([ops[name] for name in geometric], rng=rng)
+    ops['Sequence[photometric+geometric]'] = Sequence([ops[name] for name in photometric + geometric], rng=rng)
+    ops['Sequence[geometric,fused]'] = Sequence([ops[name] for name in geometric], rng=rng, fuse_geometric=True)
+    ops['FusedAffine[Rotate]'] = FusedAffine([ops['Rotate']])
+    return ops
+
+
+def synthetic_sample(width, height, n_boxes, rng):
+    """Random image with n_boxes boxes covering 2-20% of each side"""
+    img = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    bw = rng.uniform(0.02, 0.2, n_boxes) * width
+    bh = rng.uniform(0.02, 0.2, n_boxes) * height
+    x1 = rng.uniform(0, width - bw)
+    y1 = rng.uniform(0, height - bh)
+    cls = rng.integers(0, 3, n_boxes)
+    bboxes = np.stack([x1, y1, x1 + bw, y1 + bh, cls], axis=1).astype(np.float32)
+    return img, np.floor(bboxes)
+
+
+def load_inputs(resolutions, box_counts, seed=0):
+    rng = np.random.default_rng(seed)
+    inputs = {}
+    for res_name in resolutions:
+        width, height = RESOLUTIONS[res_name]
+        for n_boxes in box_counts:
+            inputs[f'synthetic-{res_name}-b{n_boxes}'] = synthetic_sample(width, height, n_boxes, rng)
+
+    for name in ('sample', 'sample2'):
+        img = cv2.imread(os.path.join(ROOT, 'assets', 'voc', f'{name}.jpg'))
+        if img is not None:
+            xml_path = os.path.join(ROOT, 'assets', 'voc', f'{name}.xml')
+            inputs[f'assets-voc-{name}'] = (img, get_info_bbox_pascalvoc(xml_path, VOC_LABEL_MAPPING))
+        img = cv2.imread(os.path.join(ROOT, 'assets', 'yolo', f'{name}.jpg'))
+        if img is not None:
+            txt_path = os.path.join(ROOT, 'assets', 'yolo', f'{name}.txt')
+            inputs[f'assets-yolo-{name}'] = (img, get_info_bbox_yolo(img, txt_path))
+    return inputs
+
+
+def time_op(op, img, bboxes, repeats, warmup=1):
+    for _ in range(warmup):
+        op.transform(img.copy(), bboxes.copy())
+
+    timings = []
+    for _ in range(repeats):
+        img_in, bboxes_in = img.copy(), bboxes.copy()
+        start = time.perf_counter()
+        op.transform(img_in, bboxes_in)
+        timings.append(time.perf_counter() - start)
+
+    # Separate pass for memory, tracemalloc slows allocation-heavy code down
+    img_in, bboxes_in = img.copy(), bboxes.copy()
+    tracemalloc.start()
+    op.transform(img_in, bboxes_in)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ms_per_op = float(np.median(timings)) * 1000
+    return {
+        'ms_per_op': round(ms_per_op, 3),
+        'ms_p95': round(float(np.percentile(timings, 95)) * 1000, 3),
+        'images_per_sec': round(1000 / ms_per_op, 2) if ms_per_op > 0 else None,
+        'peak_mem_mb': round(peak / 2 ** 20, 2),
+    }
+
+
+def run(args):
+    ops = build_ops(args.seed)
+    if args.ops:
+        ops = {name: op for name, op in ops.items() if name in args.ops}
+    inputs = load_inputs(args.resolutions, args.boxes, args.seed)
+
+    results = []
+    for input_name, (img, bboxes) in inputs.items():
+        for op_name, op in ops.items():
+            try:
+                stats = time_op(op, img, bboxes, args.repeats)
+            except Exception as e:
+                stats = {'error': f'{type(e).__name__}: {e}'}
+            results.append({'op': op_name, 'input': input_name, **stats})
+            if not args.quiet:
+                print(format_row(results[-1]), file=sys.stderr)
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'repeats': args.repeats,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+
+def format_row(row):
+    if 'error' in row:
+        return f"{row['op']:<32} {row['input']:<24} ERROR {row['error']}"
+    return (f"{row['op']:<32} {row['input']:<24} {row['ms_per_op']:>10.2f} ms "
+            f"{row['images_per_sec']:>9.1f} img/s {row['peak_mem_mb']:>8.1f} MB")
+
+
+def compare(report, baseline, threshold):
+    """Return rows whose ms/op is more than `threshold` slower than in the baseline"""
+    base = {(row['op'], row['input']): row for row in baseline['results'] if 'ms_per_op' in row}
+    regressions = []
+    for row in report['results']:
+        old = base.get((row['op'], row['input']))
+        if old is None or 'ms_per_op' not in row or old['ms_per_op'] <= 0:
+            continue
+        ratio = row['ms_per_op'] / old['ms_per_op']
+        if ratio > 1 + threshold:
+            regressions.append({'op': row['op'], 'input': row['input'], 'baseline_ms': old['ms_per_op'],
+                                'ms_per_op': row['ms_per_op'], 'slowdown': round(ratio, 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark augmentation transforms')
+    parser.add_argument('--out', help='write the JSON report here (default: stdout)')
+    parser.add_argument('--compare', help='baseline JSON report to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown ratio, 0.1 = 10%%')
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--resolutions', nargs='+', default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument('--boxes', nargs='+', type=int, default=list(BOX_COUNTS))
+    parser.add_argument('--ops', nargs='+', help='only run these ops')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+
+    report = run(args)
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report['regressions'] = compare(report, baseline, args.threshold)
+        for row in report['regressions']:
+            print(f"REGRESSION {row['op']} on {row['input']}: {row['baseline_ms']} -> {row['ms_per_op']} ms "
+                  f"(x{row['slowdown']})", file=sys.stderr)
+        exit_code = 1 if report['regressions'] else 0
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Parity check for the native OpenCV/NumPy photometric ops
+
+Runs AdjustBrightness, AdjustContrast, AdjustSaturation, LightingNoise and
+RotateOnlyBboxes next to the previous PIL + torchvision implementations
+(kept below as references) with the same seeds and reports how many pixels
+differ. Needs torch and torchvision installed.
+
+RotateOnlyBboxes resamples with nearest neighbour; OpenCV's fixed-point
+coordinates pick the other pixel when a sample lands within ~1e-3 px of a
+pixel edge, so it is checked against --max-resample-mismatch only.
+
+    python benchmarks/parity_photometric.py
+    python benchmarks/parity_photometric.py --samples 50 --max-diff 1 --max-mismatch 0.001
+
+tests/test_parity_photometric.py asserts the same tolerances under pytest.
+"""
+
+import os
+import sys
+import argparse
+
+import cv2
+import numpy as np
+from PIL import Image
+import torchvision.transforms.functional as F
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from augmentations.brightness import AdjustBrightness
+from augmentations.contrast import AdjustContrast
+from augmentations.saturation import AdjustSaturation
+from augmentations.lighting_noise import LightingNoise
+from augmentations.rotate_only_bboxes import RotateOnlyBboxes
+from benchmarks.bench_transforms import RESOLUTIONS, synthetic_sample, VOC_LABEL_MAPPING
+from utils.utils import get_info_bbox_pascalvoc
+
+
+class ReferenceAdjustBrightness(AdjustBrightness):
+    def transform(self, img, bboxes):
+        brightness_factor = self.brightness_min if self.brightness_min == self.brightness_max \
+            else self.rng.uniform(self.brightness_min, self.brightness_max)
+        img = Image.fromarray(img[..., ::-1])
+        img = F.adjust_brightness(img, brightness_factor)
+        return np.asarray(img)[..., ::-1], bboxes
+
+
+class ReferenceAdjustContrast(AdjustContrast):
+    def transform(self, img, bboxes):
+        contrast_factor = self.contrast_min if self.contrast_min == self.contrast_max \
+            else self.rng.uniform(self.contrast_min, self.contrast_max)
+        img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        img = F.adjust_contrast(img, contrast_factor)
+        return np.asarray(img)[..., ::-1], bboxes
+
+
+class ReferenceAdjustSaturation(AdjustSaturation):
+    def transform(self, img, bboxes):
+        saturation_factor = self.saturation_min if self.saturation_min == self.saturation_max \
+            else self.rng.uniform(self.saturation_min, self.saturation_max)
+        img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        img = F.adjust_saturation(img, saturation_factor)
+        return np.asarray(img)[..., ::-1], bboxes
+
+
+class ReferenceLightingNoise(LightingNoise):
+    def transform(self, img, bboxes):
+        perms = [(0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0)]
+        swap = perms[self.rng.integers(len(perms))]
+        img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        img_tensor = F.to_tensor(img)[swap, :, :]
+        return np.array(F.to_pil_image(img_tensor))[:, :, ::-1], bboxes
+
+
+class ReferenceRotateOnlyBboxes(RotateOnlyBboxes):
+    def transform(self, img, bboxes):
+        img_tensor = F.to_tensor(img)
+        boxes = np.asarray(bboxes).copy()
+        for box in boxes:
+            x_min, y_min, x_max, y_max = map(int, box[:4])
+            x_min = max(0, x_min)
+            y_min = max(0, y_min)
+            x_max = min(img_tensor.shape[2] - 1, x_max)
+            y_max = min(img_tensor.shape[1] - 1, y_max)
+            if x_max <= x_min or y_max <= y_min:
+                continue
+            bbox_img = F.to_pil_image(img_tensor[:, y_min:y_max+1, x_min:x_max+1]).rotate(self.angle)
+            img_tensor[:, y_min:y_max+1, x_min:x_max+1] = F.to_tensor(bbox_img)
+        # The old implementation returned RGB here; compare against the BGR it should have returned
+        return np.array(F.to_pil_image(img_tensor)), boxes
+
+
+# Default tolerances: absolute pixel difference and fraction of differing values (resampling
+# ops are only held to MAX_RESAMPLE_MISMATCH)
+MAX_DIFF = 1
+MAX_MISMATCH = 0.001
+MAX_RESAMPLE_MISMATCH = 0.005
+
+# name -> (native op, reference op, resamples pixels)
+PAIRS = {
+    'AdjustBrightness': (AdjustBrightness, ReferenceAdjustBrightness, False),
+    'AdjustContrast': (AdjustContrast, ReferenceAdjustContrast, False),
+    'AdjustSaturation': (AdjustSaturation, ReferenceAdjustSaturation, False),
+    'LightingNoise': (LightingNoise, ReferenceLightingNoise, False),
+    'RotateOnlyBboxes': (RotateOnlyBboxes, ReferenceRotateOnlyBboxes, True),
+}
+
+
+def load_inputs(samples, seed=0):
+    rng = np.random.default_rng(seed)
+    inputs = []
+    for name in ('sample', 'sample2'):
+        img = cv2.imread(os.path.join(ROOT, 'assets', 'voc', f'{name}.jpg'))
+        if img is not None:
+            xml_path = os.path.join(ROOT, 'assets', 'voc', f'{name}.xml')
+            inputs.append((f'assets-voc-{name}', img, get_info_bbox_pascalvoc(xml_path, VOC_LABEL_MAPPING)))
+    for i in range(samples):
+        width, height = RESOLUTIONS['640']
+        img, bboxes = synthetic_sample(width, height, 10, rng)
+        # Smooth the noise so the sample looks more like a photo
+        inputs.append((f'synthetic-{i}', cv2.GaussianBlur(img, (0, 0), 3), bboxes))
+    return inputs
+
+
+def check(name, inputs, seed):
+    native_cls, reference_cls, _ = PAIRS[name]
+    native, reference = native_cls(rng=np.random.default_rng(seed)), reference_cls(rng=np.random.default_rng(seed))
+    worst = {'op': name, 'max_diff': 0, 'mismatch': 0.0}
+    for _, img, bboxes in inputs:
+        out, out_boxes = native.transform(img.copy(), bboxes.copy())
+        ref, ref_boxes = reference.transform(img.copy(), bboxes.copy())
+        assert out.shape == ref.shape and out.dtype == ref.dtype, f"{name}: khác shape/dtype"
+        assert np.array_equal(out_boxes, ref_boxes), f"{name}: bbox khác nhau"
+        diff = cv2.absdiff(out, np.ascontiguousarray(ref))
+        worst['max_diff'] = max(worst['max_diff'], int(diff.max()))
+        worst['mismatch'] = max(worst['mismatch'], float(np.count_nonzero(diff)) / diff.size)
+    return worst
+
+
+def within_tolerance(name, row, max_diff=MAX_DIFF, max_mismatch=MAX_MISMATCH,
+                     max_resample_mismatch=MAX_RESAMPLE_MISMATCH):
+    """True if check()'s worst case for `name` is within the tolerances"""
+    if PAIRS[name][2]:
+        return row['mismatch'] <= max_resample_mismatch
+    return row['max_diff'] <= max_diff and row['mismatch'] <= max_mismatch
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare native photometric ops with the torchvision versions')
+    parser.add_argument('--samples', type=int, default=20, help='number of synthetic images')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-diff', type=int, default=MAX_DIFF, help='allowed absolute pixel difference')
+    parser.add_argument('--max-mismatch', type=float, default=MAX_MISMATCH, help='allowed fraction of differing values')
+    parser.add_argument('--max-resample-mismatch', type=float, default=MAX_RESAMPLE_MISMATCH,
+                        help='allowed fraction of differing values for resampling ops')
+    args = parser.parse_args()
+
+    inputs = load_inputs(args.samples, args.seed)
+    failed = False
+    for name in PAIRS:
+        row = check(name, inputs, args.seed)
+        ok = within_tolerance(name, row, args.max_diff, args.max_mismatch, args.max_resample_mismatch)
+        failed |= not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {name:<20} max diff {row['max_diff']:>3}  "
+              f"mismatch {row['mismatch']:.5%}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
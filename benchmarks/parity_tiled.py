@@ -0,0 +1,124 @@
+"""
+Parity check for tiled execution (augmentations/tiled.py)
+
+Every op runs once through transform() and once through transform_tiled()
+with a small memory ceiling (many strips), each with a fresh Generator from
+the same seed, and the outputs are compared pixel by pixel. Ops that are
+pixel-local or filter with a halo must match exactly. Geometric ops and
+rotated GridMask run whole by default (tile_geometric = exact) and must match
+exactly too; with --geometric remap they sample their own coordinates per strip
+instead of warpAffine's fixed-point ones, so they are checked against
+--max-resample-mismatch, and against themselves at a different strip size
+(which must match exactly). Noisy draws its noise per strip and is only run,
+not compared.
+
+    python benchmarks/parity_tiled.py
+    python benchmarks/parity_tiled.py --geometric remap
+    python benchmarks/parity_tiled.py --size 3000 --memory-mb 4 --samples 5
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from augmentations.registry import create_op
+from augmentations.fused_affine import FusedAffine, is_geometric
+from augmentations.tiled import Tiler, transform_tiled
+
+# name -> (config section, params, 'exact' | 'resample' | None)
+OPS = {
+    'AdjustBrightness': ('AdjustBrightness', {}, 'exact'),
+    'AdjustContrast': ('AdjustContrast', {}, 'exact'),
+    'AdjustSaturation': ('AdjustSaturation', {}, 'exact'),
+    'Cutout': ('Cutout', {}, 'exact'),
+    'Filters': ('Filters', {}, 'exact'),
+    'GridMask': ('GridMask', {'prob': 1.0}, 'exact'),
+    'GridMask[rotate]': ('GridMask', {'prob': 1.0, 'rotate': 360}, 'resample'),
+    'RandomHSV': ('RandomHSV', {}, 'exact'),
+    'LightingNoise': ('LightingNoise', {}, 'exact'),
+    'Noisy': ('Noisy', {}, None),
+    'HorizontalFlip': ('HorizontalFlip', {}, 'exact'),
+    'Rotate': ('Rotate', {}, 'resample'),
+    'Scale': ('Scale', {}, 'resample'),
+    'Shear': ('Shear', {}, 'resample'),
+    'Translate': ('Translate', {}, 'resample'),
+}
+
+
+def make_sample(h, w, n_boxes, rng):
+    # Smooth gradients plus noise, so filters and interpolation see realistic neighbourhoods
+    yy, xx = np.mgrid[0:h, 0:w]
+    base = (np.sin(xx / 37.0) + np.cos(yy / 23.0)) * 60 + 128
+    img = np.clip(base[..., None] + rng.normal(0, 20, (h, w, 3)), 0, 255).astype(np.uint8)
+    xy = rng.uniform(0, min(h, w) * 0.7, (n_boxes, 2))
+    wh = rng.uniform(16, min(h, w) * 0.3, (n_boxes, 2))
+    bboxes = np.hstack((xy, xy + wh, rng.integers(0, 3, (n_boxes, 1)))).astype(np.float32)
+    return img, bboxes
+
+
+def run(section, params, seed, img, bboxes, tiler=None):
+    op = create_op(section, rng=np.random.default_rng(seed), **params)
+    if is_geometric(op):
+        op = FusedAffine([op])
+    start = time.perf_counter()
+    if tiler is None:
+        out = op.transform(img.copy(), bboxes.copy())
+    else:
+        out = transform_tiled(op, img.copy(), bboxes.copy(), tiler)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1500, help='image height (width is 4/3 of it)')
+    parser.add_argument('--memory-mb', type=float, default=2, help='tile_memory_mb for the tiled runs')
+    parser.add_argument('--samples', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-resample-mismatch', type=float, default=0.02,
+                        help='fraction of pixels that may differ for geometric ops and rotated GridMask')
+    parser.add_argument('--geometric', choices=('exact', 'remap'), default='exact',
+                        help='tile_geometric mode of the tiled runs')
+    args = parser.parse_args()
+
+    h, w = args.size, args.size * 4 // 3
+    exact = args.geometric == 'exact'
+    tiler, other_tiler = Tiler(args.memory_mb, exact=exact), Tiler(args.memory_mb * 3, exact=exact)
+    rng = np.random.default_rng(args.seed)
+    samples = [make_sample(h, w, 8, rng) for _ in range(args.samples)]
+
+    failed = False
+    print(f'{"op":<18} {"mismatch":>10} {"max diff":>9} {"whole ms":>9} {"tiled ms":>9}  status')
+    for name, (section, params, check) in OPS.items():
+        mismatch, max_diff, t_whole, t_tiled, ok = 0.0, 0, 0.0, 0.0, True
+        for i, (img, bboxes) in enumerate(samples):
+            seed = args.seed + i
+            (ref, ref_boxes), dt_whole = run(section, params, seed, img, bboxes)
+            (out, out_boxes), dt_tiled = run(section, params, seed, img, bboxes, tiler)
+            t_whole += dt_whole
+            t_tiled += dt_tiled
+            if check is None:
+                ok &= out.shape == ref.shape
+                continue
+            diff = np.abs(out.astype(np.int16) - ref)
+            mismatch = max(mismatch, np.count_nonzero(diff) / diff.size)
+            max_diff = max(max_diff, int(diff.max()))
+            ok &= np.allclose(np.asarray(out_boxes, dtype=np.float32), np.asarray(ref_boxes, dtype=np.float32))
+            if check == 'exact' or exact:
+                ok &= mismatch == 0
+            else:
+                (other, _), _ = run(section, params, seed, img, bboxes, other_tiler)
+                ok &= mismatch <= args.max_resample_mismatch and np.array_equal(other, out)
+        failed |= not ok
+        print(f'{name:<18} {mismatch:>10.4%} {max_diff:>9} {t_whole / len(samples) * 1000:>9.1f} '
+              f'{t_tiled / len(samples) * 1000:>9.1f}  {"ok" if ok else "FAIL"}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,40 +4,125 @@ import yaml
 import cv2
 import ast
 import configparser
+import copy
+import time
+import hashlib
+import threading
+import itertools
+import multiprocessing
+import numpy as np
+from collections import deque
+from multiprocessing.util import Finalize
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from tqdm import tqdm
 from shutil import copyfile
 
-# Import augmentation modules
-from augmentations.brightness import AdjustBrightness
-from augmentations.contrast import AdjustContrast
-from augmentations.saturation import AdjustSaturation
-from augmentations.cutout import Cutout
-from augmentations.filters import Filters
-from augmentations.grid_mask import GridMask
-from augmentations.horizontal_flip import HorizontalFlip
-from augmentations.hsv import RandomHSV
-from augmentations.lighting_noise import LightingNoise
-from augmentations.mixup import Mixup
-from augmentations.noisy import Noisy
-from augmentations.resize import Resize
-from augmentations.rotate_only_bboxes import RotateOnlyBboxes
-from augmentations.rotate import Rotate
-from augmentations.scale import Scale
+# Augmentation modules are imported lazily through the registry
+from augmentations.fused_affine import FusedAffine, is_geometric
 from augmentations.sequence import Sequence
-from augmentations.shear import Shear
-from augmentations.small_object_augmentation import SmallObjectAugmentation
-from augmentations.translate import Translate
+from augmentations.registry import create_op
+from augmentations.tiled import Tiler, transform_tiled
 
 # Import utility functions
-from utils.utils import create_folder, save_sample, get_info_bbox_yolo, get_info_bbox_pascalvoc
+from utils.utils import create_folder, save_sample, encode_sample, get_info_bbox_yolo, get_info_bbox_pascalvoc, parse_yolo_label
+from utils.writer import AsyncWriter, when_all_done
+from utils.manifest import RunManifest
+from utils.profiler import StageProfiler
+from utils.annotation_cache import AnnotationCache
+from utils.dataset import scan_dataset, hash_split, stratified_split
+from utils.shards import ShardWriter
+from utils.array_stack import ArrayStackWriter
+from utils.encoder import ImageEncoder, EncodeStats
+from utils.image_cache import ImageCache
+
+
+# Config sections applied to every labeled image, in output order
+AUGMENTATIONS = [
+    'AdjustBrightness', 'AdjustContrast', 'AdjustSaturation', 'Cutout', 'Filters', 'GridMask',
+    'HorizontalFlip', 'RandomHSV', 'LightingNoise', 'Mixup', 'Mosaic', 'Noisy', 'Resize', 'RotateOnlyBboxes',
+    'Rotate', 'Scale', 'Shear', 'SmallObjectAugmentation', 'Translate',
+]
+
+# Per-process Augmentation instance used by pool workers (see _init_worker)
+_worker_augmentation = None
+
+
+def _init_worker(config_path, seed, overrides, counter, reports):
+    global _worker_augmentation
+    # Forked workers inherit the parent's RNG state; reseed so they don't produce identical samples
+    random.seed()
+    np.random.seed()
+    # Workers number themselves 1..workers from a counter shared by the pool
+    with counter.get_lock():
+        counter.value += 1
+        worker_index = counter.value
+    worker_seed = None if seed is None else [seed, worker_index]
+    # Constructor overrides of the parent (executor, resume, profile) apply to the workers too
+    _worker_augmentation = Augmentation(config_path, workers=1, seed=worker_seed, **overrides)
+    # Each worker appends to its own shards / stacks and manifest log, finished when the worker exits
+    _worker_augmentation.output_suffix = f'-w{worker_index}'
+    _worker_augmentation.manifest = RunManifest(_worker_augmentation.path_save, _worker_augmentation.output_suffix)
+    _worker_augmentation.manifest.append()
+    if _worker_augmentation.writer_threads > 0:
+        _worker_augmentation.writer = AsyncWriter(_worker_augmentation.writer_threads,
+                                                  _worker_augmentation.writer_queue_size)
+    Finalize(_worker_augmentation, _close_worker, args=(reports,), exitpriority=10)
+
+
+def _bounded_map(executor, fn, items, window):
+    """executor.map, in order, but with at most `window` items submitted ahead of the consumer"""
+    items = iter(items)
+    pending = deque(executor.submit(fn, item) for item in itertools.islice(items, window))
+    while pending:
+        result = pending.popleft().result()
+        for item in itertools.islice(items, 1):
+            pending.append(executor.submit(fn, item))
+        yield result
+
+
+def _augment_in_worker(job):
+    ops, error = _worker_augmentation._safe_process_image(*job)
+    filename = job[0]
+    # Stage timings and encode totals travel back with the result and are merged in the parent
+    timings = _worker_augmentation.profiler.drain() if _worker_augmentation.profiler.enabled else None
+    return filename, ops, error, timings, _worker_augmentation.encode_stats.drain()
+
+
+def _close_worker(reports):
+    """Finish the worker's pending writes when the pool shuts down and report them to the parent.
+
+    Images are only added to the worker's manifest log once their writes succeeded, so the ones
+    whose writes failed here are redone by a resumed run.
+    """
+    augmentation = _worker_augmentation
+    error = None
+    if augmentation.writer is not None:
+        try:
+            augmentation.writer.close()
+        except RuntimeError as e:
+            error = str(e)
+    augmentation.close_output_writers()
+    augmentation.manifest.close()
+    timings = augmentation.profiler.drain() if augmentation.profiler.enabled else None
+    reports.put((augmentation.output_suffix[1:], error, timings, augmentation.encode_stats.drain()))
 
 
 class Augmentation:
-    def __init__(self, config_path):
+    def __init__(self, config_path, workers=None, executor=None, seed=None, resume=None, profile=None):
         self.config_path = config_path
+        # Keyword overrides of the config, handed on to process workers (see _init_worker)
+        self.overrides = {key: value for key, value in
+                          (('executor', executor), ('resume', resume), ('profile', profile)) if value is not None}
         
         self.config_dict = self._load_config()
-        self._create_augmentation_object()
+
+        # Every op draws from an injected np.random.Generator; threads get their own child stream
+        self.seed = self.config_dict['MAIN'].get('seed') if seed is None else seed
+        self._seed_sequence = np.random.SeedSequence(self.seed)
+        self._seed_lock = threading.Lock()
+        self._thread_state = threading.local()
+        self._create_augmentation_object(rng=self._spawn_rng())
         
         # Paths
         self.path_dataset = self.config_dict['MAIN']['path_dataset']
@@ -47,13 +132,83 @@ class Augmentation:
         self.label_mapping = self.config_dict['MAIN']['label_mapping']
         self.scale_dataset = self.config_dict['MAIN']['scale']
 
+        # Number of worker processes, 0 means one per CPU core
+        self.workers = self.config_dict['MAIN'].get('workers', 1) if workers is None else workers
+        if self.workers <= 0:
+            self.workers = os.cpu_count() or 1
+        # 'process' pool or in-process 'thread' pool (OpenCV/NumPy kernels release the GIL)
+        self.executor = self.config_dict['MAIN'].get('executor', 'process') if executor is None else executor
+        assert self.executor in ('process', 'thread'), f"Unknown executor: {self.executor}"
+
+        # Background encode/write stage for save_sample, 0 threads writes synchronously
+        self.writer_threads = self.config_dict['MAIN'].get('writer_threads', 0)
+        self.writer_queue_size = self.config_dict['MAIN'].get('writer_queue_size', 64)
+        self.writer = None
+
+        # files: loose images/ and labels/ per split, shards: tar shards in shards/ (utils/shards.py),
+        # npy: raw uint8 arrays and boxes in a memory-mappable stack in arrays/ (utils/array_stack.py)
+        self.output_format = self.config_dict['MAIN'].get('output_format', 'files')
+        assert self.output_format in ('files', 'shards', 'npy'), \
+            f"output_format nên là 'files', 'shards' hoặc 'npy', không phải {self.output_format}"
+        self.shard_max_bytes = int(self.config_dict['MAIN'].get('shard_max_mb', 1024) * 2 ** 20)
+        self.shard_max_count = self.config_dict['MAIN'].get('shard_max_count', 10000)
+        self.output_suffix = ''
+        self._output_writers = {}
+        self._output_lock = threading.Lock()
+        # image_format (jpg, png, webp) and its jpeg_* / png_* / webp_* settings
+        self.encode_stats = EncodeStats()
+        self.encoder = ImageEncoder.from_config(self.config_dict['MAIN'], self.encode_stats)
+
+        # Skip work recorded in path_save/manifest*.jsonl by an interrupted run
+        self.resume = self.config_dict['MAIN'].get('resume', False) if resume is None else resume
+        self.manifest = None
+        self.completed = set()
+
+        # Per-stage timings, reported to path_save/profile.json at the end of create()
+        self.profile = self.config_dict['MAIN'].get('profile', False) if profile is None else profile
+        self.profiler = StageProfiler(enabled=self.profile)
+
+        # Parsed labels kept in path_dataset/.annotations_cache.npz, re-parsed only when files change
+        self.annotations = None
+        if self.config_dict['MAIN'].get('annotation_cache', True) and self.src_type_dataset in ('yolo', 'voc'):
+            self.annotations = AnnotationCache(self.path_dataset, self.src_type_dataset, self.label_mapping)
+
+        # random (shuffle), hash (stable per file) or stratified (by each image's rarest class)
+        self.split_mode = self.config_dict['MAIN'].get('split_mode', 'random')
+        assert self.split_mode in ('random', 'hash', 'stratified'), \
+            f"split_mode nên là một trong ('random', 'hash', 'stratified'), không phải {self.split_mode}"
+        # Also look for images in subfolders of path_dataset (labels sit next to their image)
+        self.recursive = self.config_dict['MAIN'].get('recursive', False)
+
+        # Run geometric ops as a single warp (Rotate otherwise resamples twice)
+        self.fuse_geometric = self.config_dict['MAIN'].get('fuse_geometric', False)
+        # Images over tile_memory_mb run through the ops' transform_tiled in row strips whose
+        # temporaries stay under it (augmentations/tiled.py), 0 processes every image whole.
+        # tile_geometric = exact runs geometric ops whole so tiled output is identical to untiled,
+        # remap bounds their memory too, with a few pixels differing by one interpolation step
+        tile_memory_mb = self.config_dict['MAIN'].get('tile_memory_mb', 0)
+        tile_geometric = self.config_dict['MAIN'].get('tile_geometric', 'exact')
+        assert tile_geometric in ('exact', 'remap'), \
+            f"tile_geometric nên là 'exact' hoặc 'remap', không phải {tile_geometric}"
+        self.tiler = Tiler(tile_memory_mb, exact=tile_geometric == 'exact') if tile_memory_mb > 0 else None
+
+        # Multi-image ops (Mixup, Mosaic) blend each image with partners drawn from its split; decoded
+        # samples are kept in an LRU cache of image_cache_mb (per process) so partners aren't re-read
+        self.num_partners = max((getattr(aug_object, 'num_images', 1) - 1
+                                 for aug_object in self.augmentation_objects.values()), default=0)
+        self.image_cache = None
+        if self.num_partners > 0:
+            cache_bytes = int(self.config_dict['MAIN'].get('image_cache_mb', 512) * 2 ** 20)
+            self.image_cache = ImageCache(self._load_sample, cache_bytes)
+
         self.train_path = os.path.join(self.path_save, 'train')
         self.val_path = os.path.join(self.path_save, 'val')
         self.test_path = os.path.join(self.path_save, 'test')
         for folder in [self.path_save, self.train_path, self.val_path, self.test_path]:
             create_folder(folder)
         
-        self.type_img = 'jpg'
+        self.type_format_label = {'yolo': 'txt', 'voc': 'xml', 'labelme': 'json'}.get(self.src_type_dataset, 'txt')
+        self.splits = None
         
 
     def _load_config(self):
@@ -75,6 +230,17 @@ class Augmentation:
                 scale_str = config_dict['MAIN']['scale'].strip("[]")  
                 config_dict['MAIN']['scale'] = [float(item.strip()) for item in scale_str.split(",")]
 
+        if 'ops' in config_dict.get('Sequence', {}):
+            ops_str = config_dict['Sequence']['ops'].strip("[]")
+            config_dict['Sequence']['ops'] = [item.strip().strip("'").strip('"') for item in ops_str.split(",") if item.strip()]
+            # probs: one number for every op, or one per op ("0.5, 1.0" or "[0.5, 1.0]")
+            probs = config_dict['Sequence'].get('probs', 1)
+            if isinstance(probs, str):
+                probs = [float(item.strip()) for item in probs.strip("[]").split(",") if item.strip()]
+                assert len(probs) == len(config_dict['Sequence']['ops']), \
+                    f"probs của [Sequence] cần {len(config_dict['Sequence']['ops'])} giá trị, một cho mỗi op trong ops"
+                config_dict['Sequence']['probs'] = probs
+
         return config_dict
 
     @staticmethod
@@ -113,100 +279,57 @@ class Augmentation:
         copyfile(self.config_path, os.path.join(self.path_save, 'config.cfg'))
 
 
-    def _create_augmentation_object(self):
-        self.adjust_brightness_used = self.config_dict['AdjustBrightness']['used']
-        self.adjust_brightness = AdjustBrightness(brightness_min=self.config_dict['AdjustBrightness']['brightness_min'],
-                                                   brightness_max=self.config_dict['AdjustBrightness']['brightness_max'])
-        
-        self.adjust_contrast_used = self.config_dict['AdjustContrast']['used']
-        self.adjust_contrast = AdjustContrast(contrast_min=self.config_dict['AdjustContrast']['contrast_min'],
-                                            contrast_max=self.config_dict['AdjustContrast']['contrast_max'])
-        
-        self.adjust_saturation_used = self.config_dict['AdjustSaturation']['used']
-        self.adjust_saturation = AdjustSaturation(saturation_min=self.config_dict['AdjustSaturation']['saturation_min'],
-                                                 saturation_max=self.config_dict['AdjustSaturation']['saturation_max'])
-        
-        self.cutout_used = self.config_dict['Cutout']['used']
-        self.cutout = Cutout(amount=self.config_dict['Cutout']['amount'])
-        
-        self.filters_used = self.config_dict['Filters']['used']
-        self.filters = Filters()
-        
-        self.grid_mask_uesd = self.config_dict['GridMask']['used']
-        self.grid_mask = GridMask(use_h=self.config_dict['GridMask']['use_h'],
-                                  use_w=self.config_dict['GridMask']['use_w'],
-                                  rotate=self.config_dict['GridMask']['rotate'],
-                                  offset=self.config_dict['GridMask']['offset'],
-                                  ratio=self.config_dict['GridMask']['ratio'],
-                                  mode=self.config_dict['GridMask']['mode'],
-                                  prob=self.config_dict['GridMask']['prob'])
-        
-        self.horizontal_flip_used = self.config_dict['HorizontalFlip']['used']
-        self.horizontal_flip = HorizontalFlip()
-        
-        self.random_hsv_used = self.config_dict['RandomHSV']['used']
-        self.random_hsv = RandomHSV(hue=self.config_dict['RandomHSV']['hue'],
-                                    saturation=self.config_dict['RandomHSV']['saturation'],
-                                    brightness=self.config_dict['RandomHSV']['brightness'])
-        
-        self.lighting_noise_used = self.config_dict['LightingNoise']['used']
-        self.lighting_noise = LightingNoise()
-        
-        self.mixup_used = self.config_dict['Mixup']['used']
-        self.mixup = Mixup(lambd=self.config_dict['Mixup']['lambd'])
-        
-        self.noisy_used = self.config_dict['Noisy']['used']
-        self.noisy = Noisy(noise_type=self.config_dict['Noisy']['noise_type'])
-        
-        self.resize_used = self.config_dict['Resize']['used']
-        self.resize = Resize(inp_dim=self.config_dict['Resize']['inp_dim'])
-        
-        self.rotate_only_bboxes_used = self.config_dict['RotateOnlyBboxes']['used']
-        self.rotate_only_bboxes = RotateOnlyBboxes(angle=self.config_dict['RotateOnlyBboxes']['angle'])
-        
-        self.rotate_used = self.config_dict['Rotate']['used']
-        self.rotate = Rotate(angle_min=self.config_dict['Rotate']['angle_min'],
-                             angle_max=self.config_dict['Rotate']['angle_max'])
-        
-        self.scale_used = self.config_dict['Scale']['used']
-        self.scale = Scale(scale_x_min=self.config_dict['Scale']['scale_x_min'],
-                            scale_x_max=self.config_dict['Scale']['scale_x_max'],
-                            scale_y_min=self.config_dict['Scale']['scale_y_min'],
-                            scale_y_max=self.config_dict['Scale']['scale_y_max'])
-        
-        self.shear_used = self.config_dict['Shear']['used']
-        self.shear = Shear(shear_min = self.config_dict['Shear']['shear_min'],
-                           shear_max = self.config_dict['Shear']['shear_max'])
-        
-        self.small_object_augmentation_used = self.config_dict['SmallObjectAugmentation']['used']
-        self.small_object_augmentation = SmallObjectAugmentation()
-        
-        self.translate_used = self.config_dict['Translate']['used']
-        self.translate = Translate(translate_min = self.config_dict['Translate']['translate_min'],
-                                   translate_max = self.config_dict['Translate']['translate_max'],
-                                   diff = self.config_dict['Translate']['diff'])
-
-        # self.sequence_used = self.config_dict['Sequence']['used']
-        # self.sequence = Sequence()
-    
+    def _create_augmentation_object(self, rng=None):
+        """Instantiate the enabled augmentations from their config sections (keys are constructor params)"""
+        self.augmentation_objects = {}
+        for name in AUGMENTATIONS:
+            section = self.config_dict.get(name, {})
+            if not section.get('used', False):
+                continue
+            params = {key: value for key, value in section.items() if key != 'used'}
+            self.augmentation_objects[name] = create_op(name, **params, rng=rng)
 
+        # [Sequence] chains its ops (configured by their own sections, used or not) into one more
+        # output; with fuse_geometric, consecutive geometric ops of the chain are a single warp
+        section = self.config_dict.get('Sequence', {})
+        if section.get('used', False) and section.get('ops'):
+            augmentations = []
+            for name in section.get('ops', []):
+                params = {key: value for key, value in self.config_dict.get(name, {}).items() if key != 'used'}
+                augmentations.append(create_op(name, **params, rng=rng))
+            assert all(getattr(aug, 'num_images', 1) == 1 for aug in augmentations), \
+                "Sequence chỉ nhận các phép biến đổi một ảnh"
+            self.augmentation_objects['Sequence'] = Sequence(
+                augmentations, probs=section.get('probs', 1), rng=rng,
+                fuse_geometric=self.config_dict['MAIN'].get('fuse_geometric', False))
 
     def split_dataset(self):
-        self.type_format_label = {'yolo': 'txt', 'voc': 'xml', 'labelme': 'json'}.get(self.src_type_dataset, 'txt')
-        
-        filenames = os.listdir(self.path_dataset)
-        
-        self.type_img = filenames[0].split('.')[-1]
-        
-        label_filenames = [f for f in filenames if f.endswith(self.type_format_label)]
-        img_filenames = [f for f in filenames if f.endswith(self.type_img)]
-        
-        label_stems = {f.rsplit('.', 1)[0] for f in label_filenames}
-        img_with_label = [f for f in img_filenames if f.rsplit('.', 1)[0] in label_stems]
-        img_without_label = [f for f in img_filenames if f.rsplit('.', 1)[0] not in label_stems]
-        
-        random.shuffle(img_with_label)
-        random.shuffle(img_without_label)
+        """Split the images of path_dataset (paths relative to it) into train, val and test lists"""
+        samples = scan_dataset(self.path_dataset, self.type_format_label, recursive=self.recursive)
+        with self.profiler.stage('split'):
+            if self.split_mode == 'hash':
+                splits = hash_split((filename for filename, _ in samples), self.scale_dataset, self.seed or 0)
+            elif self.split_mode == 'stratified':
+                # Two streamed passes over the labels instead of holding every image's classes
+                def labeled_samples():
+                    return ((filename, self._label_classes(filename) if has_label else ()) for filename, has_label
+                            in scan_dataset(self.path_dataset, self.type_format_label, recursive=self.recursive))
+                splits = stratified_split(labeled_samples, self.scale_dataset, self.seed or 0)
+            else:
+                splits = self._random_split(samples)
+        self._update_annotations(self._labeled(filename for split in splits for filename in split))
+        return splits
+
+    def _random_split(self, samples):
+        """Shuffled split, with labeled and unlabeled images cut separately"""
+        img_with_label, img_without_label = [], []
+        for filename, has_label in samples:
+            (img_with_label if has_label else img_without_label).append(filename)
+
+        # Reproducible with a seed, like the ops
+        shuffle = random.Random(self.seed).shuffle if self.seed is not None else random.shuffle
+        shuffle(img_with_label)
+        shuffle(img_without_label)
         
         train_cut_wol = int(len(img_without_label) * self.scale_dataset[0])
         val_cut_wol = int(len(img_without_label) * sum(self.scale_dataset[:2]))
@@ -218,14 +341,35 @@ class Augmentation:
         val_img = img_without_label[train_cut_wol:val_cut_wol] + img_with_label[train_cut_wl:val_cut_wl]
         test_img = img_without_label[val_cut_wol:] + img_with_label[val_cut_wl:]
     
-        random.shuffle(train_img)
-        random.shuffle(val_img)
-        random.shuffle(test_img)
+        shuffle(train_img)
+        shuffle(val_img)
+        shuffle(test_img)
         
         return train_img, val_img, test_img
 
+    def _label_classes(self, filename):
+        """Class ids of the boxes in an image's label (empty if it can't be parsed)"""
+        src_img, src_label = self._source_paths(filename)
+        try:
+            if self.annotations is not None:
+                bboxes, _ = self.annotations.get(src_label, src_img)
+            elif self.src_type_dataset == 'yolo':
+                bboxes = parse_yolo_label(src_label, 1, 1)
+            elif self.src_type_dataset == 'voc':
+                bboxes = get_info_bbox_pascalvoc(src_label, self.label_mapping)
+            else:
+                return ()
+        except Exception:
+            # Reported when the image itself is processed
+            return ()
+        return np.asarray(bboxes).reshape(-1, 5)[:, 4].astype(int).tolist()
 
-    def augment_data(self, img_paths, data_set='train'):
+    def _labeled(self, filenames):
+        """The filenames whose label file exists"""
+        return (filename for filename in filenames if os.path.exists(self._source_paths(filename)[1]))
+
+
+    def augment_data(self, img_paths, data_set='train', pool=None):
         save_path = {
             'train': self.train_path,
             'val': self.val_path,
@@ -235,62 +379,359 @@ class Augmentation:
             print(f"Invalid dataset type: {data_set}")
             return
 
-        img_save = os.path.join(save_path, 'images')
-        label_save = os.path.join(save_path, 'labels')
+        if self.output_format != 'files':
+            img_save = label_save = os.path.join(save_path, 'shards' if self.output_format == 'shards' else 'arrays')
+        else:
+            img_save = os.path.join(save_path, 'images')
+            label_save = os.path.join(save_path, 'labels')
         create_folder(img_save)
         create_folder(label_save)
 
         print(f'Processing {data_set} dataset...')
-        for filename in tqdm(img_paths):
-            src_img = os.path.join(self.path_dataset, filename)
+        partners = self._partner_sampler(img_paths, data_set)
+        skipped = sum(1 for filename in img_paths if (data_set, filename) in self.completed)
+        if skipped:
+            print(f'Skipping {skipped} image(s) completed by the previous run')
+            img_paths = [filename for filename in img_paths if (data_set, filename) not in self.completed]
+
+        jobs = [(filename, data_set, img_save, label_save, partners(filename)) for filename in img_paths]
+        if pool is None:
+            results = ((job[0], *self._safe_process_image(*job), None, None) for job in jobs)
+        elif isinstance(pool, ThreadPoolExecutor):
+            results = _bounded_map(pool, self._augment_in_thread, jobs, self.workers * 2)
+        else:
+            chunksize = max(1, min(16, len(jobs) // (self.workers * 4)))
+            results = pool.imap(_augment_in_worker, jobs, chunksize=chunksize)
+
+        # Process workers record their finished images in their own manifest log (see _init_worker)
+        failures = []
+        for filename, ops, error, timings, encoded in tqdm(results, total=len(img_paths)):
+            if timings:
+                self.profiler.merge(timings)
+            if encoded:
+                self.encode_stats.merge(encoded)
+            if error:
+                failures.append((filename, error))
+        if failures:
+            print(f'{len(failures)} image(s) failed in {data_set} dataset:')
+            for filename, error in failures:
+                print(f'  {filename}: {error}')
+
+    def _safe_process_image(self, filename, data_set, img_save, label_save, partners=()):
+        """Return (ops written, error message or None)"""
+        try:
+            return self._process_image(filename, data_set, img_save, label_save, partners), None
+        except Exception as e:
+            return [], f'{type(e).__name__}: {e}'
+
+    def _process_image(self, filename, data_set, img_save, label_save, partners=()):
+        src_img, src_label = self._source_paths(filename)
+        if not os.path.exists(src_label):
+            with self.profiler.stage('copy'):
+                name = self._sample_name(data_set, filename, 'original')
+                ext = os.path.splitext(filename)[1].lower()
+                if self.output_format == 'npy':
+                    self._output_writer(img_save).write(name, cv2.imread(src_img), np.zeros((0, 5), np.float32))
+                else:
+                    start = time.perf_counter()
+                    if self.output_format == 'shards':
+                        with open(src_img, 'rb') as f:
+                            self._output_writer(img_save).write(name, {ext: f.read()})
+                    else:
+                        copyfile(src_img, os.path.join(img_save, name + ext))
+                    self.encode_stats.add('original(copy)', time.perf_counter() - start, os.path.getsize(src_img))
+            self._record_done(data_set, filename, ['original'], [])
+            return ['original']
+
+        if self.image_cache is not None:
+            img, bboxes = self.image_cache.get(filename)
+        else:
+            img, bboxes = self._read_sample(src_img, src_label)
+        ops, futures = [], []
+        for img_out, bboxes_out, op_name in self._generate_samples(img, bboxes, data_set, partners):
+            name = self._sample_name(data_set, filename, op_name)
+            future = self._save_sample(img_out, bboxes_out, img_save, label_save, name)
+            ops.append(op_name)
+            if future is not None:
+                futures.append(future)
+        self._record_done(data_set, filename, ops, futures)
+        return ops
+
+    @staticmethod
+    def _sample_name(data_set, filename, op_name):
+        # Stable output name, so work redone after a resume overwrites instead of duplicating
+        return hashlib.md5(f'{data_set}/{filename}/{op_name}'.encode()).hexdigest()
+
+    def _record_done(self, data_set, filename, ops, futures):
+        """Add the image to the manifest once its pending writes have succeeded"""
+        if self.manifest is not None:
+            when_all_done(futures, lambda: self.manifest.record(data_set, filename, ops))
+
+    def _source_paths(self, filename):
+        src_img = os.path.join(self.path_dataset, filename)
+        src_label = os.path.splitext(src_img)[0] + '.' + self.type_format_label
+        return src_img, src_label
+
+    def _update_annotations(self, filenames):
+        """Bring the annotation cache up to date for these labeled images and save it"""
+        if self.annotations is None:
+            return
+        with self.profiler.stage('annotation_cache'):
+            pairs = (self._source_paths(filename)[::-1] for filename in filenames)
+            cached, parsed, failed = self.annotations.update(pairs)
+            self.annotations.save(prune=True)
+        print(f'Annotation cache: {cached} cached, {parsed} parsed, {failed} failed')
+
+    def _load_sample(self, filename):
+        """(image, boxes) of a labeled image, the ImageCache loader"""
+        src_img, src_label = self._source_paths(filename)
+        img, bboxes = self._read_sample(src_img, src_label)
+        if img is None:
+            raise IOError(f'Could not read image {src_img}')
+        return img, np.asarray(bboxes, dtype=np.float32).reshape(-1, 5)
+
+    def _partner_sampler(self, img_paths, data_set):
+        """filename -> partner filenames for the multi-image ops, drawn from the labeled images of the split"""
+        if self.num_partners == 0 or data_set == 'test':
+            return lambda filename: ()
+        pool = list(self._labeled(img_paths))
+        index = {filename: i for i, filename in enumerate(pool)}
+        rng = self._spawn_rng()
+
+        def partners(filename):
+            own = index.get(filename)
+            if own is None:
+                return ()
+            if len(pool) == 1:
+                return (filename,) * self.num_partners
+            # Any other image of the split: draw from n - 1 and skip over the image itself
+            picks = rng.integers(len(pool) - 1, size=self.num_partners)
+            return tuple(pool[k + (k >= own)] for k in picks)
+        return partners
+
+    def _read_sample(self, src_img, src_label):
+        with self.profiler.stage('imread'):
             img = cv2.imread(src_img)
-            src_label = src_img.replace(self.type_img, self.type_format_label)
-            if self.src_type_dataset == 'yolo':
+        with self.profiler.stage('parse_label'):
+            if self.annotations is not None:
+                bboxes, _ = self.annotations.get(src_label, src_img)
+            elif self.src_type_dataset == 'yolo':
                 bboxes = get_info_bbox_yolo(img, src_label)
             elif self.src_type_dataset == 'voc':
                 bboxes = get_info_bbox_pascalvoc(src_label, self.label_mapping)
+        return img, bboxes
 
-            
-            if os.path.exists(src_label):
-                save_sample(self.dest_type_dataset, img, bboxes, img_save, label_save, self.label_mapping)
-                if data_set == 'test':
+    def _augmentations(self):
+        """Enabled augmentations as (config section, object) pairs, in output order"""
+        augmentations = list(self.augmentation_objects.items())
+        if self.fuse_geometric:
+            augmentations = [(name, FusedAffine([aug_object]) if is_geometric(aug_object) else aug_object)
+                             for name, aug_object in augmentations]
+        return augmentations
+
+    def _generate_samples(self, img, bboxes, data_set, partners=()):
+        """Yield (image, bboxes, op_name) for the original sample and each enabled augmentation.
+
+        Multi-image ops get the image followed by its partner samples (read through the image cache)
+        and are skipped when there are none.
+        """
+        yield img, bboxes, 'original'
+        if data_set == 'test':
+            return
+
+        tiled = self.tiler is not None and self.tiler.needs_tiling(img)
+        for name, aug_object in self._augmentations():
+            num_images = getattr(aug_object, 'num_images', 1)
+            if num_images > 1:
+                if not partners:
                     continue
-                
-                augmentations = [
-                    (self.config_dict['AdjustBrightness']['used'], self.adjust_brightness),
-                    (self.config_dict['AdjustContrast']['used'], self.adjust_contrast),
-                    (self.config_dict['AdjustSaturation']['used'], self.adjust_saturation),
-                    (self.config_dict['Cutout']['used'], self.cutout),
-                    (self.config_dict['Filters']['used'], self.filters),
-                    (self.config_dict['GridMask']['used'], self.grid_mask),
-                    (self.config_dict['HorizontalFlip']['used'], self.horizontal_flip),
-                    (self.config_dict['RandomHSV']['used'], self.random_hsv),
-                    (self.config_dict['LightingNoise']['used'], self.lighting_noise),
-                    (self.config_dict['Noisy']['used'], self.noisy),
-                    (self.config_dict['Resize']['used'], self.resize),
-                    (self.config_dict['RotateOnlyBboxes']['used'], self.rotate_only_bboxes),
-                    (self.config_dict['Rotate']['used'], self.rotate),
-                    (self.config_dict['Scale']['used'], self.scale),
-                    (self.config_dict['Shear']['used'], self.shear),
-                    (self.config_dict['SmallObjectAugmentation']['used'], self.small_object_augmentation),
-                    (self.config_dict['Translate']['used'], self.translate)
-                ]
-
-                for used, aug_object in augmentations:
-                    if used:
-                        img_aug, bboxes_aug = aug_object.transform(img.copy(), bboxes.copy())
-                        save_sample(self.dest_type_dataset, img_aug, bboxes_aug, img_save, label_save, self.label_mapping)
+                with self.profiler.stage('partners'):
+                    group = [self.image_cache.get(partner) for partner in partners[:num_images - 1]]
+                with self.profiler.stage(f'op:{name}'):
+                    img_aug, bboxes_aug = aug_object.transform_multi([img] + [p_img for p_img, _ in group],
+                                                                     [bboxes] + [p_boxes for _, p_boxes in group])
+                yield img_aug, bboxes_aug, name
+                continue
+            with self.profiler.stage(f'op:{name}'):
+                if tiled:
+                    img_aug, bboxes_aug = transform_tiled(aug_object, img.copy(), bboxes.copy(), self.tiler)
+                else:
+                    img_aug, bboxes_aug = aug_object.transform(img.copy(), bboxes.copy())
+            yield img_aug, bboxes_aug, name
+
+    def iter_samples(self, split='train', img_paths=None):
+        """Lazily yield (image, bboxes, source_name, op_name) for a split without writing to path_save.
+
+        Uses the same ops and config as create(). The split comes from split_dataset() (computed once
+        per instance) unless img_paths is given. Images without a label are yielded once as 'original'
+        with no boxes.
+        """
+        if img_paths is None:
+            if self.splits is None:
+                self.splits = self.split_dataset()
+            img_paths = dict(zip(('train', 'val', 'test'), self.splits))[split]
+        img_paths = list(img_paths)
+        partners = self._partner_sampler(img_paths, split)
+
+        for filename in img_paths:
+            src_img, src_label = self._source_paths(filename)
+            if not os.path.exists(src_label):
+                yield cv2.imread(src_img), np.zeros((0, 5), dtype=np.float32), filename, 'original'
+                continue
+
+            if self.image_cache is not None:
+                img, bboxes = self.image_cache.get(filename)
             else:
-                copyfile(src_img, os.path.join(img_save, f'{random.getrandbits(128):x}.jpg'))
-    
+                img, bboxes = self._read_sample(src_img, src_label)
+            for img_out, bboxes_out, op_name in self._generate_samples(img, bboxes, split, partners(filename)):
+                yield img_out, bboxes_out, filename, op_name
+
+    def _save_sample(self, img, bboxes, img_save, label_save, name=None):
+        """Save now, or queue on the writer and return its Future"""
+        if self.writer is None:
+            self._timed_save(img, bboxes, img_save, label_save, name)
+            return None
+        return self.writer.submit(self._timed_save, img, bboxes, img_save, label_save, name)
+
+    def _timed_save(self, img, bboxes, img_save, label_save, name):
+        with self.profiler.stage('save'):
+            if self.output_format == 'npy':
+                self._output_writer(img_save).write(name, img, bboxes)
+            elif self.output_format == 'shards':
+                files = encode_sample(self.dest_type_dataset, img, bboxes, self.label_mapping, img_save, self.encoder)
+                if files:
+                    self._output_writer(img_save).write(name, files)
+            else:
+                save_sample(self.dest_type_dataset, img, bboxes, img_save, label_save, self.label_mapping, name,
+                            self.encoder)
+
+    def _output_writer(self, folder):
+        """Shard or array stack writer of an output folder, shared by the pool threads"""
+        with self._output_lock:
+            if folder not in self._output_writers:
+                if self.output_format == 'shards':
+                    writer = ShardWriter(folder, 'shard' + self.output_suffix, self.shard_max_bytes,
+                                         self.shard_max_count, skip_existing=self.resume)
+                else:
+                    writer = ArrayStackWriter(folder, 'stack' + self.output_suffix, self.encode_stats,
+                                              skip_existing=self.resume)
+                self._output_writers[folder] = writer
+            return self._output_writers[folder]
+
+    def close_output_writers(self):
+        """Finish the open shards / stacks (they stay readable without this, see ShardWriter)"""
+        with self._output_lock:
+            writers, self._output_writers = list(self._output_writers.values()), {}
+        for writer in writers:
+            writer.close()
+
+    def _spawn_rng(self):
+        with self._seed_lock:
+            return np.random.default_rng(self._seed_sequence.spawn(1)[0])
+
+    def _init_thread(self):
+        # Each pool thread works on a shallow copy holding its own op objects and Generator
+        augmentation = copy.copy(self)
+        augmentation._create_augmentation_object(rng=self._spawn_rng())
+        self._thread_state.augmentation = augmentation
+
+    def _augment_in_thread(self, job):
+        augmentation = self._thread_state.augmentation
+        return (job[0], *augmentation._safe_process_image(*job), None, None)
+
+    @contextmanager
+    def _writer_stage(self):
+        """Writer shared by the serial/thread paths, flushed when create() leaves it"""
+        # Process workers own their writers (see _init_worker)
+        if self.writer_threads <= 0 or (self.workers > 1 and self.executor == 'process'):
+            yield
+            return
+
+        with AsyncWriter(self.writer_threads, self.writer_queue_size) as writer:
+            self.writer = writer
+            try:
+                yield
+            finally:
+                self.writer = None
+
+    @contextmanager
+    def _worker_pool(self):
+        """Worker pool shared by the train, val and test splits (None when running serially)"""
+        if self.workers <= 1:
+            yield None
+            return
+
+        if self.executor == 'thread':
+            pool = ThreadPoolExecutor(self.workers, initializer=self._init_thread)
+            try:
+                yield pool
+            except BaseException:
+                # Drop the images not started yet; the running ones (at most one per thread) still
+                # use the shared writer and manifest, which create() closes right after
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+            pool.shutdown()
+            return
+
+        counter, reports = multiprocessing.Value('i', 0), multiprocessing.Queue()
+        pool = multiprocessing.Pool(self.workers, initializer=_init_worker,
+                                    initargs=(self.config_path, self.seed, self.overrides, counter, reports))
+        try:
+            yield pool
+        except BaseException:
+            # Drop the queued images instead of finishing the split; the killed workers' pending
+            # writes never reach their manifest logs, so a resumed run redoes those images
+            pool.terminate()
+            pool.join()
+            raise
+        pool.close()
+        # A worker only exits once its report is flushed to the queue, so read them before joining
+        self._merge_worker_reports(reports)
+        pool.join()
+
+    def _merge_worker_reports(self, reports):
+        """Merge what process workers sent on exit (see _close_worker) and print their write errors"""
+        # Every worker of the pool puts exactly one report when it shuts down
+        for _ in range(self.workers):
+            worker, error, timings, encoded = reports.get()
+            if timings:
+                self.profiler.merge(timings)
+            if encoded:
+                self.encode_stats.merge(encoded)
+            if error:
+                print(f'Worker {worker}: {error} (affected images are redone with resume)')
+
+    def _start_manifest(self):
+        """Open the run manifest, reusing the previous split and progress when resuming"""
+        self.manifest = RunManifest(self.path_save)
+        if self.resume and self.manifest.exists():
+            self.splits, self.completed = self.manifest.resume()
+            print(f'Resuming previous run: {len(self.completed)} image(s) already done')
+            self._update_annotations(self._labeled(filename for split in self.splits for filename in split))
+        else:
+            self.splits = self.split_dataset()
+            self.manifest.start(self.splits)
+            self.completed = set()
 
     def create(self):
-        train, val, test = self.split_dataset()
-        self.augment_data(train, 'train')
-        self.augment_data(val, 'val')
-        self.augment_data(test, 'test')
+        start = time.perf_counter()
+        with self.profiler.stage('split_dataset'):
+            self._start_manifest()
+        train, val, test = self.splits
+        try:
+            with self._writer_stage(), self._worker_pool() as pool:
+                self.augment_data(train, 'train', pool)
+                self.augment_data(val, 'val', pool)
+                self.augment_data(test, 'test', pool)
+        finally:
+            self.close_output_writers()
+            self.manifest.close()
         if self.dest_type_dataset == 'yolo':
             self.create_yaml()
+        print('Encoded output:')
+        self.encode_stats.report()
+        if self.profile:
+            self.profiler.report(time.perf_counter() - start, os.path.join(self.path_save, 'profile.json'))
         print('Create augmentation dataset complete...')
 
 if __name__ == "__main__":
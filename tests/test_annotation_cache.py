@@ -0,0 +1,165 @@
+"""
+Persistent annotation cache (utils/annotation_cache.py): cached boxes match a
+fresh parse, survive a reload, and are re-parsed when the label or its image
+changes, the class mapping changes or the cache file is damaged.
+
+    python -m pytest -q tests/test_annotation_cache.py
+"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from utils.annotation_cache import AnnotationCache, CACHE_FILENAME, read_image_size
+from utils.utils import parse_yolo_label, get_info_bbox_pascalvoc
+
+VOC_LABEL = """<annotation><size><width>80</width><height>60</height></size>
+<object><name>dog</name><bndbox><xmin>5</xmin><ymin>6</ymin><xmax>40</xmax><ymax>30</ymax></bndbox></object>
+<object><name>car</name><bndbox><xmin>10</xmin><ymin>12</ymin><xmax>70</xmax><ymax>50</ymax></bndbox></object>
+</annotation>"""
+
+
+def make_pair(folder, name, label_text, ext, shape=(60, 80, 3)):
+    img_path = os.path.join(folder, name + '.jpg')
+    label_path = os.path.join(folder, name + ext)
+    cv2.imwrite(img_path, np.full(shape, 128, np.uint8))
+    with open(label_path, 'w') as f:
+        f.write(label_text)
+    return label_path, img_path
+
+
+@pytest.fixture
+def yolo(tmp_path):
+    return str(tmp_path), make_pair(str(tmp_path), 'a', '0 0.5 0.5 0.25 0.5\n1 0.2 0.3 0.1 0.1\n', '.txt')
+
+
+def test_matches_parser_and_reloads(yolo):
+    folder, (label_path, img_path) = yolo
+    cache = AnnotationCache(folder, 'yolo')
+    boxes, size = cache.get(label_path, img_path)
+    assert size == (60, 80)
+    assert np.array_equal(boxes, parse_yolo_label(label_path, 80, 60).reshape(-1, 5))
+    cache.save()
+    assert os.path.exists(os.path.join(folder, CACHE_FILENAME))
+
+    reloaded = AnnotationCache(folder, 'yolo')
+    assert len(reloaded) == 1
+    assert reloaded.update([(label_path, img_path)]) == (1, 0, 0)
+    assert np.array_equal(reloaded.get(label_path, img_path)[0], boxes)
+
+
+def test_returns_copies(yolo):
+    folder, (label_path, img_path) = yolo
+    cache = AnnotationCache(folder, 'yolo')
+    boxes, _ = cache.get(label_path, img_path)
+    boxes[:] = -1
+    assert (cache.get(label_path, img_path)[0] != -1).all()
+
+
+def test_changed_label_is_reparsed(yolo):
+    folder, (label_path, img_path) = yolo
+    cache = AnnotationCache(folder, 'yolo')
+    cache.get(label_path, img_path)
+    cache.save()
+
+    with open(label_path, 'w') as f:
+        f.write('2 0.5 0.5 0.5 0.5\n')
+    cache = AnnotationCache(folder, 'yolo')
+    assert cache.update([(label_path, img_path)]) == (0, 1, 0)
+    boxes, _ = cache.get(label_path, img_path)
+    assert boxes[:, 4].tolist() == [2]
+
+
+def test_changed_image_size_is_reparsed(yolo):
+    folder, (label_path, img_path) = yolo
+    cache = AnnotationCache(folder, 'yolo')
+    cache.get(label_path, img_path)
+    cv2.imwrite(img_path, np.zeros((120, 160, 3), np.uint8))
+    boxes, size = cache.get(label_path, img_path)
+    assert size == (120, 160)
+    assert np.array_equal(boxes, parse_yolo_label(label_path, 160, 120).reshape(-1, 5))
+
+
+def test_voc_mapping_change_invalidates(tmp_path):
+    folder = str(tmp_path)
+    label_path, img_path = make_pair(folder, 'b', VOC_LABEL, '.xml')
+    mapping = {'dog': 0, 'car': 1}
+    cache = AnnotationCache(folder, 'voc', mapping)
+    boxes, _ = cache.get(label_path, img_path)
+    assert np.array_equal(boxes, get_info_bbox_pascalvoc(label_path, mapping).reshape(-1, 5))
+    cache.save()
+
+    swapped = {'dog': 1, 'car': 0}
+    cache = AnnotationCache(folder, 'voc', swapped)
+    assert len(cache) == 0
+    assert cache.get(label_path, img_path)[0][:, 4].tolist() == [1, 0]
+
+
+def test_damaged_cache_starts_over(yolo):
+    folder, (label_path, img_path) = yolo
+    with open(os.path.join(folder, CACHE_FILENAME), 'wb') as f:
+        f.write(b'not a zip')
+    cache = AnnotationCache(folder, 'yolo')
+    assert len(cache) == 0
+    assert cache.update([(label_path, img_path)]) == (0, 1, 0)
+
+
+def truncate(path):
+    data = open(path, 'rb').read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+
+
+def corrupt_member(path):
+    # np.savez stores members uncompressed: flip bytes of the boxes array, failing its CRC check
+    data = bytearray(open(path, 'rb').read())
+    start = data.index(b'boxes.npy') + 200
+    data[start:start + 16] = bytes(255 - b for b in data[start:start + 16])
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def drop_column(path):
+    # Cache of an older layout, without the img_sizes column
+    with np.load(path) as data:
+        columns = {name: data[name] for name in data.files if name != 'img_sizes'}
+    with open(path, 'wb') as f:
+        np.savez(f, **columns)
+
+
+@pytest.mark.parametrize('damage', [truncate, corrupt_member, drop_column])
+def test_damaged_zip_starts_over(yolo, damage):
+    folder, (label_path, img_path) = yolo
+    cache = AnnotationCache(folder, 'yolo')
+    boxes, _ = cache.get(label_path, img_path)
+    cache.save()
+    damage(os.path.join(folder, CACHE_FILENAME))
+
+    cache = AnnotationCache(folder, 'yolo')
+    assert len(cache) == 0
+    assert cache.update([(label_path, img_path)]) == (0, 1, 0)
+    assert np.array_equal(cache.get(label_path, img_path)[0], boxes)
+
+
+def test_prune_and_failures(yolo):
+    folder, (label_path, img_path) = yolo
+    other = make_pair(folder, 'c', '0 0.5 0.5 0.1 0.1\n', '.txt')
+    cache = AnnotationCache(folder, 'yolo')
+    assert cache.update([(label_path, img_path), other, (os.path.join(folder, 'missing.txt'), img_path)]) == (0, 2, 1)
+    cache.save()
+
+    cache = AnnotationCache(folder, 'yolo')
+    cache.get(label_path, img_path)
+    cache.save(prune=True)
+    assert len(AnnotationCache(folder, 'yolo')) == 1
+
+
+def test_read_image_size(yolo):
+    _, (_, img_path) = yolo
+    assert read_image_size(img_path) == cv2.imread(img_path).shape[:2]
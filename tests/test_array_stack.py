@@ -0,0 +1,106 @@
+"""
+Raw array output (utils/array_stack.py) and encoder settings (utils/encoder.py):
+stacks read back exactly, closed or left unclosed by a crash, resumed runs
+don't duplicate keys, and ImageEncoder honours its format settings.
+
+    python -m pytest -q tests/test_array_stack.py
+"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from utils.array_stack import ArrayStackWriter, ArrayStack, list_stacks
+from utils.encoder import ImageEncoder, EncodeStats
+
+
+def sample(i, shape=(24, 32, 3)):
+    rng = np.random.default_rng(i)
+    img = rng.integers(0, 256, shape, dtype=np.uint8)
+    bboxes = np.array([[1, 2, 10, 12, i % 3]] * (i % 3), dtype=np.float32)
+    return img, bboxes
+
+
+def write_samples(folder, keys, **kwargs):
+    writer = ArrayStackWriter(str(folder), **kwargs)
+    written = [writer.write(f'k{i}', *sample(i, (24 + i, 32, 3))) for i in keys]
+    return writer, written
+
+
+@pytest.mark.parametrize('closed', [True, False])
+def test_roundtrip(tmp_path, closed):
+    writer, _ = write_samples(tmp_path, range(6))
+    if closed:
+        writer.close()
+        # A finished stack is a regular .npy
+        assert np.load(writer.path + '.npy', mmap_mode='r').shape == (sum((24 + i) * 32 * 3 for i in range(6)),)
+
+    stack = ArrayStack(list_stacks(str(tmp_path))[0])
+    assert len(stack) == 6 and stack.keys == [f'k{i}' for i in range(6)]
+    for i in range(6):
+        img, bboxes = stack[i]
+        ref_img, ref_boxes = sample(i, (24 + i, 32, 3))
+        assert np.array_equal(img, ref_img)
+        assert np.array_equal(bboxes, ref_boxes.reshape(-1, 5))
+    if not closed:
+        writer.close()
+
+
+def test_as_array(tmp_path):
+    with ArrayStackWriter(str(tmp_path)) as writer:
+        for i in range(4):
+            writer.write(f'k{i}', *sample(i))
+    stack = ArrayStack(list_stacks(str(tmp_path))[0])
+    assert np.array_equal(stack.as_array(), np.stack([sample(i)[0] for i in range(4)]))
+
+
+def test_resume_skips_existing_keys(tmp_path):
+    writer, _ = write_samples(tmp_path, range(4))
+    # Crashed: the first stack is never closed
+    writer2, written = write_samples(tmp_path, range(2, 6), skip_existing=True)
+    writer2.close()
+    assert written == [False, False, True, True]
+
+    stacks = [ArrayStack(path) for path in list_stacks(str(tmp_path))]
+    assert len(stacks) == 2
+    assert sorted(key for stack in stacks for key in stack.keys) == [f'k{i}' for i in range(6)]
+    writer.close()
+
+
+def test_encode_stats(tmp_path):
+    stats = EncodeStats()
+    with ArrayStackWriter(str(tmp_path), stats=stats) as writer:
+        writer.write('k0', *sample(0))
+    assert stats.drain()['npy(raw)'][0] == 1
+
+
+@pytest.mark.parametrize('settings, ext', [
+    ({'image_format': 'jpg', 'jpeg_quality': 80, 'jpeg_progressive': True}, '.jpg'),
+    ({'image_format': 'png', 'png_compression': 1}, '.png'),
+    ({'image_format': 'webp', 'webp_quality': 101}, '.webp'),
+])
+def test_image_encoder(settings, ext):
+    img = sample(0, (64, 64, 3))[0]
+    encoder = ImageEncoder(**settings)
+    data = encoder.encode(img)
+    assert encoder.ext == ext
+    decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == img.shape
+    if ext != '.jpg':
+        # png and webp above quality 100 are lossless
+        assert np.array_equal(decoded, img)
+    (name, (count, _, nbytes)), = encoder.stats.drain().items()
+    assert count == 1 and nbytes == len(data)
+
+
+def test_image_encoder_from_config():
+    encoder = ImageEncoder.from_config({'image_format': 'jpg', 'jpeg_quality': 70, 'path_save': 'x'})
+    assert encoder.name == 'jpg(q=70)'
+    with pytest.raises(AssertionError):
+        ImageEncoder(image_format='gif')
@@ -0,0 +1,148 @@
+"""
+Batched ops (transform_batch, augmentations/batch.py, augmentations/sequence.py):
+every vectorized batch path gives the same images and boxes as transform() on
+each image with the same seed, including images without boxes, and Sequence
+draws its probs per image and scatters each op's subset back in place without
+touching the caller's batch.
+
+    python -m pytest -q tests/test_batch.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from augmentations.registry import create_op
+from augmentations.sequence import Sequence
+
+BATCH_OPS = ['HorizontalFlip', 'AdjustBrightness', 'AdjustContrast', 'AdjustSaturation', 'RandomHSV',
+             'LightingNoise', 'Cutout']
+
+
+def make_image(h=60, w=80, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+
+def make_batch(n=5, seed=0):
+    images = np.stack([make_image(seed=seed * n + i) for i in range(n)])
+    bboxes_list = [np.array([[5, 6, 40, 30, 0], [30, 20, 75, 55, 1]], dtype=np.float32) + [i, i, i, i, 0]
+                   for i in range(n)]
+    # One image without boxes
+    bboxes_list[2] = np.zeros((0, 5), dtype=np.float32)
+    return images, bboxes_list
+
+
+def op(name, seed):
+    return create_op(name, rng=np.random.default_rng(seed))
+
+
+def as_boxes(bboxes):
+    return np.asarray(bboxes, dtype=np.float32).reshape(-1, 5)
+
+
+def per_image(ops, images, bboxes_list, selected=None):
+    """transform() of each op in turn on every image (only the images an op selected, when given)"""
+    out_images, out_bboxes = [], []
+    for i, (img, bboxes) in enumerate(zip(images, bboxes_list)):
+        img, bboxes = img.copy(), bboxes.copy()
+        for j, aug in enumerate(ops):
+            if selected is None or selected[j][i]:
+                img, bboxes = aug.transform(img, bboxes)
+        out_images.append(img)
+        out_bboxes.append(bboxes)
+    return out_images, out_bboxes
+
+
+def check_same(batch, batch_bboxes, images, bboxes_list):
+    assert len(batch) == len(images) == len(batch_bboxes) == len(bboxes_list)
+    for out, ref, out_boxes, ref_boxes in zip(batch, images, batch_bboxes, bboxes_list):
+        assert out.dtype == ref.dtype
+        assert np.array_equal(out, ref)
+        assert np.array_equal(as_boxes(out_boxes), as_boxes(ref_boxes))
+
+
+@pytest.mark.parametrize('name', BATCH_OPS)
+@pytest.mark.parametrize('seed', [0, 1])
+def test_batch_matches_transform(name, seed):
+    images, bboxes_list = make_batch(seed=seed)
+    original = images.copy()
+    ref_images, ref_bboxes = per_image([op(name, seed)], images, bboxes_list)
+
+    batch, batch_bboxes = op(name, seed).transform_batch(images, [b.copy() for b in bboxes_list])
+    assert isinstance(batch, np.ndarray) and batch.shape == images.shape
+    check_same(batch, batch_bboxes, ref_images, ref_bboxes)
+    assert np.array_equal(images, original)
+
+
+@pytest.mark.parametrize('name', BATCH_OPS)
+def test_batch_of_mixed_sizes(name):
+    # Not stackable: every op falls back to transform() per image and keeps the list
+    images = [make_image(h, w, seed) for seed, (h, w) in enumerate([(60, 80), (50, 90), (60, 80)])]
+    bboxes_list = [np.array([[5, 6, 40, 30, 0]], dtype=np.float32)] * 3
+    ref_images, ref_bboxes = per_image([op(name, 3)], images, bboxes_list)
+    batch, batch_bboxes = op(name, 3).transform_batch(images, [b.copy() for b in bboxes_list])
+    assert isinstance(batch, list)
+    check_same(batch, batch_bboxes, ref_images, ref_bboxes)
+
+
+def test_empty_boxes_only():
+    images, _ = make_batch(3)
+    empty = [np.zeros((0, 5), dtype=np.float32)] * 3
+    for name in BATCH_OPS:
+        batch, batch_bboxes = op(name, 0).transform_batch(images, [b.copy() for b in empty])
+        assert batch.shape == images.shape
+        assert all(as_boxes(bboxes).shape == (0, 5) for bboxes in batch_bboxes)
+
+
+def sequence_ops(seed):
+    names = ['HorizontalFlip', 'AdjustBrightness', 'Cutout', 'LightingNoise', 'AdjustContrast']
+    return [op(name, seed + i) for i, name in enumerate(names)]
+
+
+def draw_selection(seed, probs, n):
+    """The per-image picks Sequence.transform_batch draws: one vector of n per op, in op order"""
+    rng = np.random.default_rng(seed)
+    return [rng.random(n) < prob if prob > 0 else np.zeros(n, dtype=bool) for prob in probs]
+
+
+@pytest.mark.parametrize('probs', [1, [0.5, 0.7, 1, 0.3, 0], [0.5, 0.5, 0.5, 0.5, 0.5]])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_sequence_batch_matches_transform(probs, seed):
+    images, bboxes_list = make_batch(n=8, seed=seed)
+    original = images.copy()
+    full_probs = probs if isinstance(probs, list) else [probs] * 5
+    selected = draw_selection(100 + seed, full_probs, len(images))
+    if isinstance(probs, list):
+        # Some images picked by some ops, not all of them
+        assert any(0 < s.sum() < len(images) for s in selected)
+
+    ref_images, ref_bboxes = per_image(sequence_ops(seed), images, bboxes_list, selected)
+    sequence = Sequence(sequence_ops(seed), probs=probs, rng=np.random.default_rng(100 + seed))
+    batch, batch_bboxes = sequence.transform_batch(images, [b.copy() for b in bboxes_list])
+
+    check_same(batch, batch_bboxes, ref_images, ref_bboxes)
+    # The scatter of a subset never writes into the caller's batch
+    assert np.array_equal(images, original)
+
+
+def test_sequence_batch_nothing_selected():
+    images, bboxes_list = make_batch()
+    sequence = Sequence(sequence_ops(0), probs=0, rng=np.random.default_rng(0))
+    batch, batch_bboxes = sequence.transform_batch(images, bboxes_list)
+    check_same(batch, batch_bboxes, images, bboxes_list)
+
+
+def test_sequence_batch_of_mixed_sizes():
+    images = [make_image(h, w, seed) for seed, (h, w) in enumerate([(60, 80), (50, 90), (60, 80), (40, 40)])]
+    bboxes_list = [np.array([[5, 6, 30, 30, 0]], dtype=np.float32), np.zeros((0, 5), dtype=np.float32)] * 2
+    probs = [0.5, 0.7, 1, 0.3, 0.6]
+    selected = draw_selection(7, probs, len(images))
+    ref_images, ref_bboxes = per_image(sequence_ops(4), images, bboxes_list, selected)
+    sequence = Sequence(sequence_ops(4), probs=probs, rng=np.random.default_rng(7))
+    batch, batch_bboxes = sequence.transform_batch(images, [b.copy() for b in bboxes_list])
+    check_same(batch, batch_bboxes, ref_images, ref_bboxes)
@@ -0,0 +1,96 @@
+"""
+Dataset scan and splits (utils/dataset.py): hash_split keeps every file in its
+split when files are added, stratified_split keeps the ratios within classes,
+and scan_dataset finds images with their labels.
+
+    python -m pytest -q tests/test_dataset.py
+"""
+
+import os
+import sys
+import random
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from utils.dataset import scan_dataset, hash_split, stratified_split, hash_fraction
+
+SCALE = [0.7, 0.2, 0.1]
+
+
+def split_of(splits):
+    return {filename: i for i, split in enumerate(splits) for filename in split}
+
+
+def test_hash_fraction():
+    assert hash_fraction('a.jpg', 0) == hash_fraction('a.jpg', 0)
+    assert hash_fraction('a.jpg', 0) != hash_fraction('a.jpg', 1)
+    assert all(0 <= hash_fraction(f'{i}.jpg') < 1 for i in range(100))
+
+
+def test_hash_split_stable_when_files_added():
+    files = [f'img{i}.jpg' for i in range(2000)]
+    before = split_of(hash_split(files, SCALE, seed=3))
+    more = files + [f'new{i}.jpg' for i in range(500)]
+    random.Random(0).shuffle(more)
+    after = split_of(hash_split(more, SCALE, seed=3))
+    assert all(after[filename] == split for filename, split in before.items())
+
+    # Removing files doesn't move the others either
+    fewer = split_of(hash_split(files[::2], SCALE, seed=3))
+    assert all(before[filename] == split for filename, split in fewer.items())
+
+
+def test_hash_split_ratios():
+    train, val, test = hash_split((f'img{i}.jpg' for i in range(10000)), SCALE)
+    assert len(train) + len(val) + len(test) == 10000
+    assert abs(len(train) / 10000 - 0.7) < 0.02 and abs(len(val) / 10000 - 0.2) < 0.02
+
+
+def make_samples(n, seed=0):
+    rng = random.Random(seed)
+    # Class 3 is rare, some images have no boxes
+    return [(f'img{i}.jpg', [rng.choice([0, 0, 0, 1, 1, 2]) for _ in range(rng.randint(0, 3))] +
+             ([3] if i % 50 == 0 else [])) for i in range(n)]
+
+
+def test_stratified_split_keeps_ratios_per_class():
+    samples = make_samples(3000)
+    splits = stratified_split(lambda: iter(samples), SCALE, seed=1)
+    assigned = split_of(splits)
+    assert sorted(assigned) == sorted(filename for filename, _ in samples)
+
+    # Every image of the rare class is in its stratum, cut at the ratios
+    rare = [assigned[filename] for filename, classes in samples if 3 in classes]
+    assert [rare.count(i) for i in range(3)] == [round(len(rare) * 0.7), round(len(rare) * 0.9) - round(len(rare) * 0.7),
+                                                 len(rare) - round(len(rare) * 0.9)]
+
+
+def test_stratified_split_deterministic_and_mostly_stable():
+    samples = make_samples(3000)
+    first = stratified_split(lambda: iter(samples), SCALE, seed=1)
+    assert first == stratified_split(lambda: iter(samples), SCALE, seed=1)
+
+    more = samples + make_samples(3030, seed=5)[3000:]
+    before, after = split_of(first), split_of(stratified_split(lambda: iter(more), SCALE, seed=1))
+    moved = sum(after[filename] != split for filename, split in before.items())
+    assert moved <= 30, f"Quá nhiều ảnh đổi split: {moved}"
+
+
+def test_stratified_split_small_strata_reach_train():
+    samples = [('a.jpg', [5]), ('b.jpg', [6]), ('c.jpg', [6]), ('d.jpg', [])]
+    train, val, test = stratified_split(lambda: iter(samples), SCALE)
+    # Strata of one image go to train, of two images one to train and one to val
+    assert 'a.jpg' in train and 'd.jpg' in train
+    assert len(set(train) & {'b.jpg', 'c.jpg'}) == 1 and len(val) == 1 and test == []
+    assert stratified_split(lambda: iter([]), SCALE) == ([], [], [])
+
+
+def test_scan_dataset(tmp_path):
+    for name in ['a.jpg', 'a.txt', 'b.PNG', 'c.txt', '.hidden.jpg', 'sub/d.jpg', 'sub/d.txt']:
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b'')
+    assert list(scan_dataset(str(tmp_path), 'txt')) == [('a.jpg', True), ('b.PNG', False)]
+    assert sorted(scan_dataset(str(tmp_path), '.txt', recursive=True)) == \
+        [('a.jpg', True), ('b.PNG', False), (os.path.join('sub', 'd.jpg'), True)]
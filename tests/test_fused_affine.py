@@ -0,0 +1,169 @@
+"""
+Fused geometric engine (augmentations/fused_affine.py): a fused op draws the
+same matrix, keeps the same boxes and nearly the same pixels as the op run on
+its own, a chain is one warp equal to composing the ops, Sequence fuses
+consecutive geometric ops, and a [Sequence] section's probs are read from the
+config as one number or one per op.
+
+    python -m pytest -q tests/test_fused_affine.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from augmentations.registry import create_op
+from augmentations.fused_affine import FusedAffine, is_geometric
+from augmentations.sequence import Sequence
+from main import Augmentation
+
+GEOMETRIC = ['Rotate', 'Scale', 'Shear', 'Translate', 'HorizontalFlip']
+
+
+def make_sample(h=120, w=160):
+    # Smooth pattern, so one resample instead of two changes pixels by a level or two only
+    yy, xx = np.mgrid[0:h, 0:w]
+    img = np.clip((np.sin(xx / 9) + np.cos(yy / 7)) * 60 + 128, 0, 255).astype(np.uint8)
+    bboxes = np.array([[20, 30, 60, 80, 0], [90, 10, 150, 70, 1]], dtype=np.float32)
+    return np.repeat(img[..., None], 3, axis=2), bboxes
+
+
+def op(name, seed):
+    return create_op(name, rng=np.random.default_rng(seed))
+
+
+@pytest.mark.parametrize('name', GEOMETRIC)
+@pytest.mark.parametrize('seed', [1, 2])
+def test_single_op_matches_op(name, seed):
+    img, bboxes = make_sample()
+    ref, ref_boxes = op(name, seed).transform(img.copy(), bboxes.copy())
+    out, out_boxes = FusedAffine([op(name, seed)]).transform(img.copy(), bboxes.copy())
+
+    assert out.shape == ref.shape
+    assert np.allclose(out_boxes, ref_boxes, atol=1e-3)
+    diff = np.abs(out.astype(np.int16) - ref)
+    if name in ('Translate', 'HorizontalFlip'):
+        assert not diff.any()
+    else:
+        assert diff.mean() < 1.5, f"{name} lệch quá nhiều: {diff.mean():.2f}"
+
+
+def test_chain_is_composed_matrix():
+    img, bboxes = make_sample()
+    names = ['Scale', 'Rotate', 'Translate', 'HorizontalFlip']
+    fused = FusedAffine([op(name, seed) for seed, name in enumerate(names)])
+    M, (w, h) = fused.get_matrix(*img.shape[:2])
+
+    expected, size = np.eye(3), img.shape[1::-1]
+    for seed, name in enumerate(names):
+        M_op, size = op(name, seed).get_matrix(size[1], size[0])
+        expected = M_op @ expected
+    assert np.allclose(M, expected) and (w, h) == size
+
+
+def test_chain_boxes_follow_matrix():
+    img, bboxes = make_sample()
+    # Axis-aligned chain, so boxes map exactly and none is clipped
+    chain = [create_op('Scale', scale_x_min=0.8, scale_x_max=0.8, scale_y_min=0.9, scale_y_max=0.9),
+             create_op('HorizontalFlip')]
+    out, out_boxes = FusedAffine(chain).transform(img, bboxes.copy())
+    assert out.shape == img.shape
+    x_scaled = bboxes[:, [0, 2]] * 0.8
+    assert np.allclose(out_boxes[:, [0, 2]], np.sort(160 - x_scaled, axis=1))
+    assert np.allclose(out_boxes[:, [1, 3]], bboxes[:, [1, 3]] * 0.9)
+    assert np.array_equal(out_boxes[:, 4], bboxes[:, 4])
+
+
+def test_clip_alpha():
+    assert FusedAffine([op('HorizontalFlip', 0)]).clip_alpha is None
+    assert FusedAffine([op('Shear', 0), op('Scale', 0)]).clip_alpha == 0.2
+    assert FusedAffine([op('Scale', 0), op('Rotate', 0)]).clip_alpha == 0.25
+    assert FusedAffine([op('Rotate', 0)], clip_alpha=0.5).clip_alpha == 0.5
+
+
+def test_rejects_non_geometric():
+    assert not is_geometric(op('AdjustBrightness', 0))
+    with pytest.raises(AssertionError):
+        FusedAffine([op('Rotate', 0), op('AdjustBrightness', 0)])
+
+
+def test_sequence_fuses_consecutive_geometric_ops():
+    img, bboxes = make_sample()
+    names = ['Rotate', 'Translate', 'Shear']
+    sequence = Sequence([op(name, seed) for seed, name in enumerate(names)], probs=1, fuse_geometric=True)
+    out, out_boxes = sequence.transform(img.copy(), bboxes.copy())
+    ref, ref_boxes = FusedAffine([op(name, seed) for seed, name in enumerate(names)]).transform(img.copy(), bboxes.copy())
+    assert np.array_equal(out, ref)
+    assert np.allclose(out_boxes, ref_boxes)
+
+
+CONFIG = """[MAIN]
+path_dataset = {dataset}
+path_save = {output}
+src_type_dataset = yolo
+dest_type_dataset = yolo
+label_mapping = ['a':0]
+scale = [0.6, 0.2, 0.2]
+fuse_geometric = True
+
+[Rotate]
+used = False
+
+[Translate]
+used = False
+
+[Sequence]
+used = True
+ops = Rotate, Translate
+probs = {probs}
+"""
+
+
+def load_sequence(tmp_path, probs):
+    config_path = tmp_path / 'config.cfg'
+    config_path.write_text(CONFIG.format(dataset=tmp_path / 'dataset', output=tmp_path / 'output', probs=probs))
+    return Augmentation(str(config_path)).augmentation_objects['Sequence']
+
+
+@pytest.mark.parametrize('probs, expected', [
+    ('1', 1),
+    ('0.5', 0.5),
+    ('[0.5, 1.0]', [0.5, 1.0]),
+    ('0, 1', [0.0, 1.0]),
+])
+def test_config_sequence_probs(tmp_path, probs, expected):
+    sequence = load_sequence(tmp_path, probs)
+    assert sequence.probs == expected
+    img, bboxes = make_sample()
+    out, out_boxes = sequence.transform(img.copy(), bboxes.copy())
+    assert out.shape == img.shape
+    assert out_boxes.shape[1] == 5
+
+
+def test_config_sequence_zero_prob_skips_op(tmp_path):
+    sequence = load_sequence(tmp_path, '0, 1')
+    calls = []
+
+    class Recorder:
+        def __init__(self, name):
+            self.name = name
+
+        def transform(self, img, bboxes):
+            calls.append(self.name)
+            return img, bboxes
+
+    sequence.augmentations = [Recorder('Rotate'), Recorder('Translate')]
+    img, bboxes = make_sample()
+    for _ in range(5):
+        sequence.transform(img, bboxes)
+    assert calls == ['Translate'] * 5
+
+
+def test_config_sequence_probs_length(tmp_path):
+    with pytest.raises(AssertionError):
+        load_sequence(tmp_path, '[0.5, 1.0, 1.0]')
@@ -0,0 +1,155 @@
+"""
+GridMask (augmentations/grid_mask.py): the input image is never modified,
+exactly the pixels of the grid's stripes are zeroed and the others kept, and
+the cached rotated masks are read-only, so no call can change them for later
+ones. Masks above MASK_CACHE_MAX_PIXELS are not kept in the cache.
+
+    python -m pytest -q tests/test_grid_mask.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import augmentations.grid_mask as grid_mask_module
+from augmentations.grid_mask import GridMask, rotated_grid_mask
+
+
+def make_image(h=90, w=130, seed=0):
+    # No zero pixels, so zeros in the output are exactly the masked ones
+    return np.random.default_rng(seed).integers(1, 256, (h, w, 3), dtype=np.uint8)
+
+
+def grid_mask(seed, **kwargs):
+    return GridMask(prob=1, rng=np.random.default_rng(seed), **kwargs)
+
+
+def reference_mask(h, w, d, l, offsets, use_h=True, use_w=True, mode=0):
+    """Unrotated mask drawn pixel by pixel: centre crop of stripes on a 1.5x canvas"""
+    hh, ww = int(1.5 * h), int(1.5 * w)
+    top, left = (hh - h) // 2, (ww - w) // 2
+    st_h, st_w = offsets
+
+    def striped(i, size, st):
+        return 0 <= i - st < d * (size // d) and (i - st) % d < l
+
+    mask = np.zeros((h, w), bool)
+    for y in range(h):
+        for x in range(w):
+            mask[y, x] = (use_h and striped(y + top, hh, st_h)) or (use_w and striped(x + left, ww, st_w))
+    return mask if mode == 0 else ~mask
+
+
+def expected_mask(seed, img, **kwargs):
+    """Mask the op seeded with seed applies to img, from its own params"""
+    h, w = img.shape[:2]
+    op = grid_mask(seed, **kwargs)
+    d, l, offsets, r = op.sample_params(h, w)
+    if r == 0:
+        return reference_mask(h, w, d, l, offsets, op.use_h, op.use_w, op.mode)
+    return rotated_grid_mask(h, w, d, l, offsets, r, op.use_h, op.use_w, op.mode)
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('kwargs', [{}, {'mode': 1}, {'use_w': False}, {'rotate': 90}])
+def test_masks_stripes_and_keeps_input(seed, kwargs):
+    img = make_image(seed=seed)
+    original = img.copy()
+    out, bboxes = grid_mask(seed, **kwargs).transform(img, 'boxes')
+
+    assert np.array_equal(img, original)
+    assert out is not img and out.dtype == img.dtype and out.shape == img.shape
+    assert bboxes == 'boxes'
+
+    mask = expected_mask(seed, img, **kwargs)
+    assert mask.any() and not mask.all()
+    assert not out[mask].any()
+    assert np.array_equal(out[~mask], img[~mask])
+
+
+def test_out_buffer():
+    img = make_image()
+    original = img.copy()
+    out = np.full_like(img, 7)
+    result, _ = grid_mask(3).transform(img, None, out=out)
+    assert result is out
+    assert np.array_equal(img, original)
+    assert np.array_equal(out, grid_mask(3).transform(img, None)[0])
+
+
+def test_skipped_still_returns_new_image():
+    img = make_image()
+    out, _ = GridMask(prob=0).transform(img, None)
+    assert out is not img and np.array_equal(out, img)
+
+
+def test_transform_batch_matches_transform():
+    images = np.stack([make_image(seed=i) for i in range(3)])
+    original = images.copy()
+    batch, _ = grid_mask(5, rotate=90).transform_batch(images, [None] * 3)
+
+    op = grid_mask(5, rotate=90)
+    assert np.array_equal(images, original)
+    for img, out in zip(original, batch):
+        assert np.array_equal(out, op.transform(img, None)[0])
+
+
+def test_cached_masks_are_not_shared_mutably():
+    cache = grid_mask_module._cached_rotated_grid_mask
+    cache.cache_clear()
+    img = make_image()
+    h, w = img.shape[:2]
+    args = (h, w, 20, 10, (3, 5), 30)
+
+    mask = rotated_grid_mask(*args)
+    snapshot = mask.copy()
+    assert not mask.flags.writeable
+    with pytest.raises(ValueError):
+        mask[0, 0] = not mask[0, 0]
+
+    # Same params again: served from the cache, and unchanged by the images masked with it
+    op = GridMask(prob=1, rotate=90)
+    op.sample_params = lambda h, w: (20, 10, (3, 5), 30)
+    first, _ = op.transform(img, None)
+    second, _ = op.transform(make_image(seed=1), None)
+    assert rotated_grid_mask(*args) is mask
+    assert cache.cache_info().hits >= 2
+    assert np.array_equal(mask, snapshot)
+    assert not first[mask].any() and not second[mask].any()
+
+    # The inverted mode is its own cache entry, not a view of the other one
+    inverted = rotated_grid_mask(*args, mode=1)
+    assert inverted is not mask and not np.shares_memory(inverted, mask)
+    assert np.array_equal(inverted, ~snapshot)
+    assert np.array_equal(mask, snapshot)
+
+
+def test_large_masks_are_not_cached(monkeypatch):
+    cache = grid_mask_module._cached_rotated_grid_mask
+    cache.cache_clear()
+    monkeypatch.setattr(grid_mask_module, 'MASK_CACHE_MAX_PIXELS', 90 * 130 - 1)
+    img = make_image()
+    args = (90, 130, 20, 10, (3, 5), 30)
+
+    first = rotated_grid_mask(*args)
+    second = rotated_grid_mask(*args)
+    assert first is not second and np.array_equal(first, second)
+    assert not first.flags.writeable
+    assert cache.cache_info().currsize == 0
+
+    # Same pixels as a cached mask of that size
+    monkeypatch.setattr(grid_mask_module, 'MASK_CACHE_MAX_PIXELS', 90 * 130)
+    assert np.array_equal(rotated_grid_mask(*args), first)
+    assert cache.cache_info().currsize == 1
+
+    op = GridMask(prob=1, rotate=90)
+    op.sample_params = lambda h, w: (20, 10, (3, 5), 30)
+    monkeypatch.setattr(grid_mask_module, 'MASK_CACHE_MAX_PIXELS', 0)
+    out, _ = op.transform(img, None)
+    assert cache.cache_info().currsize == 1
+    assert not out[first].any() and np.array_equal(out[~first], img[~first])
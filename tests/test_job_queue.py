@@ -0,0 +1,237 @@
+"""
+Webapp background jobs (webapp/job_queue.py, webapp/app.py): jobs run in the
+background with progress, can be cancelled while queued or running, are resumed
+after a cancel or a server restart, and a resumed augment job finishes its
+output folder without redoing what was already written. Importing app.py
+starts nothing, and an image counts as done only once its writes finished.
+
+    python -m pytest -q tests/test_job_queue.py
+"""
+
+import os
+import sys
+import time
+import shutil
+import threading
+from datetime import datetime
+
+import cv2
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'webapp'))
+
+from database import Database
+from job_queue import JobQueue, FINISHED_STATUSES
+
+
+def wait_for(queue, job_id, statuses=FINISHED_STATUSES, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} vẫn ở trạng thái {job['status']}")
+
+
+class FakeRun:
+    """run_job that processes `total` steps, optionally blocking on `gate` before each one"""
+
+    def __init__(self, total=5, gate=None):
+        self.total = total
+        self.gate = gate
+        self.started = threading.Event()
+        self.calls = []
+
+    def __call__(self, job, progress, cancel):
+        self.calls.append(job['output_id'])
+        self.started.set()
+        done = 0
+        while done < self.total and not cancel.is_set():
+            if self.gate is not None:
+                self.gate.wait()
+            if job['params'].get('fail'):
+                raise ValueError('bad input')
+            done += 1
+            progress(done, self.total)
+        return {'processed_count': done}
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / 'tasks.db'))
+
+
+def test_runs_job(db):
+    run = FakeRun()
+    queue = JobQueue(db, run)
+    queue.start()
+    job = queue.submit('task', 'out-1', {'augmentations': ['brightness']})
+    assert job['status'] in ('queued', 'running', 'done')
+
+    job = wait_for(queue, job['job_id'])
+    assert job['status'] == 'done' and job['result'] == {'processed_count': 5}
+    assert (job['done'], job['total']) == (5, 5)
+    assert job['throughput'] is not None and job['eta'] is None
+    assert [j['job_id'] for j in queue.list_jobs('task')] == [job['job_id']]
+
+
+def test_failed_job(db):
+    queue = JobQueue(db, FakeRun())
+    queue.start()
+    job = wait_for(queue, queue.submit('task', 'out', {'fail': True})['job_id'])
+    assert job['status'] == 'failed' and job['error'] == 'ValueError: bad input'
+
+
+def test_cancel_queued_job(db):
+    gate = threading.Event()
+    run = FakeRun(gate=gate)
+    queue = JobQueue(db, run, max_concurrent=1)
+    queue.start()
+    first = queue.submit('task', 'out-1', {})
+    second = queue.submit('task', 'out-2', {})
+    run.started.wait(5)
+
+    assert queue.cancel(second['job_id'])['status'] == 'cancelled'
+    gate.set()
+    assert wait_for(queue, first['job_id'])['status'] == 'done'
+    assert run.calls == ['out-1']
+    assert queue.cancel('missing') is None
+
+
+def test_cancel_running_job_then_resume(db):
+    gate = threading.Event()
+    run = FakeRun(gate=gate)
+    queue = JobQueue(db, run)
+    queue.start()
+    job_id = queue.submit('task', 'out-1', {})['job_id']
+    run.started.wait(5)
+
+    # Not resumable while it runs
+    assert queue.resume(job_id)['status'] == 'running'
+    threading.Timer(0.05, gate.set).start()
+    job = queue.cancel(job_id, wait=True)
+    assert job['status'] == 'cancelled'
+
+    job = queue.resume(job_id)
+    assert job['status'] in ('queued', 'running', 'done')
+    job = wait_for(queue, job_id)
+    assert job['status'] == 'done' and job['error'] is None
+    # Same output folder both times
+    assert run.calls == ['out-1', 'out-1']
+
+
+def test_start_resumes_interrupted_jobs(db):
+    # Jobs a previous server left behind
+    for job_id, status in (('a', 'running'), ('b', 'queued'), ('c', 'done')):
+        db.create_job({'job_id': job_id, 'task_id': 'task', 'output_id': f'out-{job_id}', 'params': {},
+                       'created_at': datetime.now().isoformat()})
+        db.update_job(job_id, status=status)
+    run = FakeRun()
+    queue = JobQueue(db, run)
+    queue.start()
+    assert wait_for(queue, 'a')['status'] == wait_for(queue, 'b')['status'] == 'done'
+    assert sorted(run.calls) == ['out-a', 'out-b']
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    # app.py keeps its database and folders relative to the working directory
+    folder = tmp_path_factory.mktemp('webapp')
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        import app as webapp
+        webapp.app.config['AUGMENT_WORKERS'] = 1
+        webapp.app.config['WRITER_THREADS'] = 0
+        # Importing starts nothing; the queue runs once the app is created
+        assert not webapp.job_queue._threads
+        webapp.create_app()
+        yield webapp
+    finally:
+        os.chdir(cwd)
+
+
+def make_task(webapp, count=6):
+    task_id = f'task-{time.time_ns()}'
+    task_folder = os.path.join(webapp.app.config['UPLOAD_FOLDER'], task_id)
+    os.makedirs(os.path.join(task_folder, 'images'))
+    os.makedirs(os.path.join(task_folder, 'labels'))
+    img = cv2.resize(cv2.imread(os.path.join(ROOT, 'assets', 'yolo', 'sample.jpg')), (96, 64))
+    for i in range(count):
+        cv2.imwrite(os.path.join(task_folder, 'images', f'img{i}.jpg'), img)
+        shutil.copy(os.path.join(ROOT, 'assets', 'yolo', 'sample.txt'), os.path.join(task_folder, 'labels', f'img{i}.txt'))
+    webapp.db.create_task({'task_id': task_id, 'name': 'test', 'label_format': 'yolo', 'image_count': count,
+                           'created_at': datetime.now().isoformat()})
+    return task_id
+
+
+def output_files(webapp, output_id):
+    folder = os.path.join(webapp.app.config['OUTPUT_FOLDER'], output_id, 'images')
+    return {name: os.stat(os.path.join(folder, name)).st_mtime_ns for name in os.listdir(folder)}
+
+
+def test_augment_job_cancelled_then_resumed(client, monkeypatch):
+    webapp, http = client, client.app.test_client()
+    task_id = make_task(webapp)
+    run_augment_job = webapp.run_augment_job
+    runs = []
+
+    def cancel_after_two_images(job, progress, cancel):
+        runs.append(job['job_id'])
+
+        def report(done, total):
+            progress(done, total)
+            if len(runs) == 1 and done == 2:
+                assert http.post(f"/api/jobs/{job['job_id']}/cancel").status_code == 200
+        return run_augment_job(job, report, cancel)
+
+    monkeypatch.setattr(webapp.job_queue, 'run_job', cancel_after_two_images)
+    response = http.post(f'/api/augment/{task_id}', json={'augmentations': ['brightness', 'horizontal_flip']})
+    assert response.status_code == 202
+    job_id = response.json['job_id']
+
+    job = wait_for(webapp.job_queue, job_id)
+    assert job['status'] == 'cancelled' and job['done'] == 2 and job['total'] == 6
+    written = output_files(webapp, job['output_id'])
+    assert 2 * 3 <= len(written) < 6 * 3
+    assert http.post(f'/api/jobs/{job_id}/resume').status_code == 202
+
+    job = wait_for(webapp.job_queue, job_id)
+    assert job['status'] == 'done' and job['result']['processed_count'] == 6 * 3
+    final = output_files(webapp, job['output_id'])
+    assert len(final) == 6 * 3
+    # Outputs of the cancelled run were kept, not written again
+    assert all(final[name] == mtime for name, mtime in written.items())
+    assert http.post(f'/api/jobs/{job_id}/resume').status_code == 409
+    assert http.post('/api/jobs/missing/resume').status_code == 404
+
+
+def test_progress_waits_for_queued_writes(client, monkeypatch):
+    webapp = client
+    task_id = make_task(webapp)
+    service = webapp.aug_service
+    save_output = service.save_output
+
+    def slow_save(*args, **kwargs):
+        time.sleep(0.05)
+        return save_output(*args, **kwargs)
+
+    monkeypatch.setattr(service, 'save_output', slow_save)
+    output_folder = os.path.join(webapp.app.config['OUTPUT_FOLDER'], f'progress-{time.time_ns()}')
+    labels_folder = os.path.join(output_folder, 'labels')
+    reported = []
+
+    def progress(done, total):
+        # Every image reported so far has its original and both augmented labels on disk
+        reported.append((done, len(os.listdir(labels_folder))))
+
+    result = service.apply_augmentations(
+        os.path.join(webapp.app.config['UPLOAD_FOLDER'], task_id), output_folder,
+        ['brightness', 'horizontal_flip'], 'yolo', workers=1, writer_threads=2, progress=progress)
+    assert result['processed_count'] == 6 * 3
+    assert [done for done, _ in reported] == list(range(1, 7))
+    assert all(written >= done * 3 for done, written in reported)
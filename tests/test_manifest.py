@@ -0,0 +1,206 @@
+"""
+Resumable runs (utils/manifest.py, Augmentation(resume=True)): the manifest
+reads back what was recorded, including the process workers' logs and a line
+cut short by a crash, and a resumed create() finishes the dataset without
+writing any sample twice.
+
+    python -m pytest -q tests/test_manifest.py
+"""
+
+import os
+import sys
+import time
+import shutil
+
+import cv2
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import main
+from main import Augmentation
+from utils.manifest import RunManifest
+from utils.shards import list_shards, load_index
+
+SPLITS = (['a.jpg', 'b.jpg'], ['c.jpg'], ['d.jpg'])
+
+
+def test_record_and_resume(tmp_path):
+    manifest = RunManifest(str(tmp_path))
+    assert not manifest.exists()
+    manifest.start(SPLITS)
+    manifest.record('train', 'a.jpg', ['original'])
+    manifest.close()
+
+    # A worker of the same run appends to its own log
+    worker = RunManifest(str(tmp_path), '-w1')
+    worker.append()
+    worker.record('val', 'c.jpg', ['original', 'Rotate'])
+    worker.close()
+
+    splits, completed = RunManifest(str(tmp_path)).resume()
+    assert splits == SPLITS
+    assert completed == {('train', 'a.jpg'), ('val', 'c.jpg')}
+
+
+def test_resume_after_truncated_line(tmp_path):
+    manifest = RunManifest(str(tmp_path))
+    manifest.start(SPLITS)
+    manifest.record('train', 'a.jpg', ['original'])
+    manifest.close()
+    with open(manifest.log_path, 'a') as f:
+        f.write('{"split": "train", "sou')
+
+    manifest = RunManifest(str(tmp_path))
+    _, completed = manifest.resume()
+    assert completed == {('train', 'a.jpg')}
+    manifest.record('train', 'b.jpg', ['original'])
+    manifest.close()
+    assert RunManifest(str(tmp_path)).resume()[1] == {('train', 'a.jpg'), ('train', 'b.jpg')}
+
+
+def test_start_clears_previous_logs(tmp_path):
+    manifest = RunManifest(str(tmp_path))
+    manifest.start(SPLITS)
+    worker = RunManifest(str(tmp_path), '-w2')
+    worker.append()
+    worker.record('train', 'a.jpg', ['original'])
+    worker.close()
+    manifest.start(SPLITS)
+    manifest.close()
+    assert RunManifest(str(tmp_path)).resume()[1] == set()
+    assert sorted(os.listdir(str(tmp_path))) == ['manifest.json', 'manifest.jsonl']
+
+
+CONFIG = """[MAIN]
+path_dataset = {dataset}
+path_save = {output}
+src_type_dataset = yolo
+dest_type_dataset = yolo
+label_mapping = ['a':0, 'b':1]
+scale = [0.6, 0.2, 0.2]
+workers = {workers}
+executor = {executor}
+writer_threads = 2
+output_format = shards
+shard_max_count = 4
+seed = 0
+
+[AdjustBrightness]
+used = True
+
+[HorizontalFlip]
+used = True
+"""
+
+
+def make_run(tmp_path, workers=1, executor='process', count=10):
+    dataset = tmp_path / 'dataset'
+    dataset.mkdir()
+    img = cv2.resize(cv2.imread(os.path.join(ROOT, 'assets', 'yolo', 'sample.jpg')), (64, 48))
+    for i in range(count):
+        cv2.imwrite(str(dataset / f'img{i}.jpg'), img)
+        shutil.copy(os.path.join(ROOT, 'assets', 'yolo', 'sample.txt'), dataset / f'img{i}.txt')
+    config_path = tmp_path / 'config.cfg'
+    config_path.write_text(CONFIG.format(dataset=dataset, output=tmp_path / 'output', workers=workers,
+                                         executor=executor))
+    return str(config_path), str(tmp_path / 'output')
+
+
+def shard_keys(output):
+    keys = []
+    for split in ('train', 'val', 'test'):
+        folder = os.path.join(output, split, 'shards')
+        for path in list_shards(folder) if os.path.isdir(folder) else []:
+            keys.extend(load_index(path))
+    return keys
+
+
+def expected_count():
+    # 6 train and 2 val images with the original and 2 ops, 2 test images original only
+    return 8 * 3 + 2
+
+
+def test_resumed_run_writes_each_sample_once(tmp_path, monkeypatch, capsys):
+    config_path, output = make_run(tmp_path)
+    process_image = Augmentation._process_image
+    calls = []
+
+    def crash_after_four(self, *args):
+        if len(calls) == 4:
+            raise KeyboardInterrupt
+        calls.append(args[0])
+        return process_image(self, *args)
+
+    monkeypatch.setattr(Augmentation, '_process_image', crash_after_four)
+    with pytest.raises(KeyboardInterrupt):
+        Augmentation(config_path).create()
+    monkeypatch.setattr(Augmentation, '_process_image', process_image)
+    assert 0 < len(shard_keys(output)) < expected_count()
+
+    Augmentation(config_path, resume=True).create()
+    assert 'Skipping 4 image(s)' in capsys.readouterr().out
+    keys = shard_keys(output)
+    assert len(keys) == len(set(keys)) == expected_count()
+
+
+def test_resume_with_process_workers(tmp_path):
+    config_path, output = make_run(tmp_path, workers=2)
+    Augmentation(config_path).create()
+    keys = shard_keys(output)
+    assert len(keys) == len(set(keys)) == expected_count()
+    logs = [name for name in os.listdir(output) if name.startswith('manifest-w')]
+    assert logs, "Mỗi worker phải ghi manifest riêng"
+
+    # Lose the workers' records, as if they crashed before recording: everything is redone,
+    # nothing is written twice
+    for name in logs:
+        os.remove(os.path.join(output, name))
+    Augmentation(config_path, resume=True).create()
+    keys = shard_keys(output)
+    assert len(keys) == len(set(keys)) == expected_count()
+    assert len(RunManifest(output).resume()[1]) == 10
+
+
+def test_resume_with_thread_workers(tmp_path):
+    config_path, output = make_run(tmp_path, workers=2, executor='thread')
+    Augmentation(config_path).create()
+    keys = shard_keys(output)
+    assert len(keys) == len(set(keys)) == expected_count()
+    assert len(RunManifest(output).resume()[1]) == 10
+    Augmentation(config_path, resume=True).create()
+    assert len(shard_keys(output)) == expected_count()
+
+
+@pytest.mark.parametrize('executor', ['process', 'thread'])
+def test_failing_run_stops_workers(tmp_path, monkeypatch, executor):
+    # 36 train images at 0.1 s each take ~1.8 s on 2 workers; the parent fails on its 2nd result
+    config_path, output = make_run(tmp_path, workers=2, executor=executor, count=60)
+    process_image = Augmentation._process_image
+
+    def slow(self, *args):
+        time.sleep(0.1)
+        return process_image(self, *args)
+
+    def failing_progress(results, total=None):
+        for i, result in enumerate(results):
+            if i == 2:
+                raise KeyboardInterrupt
+            yield result
+
+    # Threads and forked workers see the patched method
+    monkeypatch.setattr(Augmentation, '_process_image', slow)
+    monkeypatch.setattr(main, 'tqdm', failing_progress)
+    start = time.perf_counter()
+    with pytest.raises(KeyboardInterrupt):
+        Augmentation(config_path).create()
+    assert time.perf_counter() - start < 1.5
+    assert len(RunManifest(output).resume()[1]) < 20
+
+    # The images that were dropped are done by a resumed run
+    monkeypatch.undo()
+    Augmentation(config_path, resume=True).create()
+    keys = shard_keys(output)
+    assert len(keys) == len(set(keys))
+    assert len(RunManifest(output).resume()[1]) == 60
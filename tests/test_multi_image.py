@@ -0,0 +1,110 @@
+"""
+Multi-image ops (augmentations/mixup.py, augmentations/mosaic.py) and the
+decoded-image LRU cache that feeds them partners (utils/image_cache.py).
+
+    python -m pytest -q tests/test_multi_image.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from augmentations.registry import create_op
+from utils.image_cache import ImageCache
+
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)]
+
+
+def solid(color, h=200, w=300):
+    return np.full((h, w, 3), color, dtype=np.uint8)
+
+
+def boxes(*rows):
+    return np.array(rows, dtype=np.float32).reshape(-1, 5)
+
+
+def test_mixup_blends_and_keeps_both_boxes():
+    mixup = create_op('Mixup', lambd=0.25)
+    assert mixup.num_images == 2
+    b1, b2 = boxes([10, 10, 50, 50, 0]), boxes([60, 60, 120, 100, 1], [0, 0, 5, 5, 2])
+    img, out_boxes = mixup.transform_multi([solid(200), solid(40)], [b1, b2])
+    assert np.abs(img.astype(int) - (0.25 * 200 + 0.75 * 40)).max() <= 1
+    assert np.array_equal(out_boxes, np.concatenate([b1, b2]))
+
+
+def test_mixup_resizes_partner():
+    mixup = create_op('Mixup', lambd=0.5)
+    img, out_boxes = mixup.transform(solid(100), boxes([10, 10, 50, 50, 0]),
+                                     solid(100, 100, 150), boxes([10, 20, 30, 40, 1]))
+    assert img.shape == (200, 300, 3)
+    assert np.allclose(out_boxes[1], [20, 40, 60, 80, 1])
+
+
+def test_mosaic_quadrants():
+    mosaic = create_op('Mosaic', size=256, rng=np.random.default_rng(0))
+    assert mosaic.num_images == 4
+    images = [solid(color) for color in COLORS]
+    # One box in the corner each image keeps at the centre, one in the opposite corner
+    corners = [boxes([250, 150, 290, 190, i], [0, 0, 20, 20, i]) if i == 0 else
+               boxes([10, 150, 50, 190, i], [280, 0, 300, 20, i]) if i == 1 else
+               boxes([250, 10, 290, 50, i], [0, 180, 20, 200, i]) if i == 2 else
+               boxes([10, 10, 50, 50, i], [280, 180, 300, 200, i]) for i in range(4)]
+    canvas, out_boxes = mosaic.transform_multi(images, corners)
+
+    assert canvas.shape == (256, 256, 3)
+    mosaic = create_op('Mosaic', size=256, rng=np.random.default_rng(0))
+    xc, yc = mosaic.sample_center()
+    quadrants = [(0, 0, xc, yc), (xc, 0, 256, yc), (0, yc, xc, 256), (xc, yc, 256, 256)]
+    for color, (x1, y1, x2, y2) in zip(COLORS, quadrants):
+        assert (canvas[y1:y2, x1:x2] == color).all()
+
+    # Each image keeps at least its box at the centre, and its boxes stay in its own quadrant
+    assert set(out_boxes[:, 4].tolist()) == {0, 1, 2, 3}
+    for x_min, y_min, x_max, y_max, label in out_boxes:
+        x1, y1, x2, y2 = quadrants[int(label)]
+        assert x1 <= x_min < x_max <= x2 and y1 <= y_min < y_max <= y2
+
+
+def test_mosaic_reuses_out_and_is_seeded():
+    images = [solid(color) for color in COLORS]
+    bboxes = [boxes()] * 4
+    first, _ = create_op('Mosaic', size=128, rng=np.random.default_rng(3)).transform_multi(images, bboxes)
+    out = np.empty((128, 128, 3), np.uint8)
+    second, _ = create_op('Mosaic', size=128, rng=np.random.default_rng(3)).transform_multi(images, bboxes, out=out)
+    assert second is out and np.array_equal(first, second)
+
+
+def test_image_cache_lru():
+    loads = []
+
+    def loader(key):
+        loads.append(key)
+        return np.zeros((10, 10, 3), np.uint8) + key, boxes([0, 0, 1, 1, key])
+
+    cache = ImageCache(loader, max_bytes=2 * 300)
+    cache.get(1), cache.get(2), cache.get(1)
+    cache.get(3)  # Evicts 2, the least recently used
+    cache.get(1), cache.get(2)
+    assert loads == [1, 2, 3, 2]
+    hits, misses, count, size = cache.stats()
+    assert (hits, misses, count, size) == (2, 4, 2, 600)
+
+
+def test_image_cache_entries_are_protected():
+    cache = ImageCache(lambda key: (np.zeros((4, 4, 3), np.uint8), boxes([0, 0, 1, 1, 0])))
+    img, bboxes = cache.get('a')
+    with pytest.raises(ValueError):
+        img[0, 0] = 1
+    bboxes[:] = 5
+    assert cache.get('a')[1][0, 4] == 0
+
+
+def test_image_cache_skips_oversized():
+    cache = ImageCache(lambda key: (np.zeros((100, 100, 3), np.uint8), boxes()), max_bytes=1000)
+    cache.get('big')
+    assert len(cache) == 0
@@ -0,0 +1,132 @@
+"""
+Noisy (augmentations/noisy.py): every noise type returns a uint8 image that
+differs from the input, saturates instead of wrapping around, never modifies
+the input, repeats for the same seed, and draws noise with the configured
+distribution, with and without the noise bank.
+
+    python -m pytest -q tests/test_noisy.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from augmentations.noisy import Noisy, NOISE_TYPES
+
+# (noise_type, bank_size): every type, and the noise bank for the types that use it
+MODES = [(noise_type, 0) for noise_type in NOISE_TYPES] + [('gauss', 64), ('poisson', 64), ('speckle', 64)]
+
+
+def make_image(h=120, w=160, seed=0):
+    return np.random.default_rng(seed).integers(30, 226, (h, w, 3), dtype=np.uint8)
+
+
+def noisy(noise_type, bank_size=0, seed=0, **kwargs):
+    kwargs.setdefault('std', 20)
+    return Noisy(noise_type, bank_size=bank_size, rng=np.random.default_rng(seed), **kwargs)
+
+
+@pytest.mark.parametrize('noise_type, bank_size', MODES)
+def test_changes_pixels_and_keeps_input(noise_type, bank_size):
+    img = make_image()
+    original = img.copy()
+    out, bboxes = noisy(noise_type, bank_size).transform(img, 'boxes')
+
+    assert np.array_equal(img, original)
+    assert out is not img and not np.shares_memory(out, img)
+    assert out.dtype == np.uint8 and out.shape == img.shape
+    assert bboxes == 'boxes'
+    assert (out != img).mean() > 0.01
+
+
+@pytest.mark.parametrize('noise_type, bank_size', MODES)
+def test_same_seed_same_noise(noise_type, bank_size):
+    img = make_image()
+    first, _ = noisy(noise_type, bank_size, seed=4).transform(img, None)
+    second, _ = noisy(noise_type, bank_size, seed=4).transform(img, None)
+    other, _ = noisy(noise_type, bank_size, seed=5).transform(img, None)
+    assert np.array_equal(first, second)
+    assert not np.array_equal(first, other)
+
+
+@pytest.mark.parametrize('noise_type, bank_size', MODES)
+def test_reused_buffers_draw_new_noise(noise_type, bank_size):
+    img = make_image()
+    op = noisy(noise_type, bank_size)
+    first, _ = op.transform(img, None)
+    second, _ = op.transform(img, None)
+    assert not np.array_equal(first, second)
+    assert np.array_equal(img, make_image())
+
+
+@pytest.mark.parametrize('noise_type', ['gauss', 'poisson', 'speckle'])
+def test_saturates_instead_of_wrapping(noise_type):
+    # Noise std is at most 20 here, so a value more than 6 std away could only come from wrapping
+    bright, _ = noisy(noise_type).transform(np.full((100, 100, 3), 250, dtype=np.uint8), None)
+    assert bright.min() > 250 - 120 and (bright == 255).any()
+    if noise_type == 'gauss':
+        dark, _ = noisy(noise_type).transform(np.full((100, 100, 3), 5, dtype=np.uint8), None)
+        assert dark.max() < 5 + 120 and (dark == 0).any()
+
+
+def test_gauss_saturation_is_exact():
+    img = np.full((50, 50, 3), 250, dtype=np.uint8)
+    out, _ = noisy('gauss', mean=20, std=0).transform(img, None)
+    assert (out == 255).all()
+    out, _ = noisy('gauss', mean=-20, std=0).transform(np.full_like(img, 10), None)
+    assert (out == 0).all()
+
+
+@pytest.mark.parametrize('bank_size', [0, 64])
+def test_gauss_distribution(bank_size):
+    img = np.full((400, 400, 3), 128, dtype=np.uint8)
+    out, _ = noisy('gauss', bank_size, mean=5, std=10).transform(img, None)
+    diff = out.astype(np.float64) - 128
+    assert abs(diff.mean() - 5) < 0.5
+    assert abs(diff.std() - 10) < 0.5
+
+
+def test_poisson_and_speckle_scale_with_pixel_value():
+    img = np.zeros((200, 400, 3), dtype=np.uint8)
+    img[:, 200:] = 100
+    poisson, _ = noisy('poisson').transform(img, None)
+    assert (poisson[:, :200] == 0).all()
+    assert abs((poisson[:, 200:].astype(np.float64) - 100).std() - 10) < 0.5
+
+    speckle, _ = noisy('speckle', std=51).transform(img, None)
+    assert (speckle[:, :200] == 0).all()
+    assert abs((speckle[:, 200:].astype(np.float64) - 100).std() - 20) < 0.5
+
+
+def test_salt_and_pepper_fraction():
+    img = np.full((200, 200, 3), 128, dtype=np.uint8)
+    out, _ = noisy('sp', prob=0.1).transform(img, None)
+    changed = (out != 128).any(axis=2)
+    assert abs(changed.mean() - 0.1) < 0.02
+    # Whole pixels turn black or white
+    assert set(np.unique(out[changed])) <= {0, 255}
+    assert ((out[changed] == 0).all(axis=1) | (out[changed] == 255).all(axis=1)).all()
+
+
+@pytest.mark.parametrize('noise_type, bank_size', MODES)
+def test_out_buffer(noise_type, bank_size):
+    img = make_image()
+    out = np.zeros_like(img)
+    result, _ = noisy(noise_type, bank_size, seed=2).transform(img, None, out=out)
+    assert result is out
+    assert np.array_equal(out, noisy(noise_type, bank_size, seed=2).transform(img, None)[0])
+
+
+@pytest.mark.parametrize('noise_type, bank_size', MODES)
+def test_transform_batch_keeps_input(noise_type, bank_size):
+    images = np.stack([make_image(seed=i) for i in range(3)])
+    original = images.copy()
+    batch, _ = noisy(noise_type, bank_size).transform_batch(images, [None] * 3)
+    assert np.array_equal(images, original)
+    assert batch.dtype == np.uint8 and batch.shape == images.shape
+    assert all((out != img).mean() > 0.01 for out, img in zip(batch, images))
@@ -0,0 +1,41 @@
+"""
+Native photometric ops against the previous PIL + torchvision implementations
+(benchmarks/parity_photometric.py), within that script's default tolerances.
+Skipped when torchvision is not installed.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+pytest.importorskip('torchvision')
+
+from benchmarks.parity_photometric import PAIRS, load_inputs, check, within_tolerance
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    return load_inputs(samples=5, seed=0)
+
+
+@pytest.mark.parametrize('name', list(PAIRS))
+@pytest.mark.parametrize('seed', [0, 1])
+def test_matches_reference(name, seed, inputs):
+    row = check(name, inputs, seed)
+    assert within_tolerance(name, row), f"{name} lệch khỏi bản tham chiếu: {row}"
+
+
+def test_detects_mismatch(inputs, monkeypatch):
+    # A LUT that is off by 2 levels must fail the check
+    native_cls = PAIRS['AdjustBrightness'][0]
+    luts = native_cls.luts
+    monkeypatch.setattr(native_cls, 'luts', staticmethod(
+        lambda factors: np.clip(luts(factors).astype(np.int16) + 2, 0, 255).astype(np.uint8)))
+    assert not within_tolerance('AdjustBrightness', check('AdjustBrightness', inputs, 0))
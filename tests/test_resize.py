@@ -0,0 +1,114 @@
+"""
+Letterbox Resize (augmentations/resize.py, utils/utils.py): transform,
+transform_batch and a reused out= buffer give identical pixels and boxes, the
+boxes land on the resized object for non-square inputs, and pad_color is
+applied as a scalar or as a BGR tuple.
+
+    python -m pytest -q tests/test_resize.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from augmentations.resize import Resize
+from utils.utils import letterbox_geometry
+
+INP_DIM = 200
+
+# (h, w): wide, tall, square and already larger than INP_DIM on one side only
+SHAPES = [(120, 300), (300, 120), (150, 150), (90, 410)]
+
+
+def make_sample(h, w, seed=0):
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+    bboxes = np.array([[w * 0.1, h * 0.2, w * 0.5, h * 0.6, 0],
+                       [w * 0.6, h * 0.1, w * 0.9, h * 0.9, 1]], dtype=np.float32)
+    return img, bboxes
+
+
+def object_sample(h, w):
+    """Black image with one white rectangle, and the box of that rectangle"""
+    x1, y1, x2, y2 = w // 5, h // 4, w * 3 // 5, h * 4 // 5
+    img = np.zeros((h, w, 3), dtype=np.uint8)
+    img[y1:y2, x1:x2] = 255
+    return img, np.array([[x1, y1, x2, y2, 0]], dtype=np.float32)
+
+
+def test_transform_batch_and_out_match_transform():
+    resize = Resize(INP_DIM, pad_color=(10, 20, 30))
+    samples = [make_sample(h, w, seed) for seed, (h, w) in enumerate(SHAPES)]
+    singles = [resize.transform(img.copy(), bboxes.copy()) for img, bboxes in samples]
+
+    batch, batch_boxes = resize.transform_batch([img for img, _ in samples], [b for _, b in samples])
+    assert batch.shape == (len(samples), INP_DIM, INP_DIM, 3) and batch.dtype == np.uint8
+
+    # Reused buffer holding garbage from an earlier batch
+    out = np.full_like(batch, 77)
+    reused, reused_boxes = resize.transform_batch([img for img, _ in samples], [b for _, b in samples], out=out)
+    assert reused is out
+
+    for (img, bboxes), batch_img, boxes, reused_img, reused_b in zip(singles, batch, batch_boxes, reused, reused_boxes):
+        assert img.shape == (INP_DIM, INP_DIM, 3) and img.dtype == np.uint8
+        assert np.array_equal(batch_img, img)
+        assert np.array_equal(reused_img, img)
+        assert np.allclose(boxes, bboxes) and np.allclose(reused_b, bboxes)
+
+
+@pytest.mark.parametrize('h, w', SHAPES)
+def test_boxes_line_up_with_image(h, w):
+    img, bboxes = object_sample(h, w)
+    out, out_boxes = Resize(INP_DIM).transform(img, bboxes)
+
+    ys, xs = np.nonzero(out[..., 0] > 127)
+    x1, y1, x2, y2 = out_boxes[0, :4]
+    # The white rectangle covers pixels [x1, x2) x [y1, y2) of the box, up to interpolation
+    assert abs(xs.min() - x1) <= 1 and abs(xs.max() + 1 - x2) <= 1
+    assert abs(ys.min() - y1) <= 1 and abs(ys.max() + 1 - y2) <= 1
+    assert out_boxes[0, 4] == 0
+
+
+@pytest.mark.parametrize('h, w', SHAPES)
+def test_image_is_pasted_inside_padding(h, w):
+    new_w, new_h, left, top = letterbox_geometry(h, w, INP_DIM)
+    img = np.full((h, w, 3), 200, dtype=np.uint8)
+    out, _ = Resize(INP_DIM, pad_color=0).transform(img, np.zeros((0, 5), dtype=np.float32))
+
+    assert max(new_w, new_h) == INP_DIM
+    assert (out[top:top + new_h, left:left + new_w] == 200).all()
+    mask = np.ones(out.shape[:2], dtype=bool)
+    mask[top:top + new_h, left:left + new_w] = False
+    assert (out[mask] == 0).all()
+
+
+@pytest.mark.parametrize('pad_color, expected', [
+    (7, (7, 7, 7)),
+    ((10, 20, 30), (10, 20, 30)),
+    ('10, 20, 30', (10, 20, 30)),
+    ('(5)', (5, 5, 5)),
+])
+def test_pad_color(pad_color, expected):
+    img = np.full((100, 250, 3), 128, dtype=np.uint8)
+    resize = Resize(INP_DIM, pad_color=pad_color)
+    single, _ = resize.transform(img, np.zeros((0, 5), dtype=np.float32))
+    batch, _ = resize.transform_batch([img], [np.zeros((0, 5), dtype=np.float32)],
+                                      out=np.zeros((1, INP_DIM, INP_DIM, 3), dtype=np.uint8))
+
+    _, new_h, _, top = letterbox_geometry(100, 250, INP_DIM)
+    assert top > 0
+    for out in (single, batch[0]):
+        assert (out[:top] == expected).all()
+        assert (out[top + new_h:] == expected).all()
+        assert (out[top:top + new_h] == 128).all()
+
+
+def test_empty_boxes():
+    img, _ = make_sample(120, 300)
+    _, (boxes,) = Resize(INP_DIM).transform_batch([img], [np.zeros((0, 5), dtype=np.float32)])
+    assert boxes.shape == (0, 5)
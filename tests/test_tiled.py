@@ -0,0 +1,83 @@
+"""
+Tiled execution (augmentations/tiled.py) against whole-image transform(), using
+benchmarks/parity_tiled.py: every compared op matches exactly with the default
+tile_geometric = exact; with remap, geometric ops stay within the script's
+resample tolerance and don't depend on the strip size.
+
+    python -m pytest -q tests/test_tiled.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from benchmarks.parity_tiled import OPS, make_sample, run
+from augmentations.tiled import Tiler, apply_strips
+
+# ~1.2 MB images, tiled in strips of a few dozen rows
+MEMORY_MB = 0.25
+MAX_RESAMPLE_MISMATCH = 0.02
+
+COMPARED = [name for name, (_, _, check) in OPS.items() if check is not None]
+RESAMPLED = [name for name, (_, _, check) in OPS.items() if check == 'resample']
+
+
+@pytest.fixture(scope='module')
+def sample():
+    return make_sample(480, 640, 8, np.random.default_rng(0))
+
+
+@pytest.mark.parametrize('name', COMPARED)
+def test_exact_mode_matches_whole_image(name, sample):
+    section, params, _ = OPS[name]
+    img, bboxes = sample
+    tiler = Tiler(MEMORY_MB)
+    assert tiler.needs_tiling(img)
+    (ref, ref_boxes), _ = run(section, params, 0, img, bboxes)
+    (out, out_boxes), _ = run(section, params, 0, img, bboxes, tiler)
+    assert np.array_equal(out, ref), f"{name} chia dải cho kết quả khác ảnh nguyên"
+    assert np.allclose(np.asarray(out_boxes, np.float32), np.asarray(ref_boxes, np.float32))
+
+
+@pytest.mark.parametrize('name', RESAMPLED)
+def test_remap_mode_within_tolerance(name, sample):
+    section, params, _ = OPS[name]
+    img, bboxes = sample
+    (ref, ref_boxes), _ = run(section, params, 0, img, bboxes)
+    (out, out_boxes), _ = run(section, params, 0, img, bboxes, Tiler(MEMORY_MB, exact=False))
+    (other, _), _ = run(section, params, 0, img, bboxes, Tiler(MEMORY_MB * 3, exact=False))
+
+    diff = np.abs(out.astype(np.int16) - ref)
+    assert np.count_nonzero(diff) / diff.size <= MAX_RESAMPLE_MISMATCH and diff.max() <= 1
+    assert np.allclose(np.asarray(out_boxes, np.float32), np.asarray(ref_boxes, np.float32))
+    assert np.array_equal(other, out), "Kết quả không được phụ thuộc vào kích thước dải"
+
+
+def test_noisy_runs_tiled(sample):
+    section, params, _ = OPS['Noisy']
+    img, bboxes = sample
+    (out, _), _ = run(section, params, 0, img, bboxes, Tiler(MEMORY_MB))
+    assert out.shape == img.shape and out.dtype == img.dtype
+
+
+def test_strips_cover_every_row():
+    tiler = Tiler(0.01, min_rows=4)
+    shape = (1000, 500, 3)
+    strips = list(tiler.strips(shape, bytes_per_pixel=3, halo=2))
+    assert strips[0][0] == 0 and strips[-1][1] == 1000
+    assert all(a[1] == b[0] for a, b in zip(strips, strips[1:]))
+    assert all(top == max(0, y0 - 2) and bottom == min(1000, y1 + 2) for y0, y1, top, bottom in strips)
+    # Temporaries of a strip (with its halo) stay within memory_mb
+    assert all((bottom - top) * 500 * 3 <= tiler.memory_bytes for _, _, top, bottom in strips)
+
+
+def test_apply_strips_in_place():
+    img = np.arange(200 * 30 * 3, dtype=np.uint32).reshape(200, 30, 3).astype(np.uint8)
+    expected = 255 - img
+    out = apply_strips(lambda strip: np.subtract(255, strip, out=strip), img, Tiler(0.001), bytes_per_pixel=3)
+    assert out is img and np.array_equal(img, expected)
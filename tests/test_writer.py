@@ -0,0 +1,97 @@
+"""
+AsyncWriter (utils/writer.py): failures surface on the caller's thread, the
+bounded queue blocks submit() instead of growing, and when_all_done only calls
+back once every write succeeded.
+
+    python -m pytest -q tests/test_writer.py
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from utils.writer import AsyncWriter, when_all_done
+
+
+def fail():
+    raise OSError('disk full')
+
+
+def test_runs_every_job():
+    results = []
+    with AsyncWriter(threads=3, queue_size=4) as writer:
+        futures = [writer.submit(results.append, i) for i in range(50)]
+    assert sorted(results) == list(range(50))
+    assert all(future.done() for future in futures)
+
+
+def test_error_reraised_from_flush():
+    writer = AsyncWriter(threads=1)
+    future = writer.submit(fail)
+    with pytest.raises(RuntimeError, match='disk full'):
+        writer.flush()
+    assert isinstance(future.exception(), OSError)
+    # Reported once, the writer keeps working
+    writer.submit(lambda: None)
+    writer.close()
+
+
+def test_error_reraised_from_next_submit():
+    writer = AsyncWriter(threads=1)
+    writer.submit(fail).exception()
+    with pytest.raises(RuntimeError, match='1 write job'):
+        writer.submit(lambda: None)
+    writer.close()
+
+
+def test_error_reraised_from_close():
+    writer = AsyncWriter(threads=2)
+    writer.submit(fail)
+    with pytest.raises(RuntimeError):
+        writer.close()
+
+
+def test_exit_does_not_mask_exception():
+    with pytest.raises(KeyError):
+        with AsyncWriter(threads=1) as writer:
+            writer.submit(fail)
+            raise KeyError('original')
+
+
+def test_backpressure_blocks_submit():
+    release = threading.Event()
+    writer = AsyncWriter(threads=1, queue_size=2)
+    # One job running on the thread, two waiting in the queue
+    for _ in range(3):
+        writer.submit(release.wait)
+
+    blocked = threading.Thread(target=writer.submit, args=(lambda: None,))
+    blocked.start()
+    blocked.join(timeout=0.2)
+    assert blocked.is_alive(), "submit() phải chờ khi hàng đợi đầy"
+
+    release.set()
+    blocked.join(timeout=5)
+    assert not blocked.is_alive()
+    writer.close()
+
+
+def test_when_all_done():
+    calls = []
+    with AsyncWriter(threads=2) as writer:
+        when_all_done([writer.submit(lambda: None) for _ in range(5)], lambda: calls.append('ok'))
+    assert calls == ['ok']
+
+    writer = AsyncWriter(threads=2)
+    when_all_done([writer.submit(lambda: None), writer.submit(fail)], lambda: calls.append('failed'))
+    with pytest.raises(RuntimeError):
+        writer.close()
+    assert calls == ['ok']
+
+    when_all_done([], lambda: calls.append('empty'))
+    assert calls == ['ok', 'empty']
@@ -0,0 +1,131 @@
+"""
+Streamed ZIP downloads (webapp/zip_stream.py): the streamed archive opens and
+matches the output folder, the cached copy is only published by a complete
+stream that still owns its .part file and whose output did not change meanwhile,
+and stale .part files are taken over.
+
+    python -m pytest -q tests/test_zip_stream.py
+"""
+
+import io
+import os
+import sys
+import time
+import zipfile
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'webapp'))
+
+import zip_stream
+from zip_stream import stream_zip, remove_partial_archives, STALE_PART_SECONDS
+
+
+@pytest.fixture
+def folder(tmp_path):
+    rng = np.random.default_rng(0)
+    root = tmp_path / 'output'
+    (root / 'images').mkdir(parents=True)
+    (root / 'labels').mkdir()
+    for i in range(3):
+        (root / 'images' / f'img{i}.jpg').write_bytes(rng.integers(0, 256, 50_000, dtype=np.uint8).tobytes())
+        (root / 'labels' / f'img{i}.txt').write_text('0 0.5 0.5 0.2 0.2\n' * 20)
+    (root / 'empty.txt').write_bytes(b'')
+    return root
+
+
+def folder_files(root):
+    return {os.path.relpath(os.path.join(d, n), root).replace(os.sep, '/'): open(os.path.join(d, n), 'rb').read()
+            for d, _, names in os.walk(root) for n in names}
+
+
+def check_archive(data, root):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert {info.filename: zf.read(info) for info in zf.infolist()} == folder_files(root)
+        for info in zf.infolist():
+            stored = info.filename.endswith('.jpg')
+            assert info.compress_type == (zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+
+
+def test_stream_matches_folder(folder, monkeypatch):
+    # Small chunks, so files span several yields
+    monkeypatch.setattr(zip_stream, 'CHUNK_SIZE', 4096)
+    chunks = list(stream_zip(str(folder)))
+    assert len(chunks) > 3
+    check_archive(b''.join(chunks), folder)
+
+
+def test_tee_cache(folder, tmp_path):
+    tee_path = str(tmp_path / 'out.zip')
+    data = b''.join(stream_zip(str(folder), tee_path))
+    check_archive(data, folder)
+    assert open(tee_path, 'rb').read() == data
+    assert not os.path.exists(tee_path + '.part')
+
+
+def test_fresh_part_is_not_taken_over(folder, tmp_path):
+    tee_path = str(tmp_path / 'out.zip')
+    with open(tee_path + '.part', 'wb') as f:
+        f.write(b'other stream')
+    check_archive(b''.join(stream_zip(str(folder), tee_path)), folder)
+    assert not os.path.exists(tee_path)
+    assert open(tee_path + '.part', 'rb').read() == b'other stream'
+
+
+def test_stale_part_is_taken_over(folder, tmp_path):
+    tee_path = str(tmp_path / 'out.zip')
+    part_path = tee_path + '.part'
+    with open(part_path, 'wb') as f:
+        f.write(b'dead stream')
+    old = time.time() - STALE_PART_SECONDS - 400
+    os.utime(part_path, (old, old))
+    data = b''.join(stream_zip(str(folder), tee_path))
+    assert open(tee_path, 'rb').read() == data
+    assert not os.path.exists(part_path)
+
+
+def test_taken_over_stream_does_not_publish(folder, tmp_path):
+    tee_path = str(tmp_path / 'out.zip')
+    part_path = tee_path + '.part'
+    stream = stream_zip(str(folder), tee_path)
+    first = next(stream)
+    # Another stream replaced the .part file meanwhile
+    os.remove(part_path)
+    with open(part_path, 'wb') as f:
+        f.write(b'new owner')
+    check_archive(first + b''.join(stream), folder)
+    assert not os.path.exists(tee_path)
+    assert open(part_path, 'rb').read() == b'new owner'
+
+
+def test_outdated_stream_does_not_publish(folder, tmp_path):
+    tee_path = str(tmp_path / 'out.zip')
+    generation = [0]
+    stream = stream_zip(str(folder), tee_path, lambda: generation[0] == 0)
+    first = next(stream)
+    # A job rewrote the folder while the archive was being built
+    generation[0] += 1
+    check_archive(first + b''.join(stream), folder)
+    assert not os.path.exists(tee_path) and not os.path.exists(tee_path + '.part')
+
+
+def test_aborted_stream_leaves_nothing(folder, tmp_path):
+    tee_path = str(tmp_path / 'out.zip')
+    stream = stream_zip(str(folder), tee_path)
+    next(stream)
+    assert os.path.exists(tee_path + '.part')
+    # The client disconnected
+    stream.close()
+    assert not os.path.exists(tee_path) and not os.path.exists(tee_path + '.part')
+
+
+def test_remove_partial_archives(tmp_path):
+    for name in ('a.zip.part', 'b.zip.part', 'c.zip'):
+        (tmp_path / name).write_bytes(b'x')
+    (tmp_path / 'd').mkdir()
+    remove_partial_archives(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ['c.zip', 'd']
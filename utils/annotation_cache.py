@@ -0,0 +1,145 @@
+import os
+import json
+import hashlib
+import threading
+
+import numpy as np
+from PIL import Image
+
+from utils.utils import get_info_bbox_pascalvoc, parse_yolo_label
+
+CACHE_FILENAME = '.annotations_cache.npz'
+# Bump when the parsers or the file layout change, old caches are then ignored
+CACHE_VERSION = 1
+
+# EXIF orientations that rotate by 90 degrees (cv2.imread applies them, PIL's size does not)
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def read_image_size(img_path):
+    """(h, w) of the image as cv2.imread would decode it, from the file header only"""
+    with Image.open(img_path) as img:
+        w, h = img.size
+        if img.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+            w, h = h, w
+    return h, w
+
+
+class AnnotationCache:
+    """Persistent columnar cache of parsed labels, stored as one .npz file in `folder`.
+
+    One row per label file: label and image paths (relative to `folder`), their mtime_ns and
+    size, the image (h, w) and offsets into a single (M, 5) float32 box array. Rows whose files
+    are unchanged are served from memory after one read of the file; the rest are re-parsed.
+    Lookups are thread safe; call save() to persist new rows.
+    """
+
+    def __init__(self, folder, label_format, label_mapping=None, filename=CACHE_FILENAME):
+        assert label_format in ('yolo', 'voc'), f"Không hỗ trợ định dạng nhãn: {label_format}"
+        self.folder = folder
+        self.label_format = label_format
+        self.label_mapping = label_mapping or {}
+        self.path = os.path.join(folder, filename)
+        # VOC class ids depend on the mapping, so a different mapping invalidates the cache
+        self._key = hashlib.md5(json.dumps([CACHE_VERSION, label_format, sorted(self.label_mapping.items())])
+                                .encode()).hexdigest()
+        self._rows = {}
+        self._touched = set()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, label_path, img_path):
+        """(boxes, (h, w)) for a label file, parsing it only if it or its image changed"""
+        rel_label = os.path.relpath(label_path, self.folder)
+        stat = self._stat(label_path, img_path)
+        row = self._rows.get(rel_label)
+        if row is not None and row[1] == stat:
+            with self._lock:
+                self._touched.add(rel_label)
+            return row[2].copy(), row[3]
+
+        img_size = read_image_size(img_path)
+        if self.label_format == 'yolo':
+            boxes = parse_yolo_label(label_path, img_size[1], img_size[0])
+        else:
+            boxes = get_info_bbox_pascalvoc(label_path, self.label_mapping)
+        boxes = boxes.reshape(-1, 5)
+        with self._lock:
+            self._rows[rel_label] = (os.path.relpath(img_path, self.folder), stat, boxes, img_size)
+            self._touched.add(rel_label)
+            self._dirty = True
+        return boxes.copy(), img_size
+
+    def update(self, pairs):
+        """Refresh the rows for (label_path, img_path) pairs; returns (cached, parsed, failed) counts.
+
+        Files that fail to parse are skipped here and raise again when get() is called for them.
+        """
+        cached = parsed = failed = 0
+        for label_path, img_path in pairs:
+            before = self._rows.get(os.path.relpath(label_path, self.folder))
+            try:
+                self.get(label_path, img_path)
+            except Exception:
+                failed += 1
+                continue
+            if self._rows.get(os.path.relpath(label_path, self.folder)) is before:
+                cached += 1
+            else:
+                parsed += 1
+        return cached, parsed, failed
+
+    def save(self, prune=False):
+        """Write the cache atomically. prune=True drops rows not looked up since loading"""
+        with self._lock:
+            rows = {label: row for label, row in self._rows.items() if not prune or label in self._touched}
+            if not self._dirty and len(rows) == len(self._rows):
+                return
+            self._rows, self._dirty = rows, False
+
+        labels = sorted(rows)
+        boxes = [rows[label][2] for label in labels]
+        offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in boxes])
+        stats = np.array([rows[label][1] for label in labels], dtype=np.int64).reshape(-1, 4)
+
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     key=np.array(self._key),
+                     label_paths=np.array(labels, dtype=str),
+                     img_paths=np.array([rows[label][0] for label in labels], dtype=str),
+                     stats=stats,
+                     img_sizes=np.array([rows[label][3] for label in labels], dtype=np.int32).reshape(-1, 2),
+                     offsets=offsets,
+                     boxes=np.concatenate(boxes) if boxes else np.zeros((0, 5), dtype=np.float32))
+        os.replace(tmp_path, self.path)
+
+    def _stat(self, label_path, img_path):
+        label_stat, img_stat = os.stat(label_path), os.stat(img_path)
+        return label_stat.st_mtime_ns, label_stat.st_size, img_stat.st_mtime_ns, img_stat.st_size
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                if str(data['key']) != self._key:
+                    return
+                columns = {name: data[name] for name in data.files}
+            offsets, boxes, img_paths = columns['offsets'], columns['boxes'], columns['img_paths'].tolist()
+            stats, img_sizes = columns['stats'], columns['img_sizes']
+            rows = {}
+            for i, label in enumerate(columns['label_paths'].tolist()):
+                rows[label] = (img_paths[i], tuple(stats[i].tolist()),
+                               boxes[offsets[i]:offsets[i + 1]], tuple(img_sizes[i].tolist()))
+        except Exception:
+            # Unreadable, damaged (BadZipFile, zlib.error, ...) or older layout: start over,
+            # the cache is rewritten on save()
+            return
+        self._rows.update(rows)
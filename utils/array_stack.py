@@ -0,0 +1,153 @@
+import os
+import re
+import json
+import time
+import threading
+
+import numpy as np
+
+# Room for the final shape in the pixels.npy header, which is rewritten in place on close()
+_HEADER_SIZE = 128
+
+
+class ArrayStackWriter:
+    """Append raw uint8 images and their boxes to a memory-mappable stack.
+
+    `{name}.npy` is a 1-D uint8 .npy of every image's pixels back to back. `{name}.idx` gets
+    one JSON line per sample (key, offset, shape, boxes in pixel coordinates) as it is written,
+    and close() fixes the .npy header and packs the index into `{name}.npz`. Read with
+    ArrayStack, which also works on a stack left unclosed by a crash. With skip_existing, keys
+    already in a stack index of the folder are not written again (samples redone after a resume).
+    write() is thread safe.
+    """
+
+    def __init__(self, folder, prefix='stack', stats=None, skip_existing=False):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        # A resumed run starts a new stack instead of appending to an unfinished one
+        pattern = re.compile(re.escape(prefix) + r'-(\d+)\.npy$')
+        indices = [int(m.group(1)) for m in map(pattern.match, os.listdir(folder)) if m]
+        self.path = os.path.join(folder, f'{prefix}-{max(indices, default=-1) + 1:06d}')
+        self.stats = stats
+        self._existing = set()
+        if skip_existing:
+            for name in os.listdir(folder):
+                if name.endswith('.idx'):
+                    self._existing.update(_read_index(os.path.join(folder, name))['keys'].tolist())
+        self._lock = threading.Lock()
+        self._size = 0
+        self._pixels = open(self.path + '.npy', 'wb')
+        self._pixels.write(_npy_header(0))
+        self._index = open(self.path + '.idx', 'w')
+
+    def write(self, key, img, bboxes):
+        """Append one sample; False if skipped as already written"""
+        if key in self._existing:
+            return False
+        start = time.perf_counter()
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+        boxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 5)
+        with self._lock:
+            entry = {'key': key, 'offset': self._size, 'shape': list(img.shape), 'boxes': boxes.tolist()}
+            self._pixels.write(memoryview(img).cast('B'))
+            self._size += img.nbytes
+            self._pixels.flush()
+            self._index.write(json.dumps(entry) + '\n')
+            self._index.flush()
+        if self.stats is not None:
+            self.stats.add('npy(raw)', time.perf_counter() - start, img.nbytes)
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._pixels is None:
+                return
+            self._pixels.seek(0)
+            self._pixels.write(_npy_header(self._size))
+            self._pixels.close()
+            self._index.close()
+            self._pixels = self._index = None
+        columns = _read_index(self.path + '.idx')
+        tmp_path = self.path + '.npz.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **columns)
+        os.replace(tmp_path, self.path + '.npz')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _npy_header(size):
+    header = {'descr': '|u1', 'fortran_order': False, 'shape': (size,)}
+    # .npy v1.0: magic, version, header length, then the header dict padded with spaces
+    prefix = b'\x93NUMPY\x01\x00'
+    body = repr(header).encode()
+    body += b' ' * (_HEADER_SIZE - len(prefix) - 2 - len(body) - 1) + b'\n'
+    return prefix + len(body).to_bytes(2, 'little') + body
+
+
+def _read_index(idx_path):
+    """Index columns from the JSON lines (a line cut short by a crash is skipped)"""
+    keys, offsets, shapes, boxes, box_offsets = [], [], [], [], [0]
+    with open(idx_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            keys.append(entry['key'])
+            offsets.append(entry['offset'])
+            shapes.append((entry['shape'] + [1])[:3])
+            boxes.extend(entry['boxes'])
+            box_offsets.append(len(boxes))
+    return {
+        'keys': np.array(keys, dtype=str),
+        'offsets': np.array(offsets, dtype=np.int64),
+        'shapes': np.array(shapes, dtype=np.int64).reshape(-1, 3),
+        'boxes': np.array(boxes, dtype=np.float32).reshape(-1, 5),
+        'box_offsets': np.array(box_offsets, dtype=np.int64),
+    }
+
+
+class ArrayStack:
+    """Read side of ArrayStackWriter: stack[i] -> (image view into the memmap, boxes)"""
+
+    def __init__(self, path):
+        path = path[:-4] if path.endswith(('.npy', '.npz', '.idx')) else path
+        if os.path.exists(path + '.npz'):
+            with np.load(path + '.npz') as data:
+                columns = {name: data[name] for name in data.files}
+        else:
+            columns = _read_index(path + '.idx')
+        self.keys = columns['keys'].tolist()
+        self.offsets = columns['offsets']
+        self.shapes = columns['shapes']
+        self.boxes = columns['boxes']
+        self.box_offsets = columns['box_offsets']
+        # Map by file size rather than the header, which is only final after close()
+        if os.path.getsize(path + '.npy') > _HEADER_SIZE:
+            self.pixels = np.memmap(path + '.npy', dtype=np.uint8, mode='r', offset=_HEADER_SIZE)
+        else:
+            self.pixels = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, i):
+        h, w, c = self.shapes[i]
+        img = self.pixels[self.offsets[i]:self.offsets[i] + h * w * c].reshape(h, w, c)
+        return img, self.boxes[self.box_offsets[i]:self.box_offsets[i + 1]]
+
+    def as_array(self):
+        """(N, h, w, c) view of the whole stack, when every image has the same shape"""
+        assert len(self) and (self.shapes == self.shapes[0]).all(), "Các ảnh trong stack không cùng kích thước"
+        h, w, c = self.shapes[0]
+        return self.pixels[:len(self) * h * w * c].reshape(len(self), h, w, c)
+
+
+def list_stacks(folder):
+    """Stack paths (without extension) in a folder, sorted"""
+    return sorted(os.path.join(folder, name[:-4]) for name in os.listdir(folder) if name.endswith('.npy'))
@@ -0,0 +1,99 @@
+import os
+import hashlib
+from array import array
+from collections import Counter
+
+import numpy as np
+
+IMG_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def scan_dataset(folder, label_ext, recursive=False, img_extensions=IMG_EXTENSIONS):
+    """Yield (image path relative to folder, has label) for every image, streamed with os.scandir.
+
+    A label is the file with the image's stem and `label_ext` in the same directory. Only one
+    directory listing is held at a time; hidden files and directories are skipped.
+    """
+    label_ext = '.' + label_ext.lstrip('.').lower()
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        images, label_stems = [], set()
+        with os.scandir(os.path.join(folder, rel_dir)) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir():
+                    if recursive:
+                        pending.append(os.path.join(rel_dir, entry.name))
+                    continue
+                # str.rpartition instead of os.path.splitext, which dominates on millions of files
+                stem, dot, ext = entry.name.rpartition('.')
+                ext = dot + ext.lower()
+                if ext == label_ext:
+                    label_stems.add(stem)
+                elif ext in img_extensions:
+                    images.append((entry.name, stem))
+        prefix = os.path.join(rel_dir, '') if rel_dir else ''
+        for name, stem in sorted(images):
+            yield prefix + name, stem in label_stems
+
+
+def hash_fraction(key, seed=0):
+    """Deterministic position of `key` in [0, 1), independent of the other files"""
+    digest = hashlib.md5(f'{seed}:{key}'.encode()).digest()
+    return int.from_bytes(digest[:8], 'little') / 2 ** 64
+
+
+def hash_split(filenames, scale, seed=0):
+    """(train, val, test) by comparing each file's hash_fraction with the cumulative scale.
+
+    A file's split depends only on its path and the seed, so adding or removing files never moves
+    the existing ones.
+    """
+    train_cut, val_cut = scale[0], sum(scale[:2])
+    splits = ([], [], [])
+    for filename in filenames:
+        fraction = hash_fraction(filename, seed)
+        splits[0 if fraction < train_cut else 1 if fraction < val_cut else 2].append(filename)
+    return splits
+
+
+def stratified_split(samples, scale, seed=0):
+    """(train, val, test) from samples(), keeping the scale ratios within every class.
+
+    samples is a callable returning a fresh iterable of (filename, class ids) pairs; it is
+    iterated twice, so labels are streamed instead of held: the first pass counts the images of
+    each class, the second assigns each image to the stratum of its rarest class (images without
+    boxes share one). Besides the returned filenames only a hash_fraction and a stratum index are
+    kept per image. Each stratum is ordered by hash_fraction and cut at the scale ratios, rounded
+    so that small strata still reach train first. New files shift only the files next to a cut.
+    """
+    counts = Counter()
+    for _, classes in samples():
+        counts.update(set(classes))
+
+    filenames, fractions, strata = [], array('d'), array('q')
+    stratum_ids = {}
+    for filename, classes in samples():
+        stratum = min(set(classes), key=lambda c: (counts[c], c)) if classes else None
+        filenames.append(filename)
+        fractions.append(hash_fraction(filename, seed))
+        strata.append(stratum_ids.setdefault(stratum, len(stratum_ids)))
+    if not filenames:
+        return [], [], []
+
+    # Rank of every image inside its stratum, strata in order of first appearance
+    strata = np.frombuffer(strata, dtype=np.int64)
+    order = np.lexsort((np.frombuffer(fractions, dtype=np.float64), strata))
+    sizes = np.bincount(strata)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    train_cut = np.round(sizes * scale[0])[strata]
+    val_cut = np.round(sizes * sum(scale[:2]))[strata]
+    split_of = np.where(rank < train_cut, 0, np.where(rank < val_cut, 1, 2))
+
+    splits = ([], [], [])
+    for i, split in zip(order.tolist(), split_of[order].tolist()):
+        splits[split].append(filenames[i])
+    return splits
@@ -0,0 +1,89 @@
+import time
+import threading
+from collections import defaultdict
+
+import cv2
+
+IMAGE_FORMATS = ('jpg', 'png', 'webp')
+
+
+class EncodeStats:
+    """Per-format encode time and output bytes, summed over a run (thread safe)"""
+
+    def __init__(self):
+        self._totals = defaultdict(lambda: [0, 0.0, 0])
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, nbytes, count=1):
+        with self._lock:
+            totals = self._totals[name]
+            totals[0] += count
+            totals[1] += seconds
+            totals[2] += nbytes
+
+    def drain(self):
+        """Return and clear the totals ({name: [count, seconds, bytes]})"""
+        with self._lock:
+            totals, self._totals = dict(self._totals), defaultdict(lambda: [0, 0.0, 0])
+        return totals
+
+    def merge(self, totals):
+        """Add totals drained from another EncodeStats (e.g. in a worker process)"""
+        for name, (count, seconds, nbytes) in totals.items():
+            self.add(name, seconds, nbytes, count)
+
+    def report(self):
+        """Print one line per format: count, ms and KB per image, total MB"""
+        with self._lock:
+            totals = {name: list(values) for name, values in self._totals.items()}
+        for name, (count, seconds, nbytes) in sorted(totals.items()):
+            if count:
+                print(f'  {name:<32} {count:>8} images {seconds / count * 1000:>8.2f} ms/img '
+                      f'{nbytes / count / 1024:>9.1f} KB/img {nbytes / 2 ** 20:>10.1f} MB total')
+        return totals
+
+
+class ImageEncoder:
+    """cv2.imencode with fixed per-run settings, recording time and size in `stats`.
+
+    jpg: quality 0-100, optimize (Huffman tables, smaller files, slower), progressive.
+    png: compression 0-9 (0 = fastest, largest). webp: quality 1-100 (above 100 is lossless).
+    """
+
+    def __init__(self, image_format='jpg', jpeg_quality=95, jpeg_optimize=False, jpeg_progressive=False,
+                 png_compression=3, webp_quality=95, stats=None):
+        assert image_format in IMAGE_FORMATS, f"image_format nên là một trong {IMAGE_FORMATS}"
+        assert 0 <= jpeg_quality <= 100, "jpeg_quality nên nằm trong [0, 100]"
+        assert 0 <= png_compression <= 9, "png_compression nên nằm trong [0, 9]"
+        self.image_format = image_format
+        self.ext = '.' + image_format
+        if image_format == 'jpg':
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality),
+                           cv2.IMWRITE_JPEG_OPTIMIZE, int(bool(jpeg_optimize)),
+                           cv2.IMWRITE_JPEG_PROGRESSIVE, int(bool(jpeg_progressive))]
+            flags = ''.join(f',{flag}' for flag, on in (('optimize', jpeg_optimize),
+                                                         ('progressive', jpeg_progressive)) if on)
+            self.name = f'jpg(q={int(jpeg_quality)}{flags})'
+        elif image_format == 'png':
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+            self.name = f'png(c={int(png_compression)})'
+        else:
+            self.params = [cv2.IMWRITE_WEBP_QUALITY, int(webp_quality)]
+            self.name = f'webp(q={int(webp_quality)})'
+        self.stats = stats if stats is not None else EncodeStats()
+
+    @classmethod
+    def from_config(cls, section, stats=None):
+        """Encoder from the image_format / jpeg_* / png_* / webp_* keys of a config section"""
+        keys = ('image_format', 'jpeg_quality', 'jpeg_optimize', 'jpeg_progressive', 'png_compression',
+                'webp_quality')
+        return cls(**{key: section[key] for key in keys if key in section}, stats=stats)
+
+    def encode(self, img):
+        start = time.perf_counter()
+        ok, buf = cv2.imencode(self.ext, img, self.params)
+        if not ok:
+            raise IOError(f'Could not encode image as {self.image_format}')
+        data = buf.tobytes()
+        self.stats.add(self.name, time.perf_counter() - start, len(data))
+        return data
@@ -0,0 +1,49 @@
+import threading
+from collections import OrderedDict
+
+
+class ImageCache:
+    """Bounded LRU cache of decoded samples: key -> (image, boxes), holding at most max_bytes of pixels.
+
+    `loader(key)` decodes a sample on a miss. Cached images are read-only, callers copy before
+    modifying; get() returns a copy of the boxes. Thread safe; a sample requested by two threads
+    at once may be decoded twice, but is stored once.
+    """
+
+    def __init__(self, loader, max_bytes=512 * 2 ** 20):
+        assert max_bytes >= 0, "max_bytes phải >= 0"
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], entry[1].copy()
+            self.misses += 1
+
+        img, bboxes = self.loader(key)
+        img.flags.writeable = False
+        bboxes.flags.writeable = False
+        with self._lock:
+            if key not in self._entries and img.nbytes <= self.max_bytes:
+                self._entries[key] = (img, bboxes)
+                self._size += img.nbytes
+                while self._size > self.max_bytes:
+                    _, (old_img, _) = self._entries.popitem(last=False)
+                    self._size -= old_img.nbytes
+        return img, bboxes.copy()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """(hits, misses, cached samples, cached bytes)"""
+        with self._lock:
+            return self.hits, self.misses, len(self._entries), self._size
@@ -0,0 +1,89 @@
+import os
+import json
+import threading
+
+
+class RunManifest:
+    """Incremental record of a create() run, used to resume it after a crash.
+
+    manifest.json holds the split assignment and is written once when the run starts.
+    manifest.jsonl gets one line per source image whose outputs are all on disk. Process
+    workers each append to their own manifest<suffix>.jsonl (see append), read back with it.
+    """
+
+    def __init__(self, path_save, suffix=''):
+        self.folder = path_save
+        self.path = os.path.join(path_save, 'manifest.json')
+        self.log_path = os.path.join(path_save, f'manifest{suffix}.jsonl')
+        self._lock = threading.Lock()
+        self._log = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def start(self, splits):
+        """Begin a new run: store the split and truncate the completion log"""
+        train, val, test = splits
+        data = {'splits': {'train': train, 'val': val, 'test': test}}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        for log_path in self._log_paths():
+            if log_path != self.log_path:
+                os.remove(log_path)
+        self._open_log('w')
+
+    def append(self):
+        """Keep adding to this log of a started or resumed run, without touching the split"""
+        self._open_log('a')
+
+    def resume(self):
+        """Reopen a previous run, return (splits, completed (split, source) pairs)"""
+        with open(self.path) as f:
+            data = json.load(f)
+        splits = tuple(data['splits'][name] for name in ('train', 'val', 'test'))
+
+        completed = set()
+        for log_path in self._log_paths():
+            with open(log_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Last line may be cut short if the previous run was killed mid-write
+                        continue
+                    completed.add((entry['split'], entry['source']))
+
+        self._open_log('a')
+        return splits, completed
+
+    def record(self, split, source, ops):
+        """Mark a source image as finished with the given ops (thread-safe)"""
+        line = json.dumps({'split': split, 'source': source, 'ops': ops}) + '\n'
+        with self._lock:
+            self._log.write(line)
+            self._log.flush()
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def _log_paths(self):
+        """manifest.jsonl and the process workers' manifest-w<N>.jsonl of this folder"""
+        return sorted(os.path.join(self.folder, name) for name in os.listdir(self.folder)
+                      if name.startswith('manifest') and name.endswith('.jsonl'))
+
+    def _open_log(self, mode):
+        self.close()
+        truncated = False
+        if mode == 'a' and os.path.exists(self.log_path) and os.path.getsize(self.log_path) > 0:
+            with open(self.log_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                truncated = f.read(1) != b'\n'
+        self._log = open(self.log_path, mode)
+        if truncated:
+            # Start a new line after an entry cut short by a killed run
+            self._log.write('\n')
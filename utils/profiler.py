@@ -0,0 +1,91 @@
+import json
+import time
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+
+import numpy as np
+
+# Shared no-op context returned by a disabled profiler, so instrumentation costs one method call
+_NULL_STAGE = nullcontext()
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+
+
+class StageProfiler:
+    """Collect per-stage wall-clock timings (imread, parse_label, op:<Class>, save, ...).
+
+    Usage: `with profiler.stage('imread'): ...`. Safe to use from several threads.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self._samples[name].append(seconds)
+
+    def drain(self):
+        """Return and clear the collected samples ({stage: [seconds, ...]})"""
+        with self._lock:
+            samples, self._samples = dict(self._samples), defaultdict(list)
+        return samples
+
+    def merge(self, samples):
+        """Add samples drained from another profiler (e.g. in a worker process)"""
+        with self._lock:
+            for name, values in samples.items():
+                self._samples[name].extend(values)
+
+    def summary(self, wall_time):
+        """Totals, mean, p95 and share of wall time per stage, slowest first"""
+        with self._lock:
+            samples = {name: np.asarray(values) for name, values in self._samples.items()}
+
+        stages = []
+        for name, values in samples.items():
+            total = float(values.sum())
+            stages.append({
+                'stage': name,
+                'count': int(values.size),
+                'total_s': round(total, 4),
+                'mean_ms': round(float(values.mean()) * 1000, 3),
+                'p95_ms': round(float(np.percentile(values, 95)) * 1000, 3),
+                # Can exceed 1.0 when stages run concurrently on several workers
+                'wall_share': round(total / wall_time, 4) if wall_time > 0 else None,
+            })
+        stages.sort(key=lambda stage: stage['total_s'], reverse=True)
+        return {'wall_time_s': round(wall_time, 4), 'stages': stages}
+
+    def report(self, wall_time, path=None):
+        """Print the summary table and optionally write it as JSON"""
+        summary = self.summary(wall_time)
+        print(f"Profile (wall time {summary['wall_time_s']:.2f} s):")
+        print(f"  {'stage':<32} {'count':>7} {'total s':>9} {'mean ms':>9} {'p95 ms':>9} {'share':>7}")
+        for stage in summary['stages']:
+            print(f"  {stage['stage']:<32} {stage['count']:>7} {stage['total_s']:>9.3f} "
+                  f"{stage['mean_ms']:>9.2f} {stage['p95_ms']:>9.2f} {stage['wall_share']:>7.1%}")
+        if path:
+            with open(path, 'w') as f:
+                json.dump(summary, f, indent=2)
+        return summary
@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import tarfile
+import threading
+from collections import OrderedDict
+
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+class ShardWriter:
+    """Pack samples into size-bounded tar shards, WebDataset style (key.jpg + key.txt / key.xml).
+
+    Shards are named `{prefix}-{index:06d}.tar`; a new one starts when the current shard would
+    pass `max_bytes` or holds `max_count` samples. Every shard has a sidecar `.idx` file with
+    one JSON line per sample: {"key": ..., "files": {".jpg": [data offset, size], ...}}.
+
+    Both files are append-only and flushed after each sample, so after a crash every sample
+    reported as written is readable. New shards continue after the highest existing index of
+    `prefix`, so a resumed run never overwrites earlier shards. With skip_existing, keys already
+    in any shard index of the folder (whatever its prefix) are not written again, so samples
+    redone after a resume don't end up in two shards. write() is thread safe.
+    """
+
+    def __init__(self, folder, prefix='shard', max_bytes=1 << 30, max_count=10000, skip_existing=False):
+        assert max_bytes > 0 and max_count > 0, "max_bytes và max_count phải > 0"
+        self.folder = folder
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_count = max_count
+        os.makedirs(folder, exist_ok=True)
+        pattern = re.compile(re.escape(prefix) + r'-(\d+)\.tar$')
+        indices = [int(m.group(1)) for m in map(pattern.match, os.listdir(folder)) if m]
+        self._next_index = max(indices, default=-1) + 1
+        self._existing = set()
+        if skip_existing:
+            for name in os.listdir(folder):
+                if name.endswith('.tar.idx'):
+                    self._existing.update(load_index(os.path.join(folder, name[:-len('.idx')])))
+        self._lock = threading.Lock()
+        self._tar = None
+        self._index = None
+        self._size = 0
+        self._count = 0
+
+    def write(self, key, files):
+        """Append one sample, files given as {extension: bytes}; False if skipped as already written"""
+        if key in self._existing:
+            return False
+        members = [(key + ext, data) for ext, data in files.items()]
+        headers = [self._header(name, len(data)) for name, data in members]
+        sample_size = sum(len(header) + _padded(len(data)) for header, (_, data) in zip(headers, members))
+
+        with self._lock:
+            if self._tar is None or self._count >= self.max_count or \
+                    (self._count and self._size + sample_size > self.max_bytes):
+                self._open_next()
+            offsets = {}
+            for header, (name, data) in zip(headers, members):
+                self._tar.write(header)
+                offsets[name[len(key):]] = [self._size + len(header), len(data)]
+                self._tar.write(data)
+                self._tar.write(b'\0' * (_padded(len(data)) - len(data)))
+                self._size += len(header) + _padded(len(data))
+            self._tar.flush()
+            self._index.write(json.dumps({'key': key, 'files': offsets}) + '\n')
+            self._index.flush()
+            self._count += 1
+        return True
+
+    def close(self):
+        """Finish the current shard (end-of-archive blocks)"""
+        with self._lock:
+            self._close_current()
+
+    @staticmethod
+    def _header(name, size):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mode = 0o644
+        return info.tobuf(format=tarfile.GNU_FORMAT)
+
+    def _open_next(self):
+        self._close_current()
+        path = os.path.join(self.folder, f'{self.prefix}-{self._next_index:06d}.tar')
+        self._next_index += 1
+        self._tar = open(path, 'wb')
+        self._index = open(path + '.idx', 'w')
+        self._size = self._count = 0
+
+    def _close_current(self):
+        if self._tar is None:
+            return
+        self._tar.write(b'\0' * (2 * BLOCK_SIZE))
+        self._tar.close()
+        self._index.close()
+        self._tar = self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _padded(size):
+    return -(-size // BLOCK_SIZE) * BLOCK_SIZE
+
+
+def list_shards(path):
+    """Shard paths of a folder (sorted), or [path] for a single .tar"""
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.tar'))
+    return [path]
+
+
+def iter_shards(paths):
+    """Yield (key, {extension: bytes}) for every sample of the shards, reading them sequentially.
+
+    `paths` is a shard, a folder of shards or a list of shards. A shard cut short by a crash
+    ends at its last complete sample. A key seen in an earlier shard is skipped: a crash between
+    writing a sample and recording it in the run manifest makes a resumed run write it again.
+    """
+    if isinstance(paths, str):
+        paths = list_shards(paths)
+    seen = set()
+    for path in paths:
+        key, files = None, {}
+        with tarfile.open(path, mode='r|') as tar:
+            try:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    name = os.path.basename(member.name)
+                    stem, ext = name.split('.', 1) if '.' in name else (name, '')
+                    if stem != key and files:
+                        if key not in seen:
+                            seen.add(key)
+                            yield key, files
+                        files = {}
+                    key = stem
+                    files['.' + ext] = tar.extractfile(member).read()
+            except (tarfile.ReadError, EOFError):
+                # Truncated member: drop the incomplete sample
+                files = {}
+        if files and key not in seen:
+            seen.add(key)
+            yield key, files
+
+
+def load_index(shard_path):
+    """{key: {extension: (offset, size)}} from a shard's sidecar .idx file"""
+    index = OrderedDict()
+    with open(shard_path + '.idx') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Last line may be cut short by a crash
+                continue
+            index[entry['key']] = {ext: tuple(loc) for ext, loc in entry['files'].items()}
+    return index
+
+
+def read_sample(shard_path, key, index=None):
+    """{extension: bytes} of one sample, read straight from its offsets in the shard"""
+    index = load_index(shard_path) if index is None else index
+    files = {}
+    with open(shard_path, 'rb') as f:
+        for ext, (offset, size) in index[key].items():
+            f.seek(offset)
+            files[ext] = f.read(size)
+    return files
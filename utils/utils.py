@@ -71,15 +71,11 @@ def clip_box(bbox, clip_box, alpha):
     return bbox[mask]
 
 
-def rotate_im(image, angle):
-    # grab the dimensions of the image and then determine the
-    # centre
-    (h, w) = image.shape[:2]
-    (cX, cY) = (w // 2, h // 2)
-
-    # grab the rotation matrix (applying the negative of the
-    # angle to rotate clockwise), then grab the sine and cosine
+def get_rotation_matrix(h, w, angle):
+    # grab the rotation matrix around the centre (applying the negative
+    # of the angle to rotate clockwise), then grab the sine and cosine
     # (i.e., the rotation components of the matrix)
+    (cX, cY) = (w // 2, h // 2)
     M = cv2.getRotationMatrix2D((cX, cY), angle, 1.0)
     cos = np.abs(M[0, 0])
     sin = np.abs(M[0, 1])
@@ -92,6 +88,25 @@ def rotate_im(image, angle):
     M[0, 2] += (nW / 2) - cX
     M[1, 2] += (nH / 2) - cY
 
+    return M, nW, nH
+
+
+def get_pil_rotation_matrix(w, h, angle):
+    """Output -> input mapping of PIL's Image.rotate(angle) (about (w / 2, h / 2), same size)
+    in OpenCV's pixel-centre convention, for cv2.warpAffine with WARP_INVERSE_MAP"""
+    theta = np.deg2rad(angle)
+    R = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    center = np.array([w / 2, h / 2])
+    t = R @ (0.5 - center) + center - 0.5
+    return np.hstack((R, t[:, None]))
+
+
+def rotate_im(image, angle):
+    # grab the dimensions of the image and the rotation matrix
+    # for the enlarged canvas that holds the whole rotated image
+    (h, w) = image.shape[:2]
+    M, nW, nH = get_rotation_matrix(h, w, angle)
+
     # perform the actual rotation and return the image
     image = cv2.warpAffine(image, M, (nW, nH))
 
@@ -157,19 +172,82 @@ def get_enclosing_box(corners):
     return final
 
 
-def letterbox_image(img, inp_dim):
-    inp_dim = (inp_dim, inp_dim)
-    img_w, img_h = img.shape[1], img.shape[0]
-    w, h = inp_dim
-    new_w = int(img_w * min(w/img_w, h/img_h))
-    new_h = int(img_h * min(w/img_w, h/img_h))
-    resized_image = cv2.resize(img, (new_w,new_h))
-    
-    canvas = np.full((inp_dim[1], inp_dim[0], 3), 0)
-
-    canvas[(h-new_h)//2:(h-new_h)//2 + new_h,(w-new_w)//2:(w-new_w)//2 + new_w,  :] = resized_image
-    
-    return canvas
+# ITU-R 601 luma weights in the 16-bit fixed point PIL uses for convert("L"), in BGR order
+_GRAY_WEIGHTS = np.array([[7471, 38470, 19595]], dtype=np.float32) / 65536
+
+def bgr_to_gray(img):
+    """Grayscale of a BGR uint8 image, matching PIL's convert("L") rather than cv2.COLOR_BGR2GRAY"""
+    return cv2.transform(img, _GRAY_WEIGHTS)
+
+def letterbox_geometry(img_h, img_w, inp_dim):
+    """(new_w, new_h, left, top) of an img_w x img_h image letterboxed into inp_dim x inp_dim"""
+    scale = min(inp_dim / img_w, inp_dim / img_h)
+    new_w, new_h = int(img_w * scale), int(img_h * scale)
+    return new_w, new_h, (inp_dim - new_w) // 2, (inp_dim - new_h) // 2
+
+
+def letterbox_image(img, inp_dim, pad_color=0, out=None):
+    """Resize img keeping its aspect ratio and pad it to inp_dim x inp_dim, in img's dtype.
+
+    pad_color is a scalar or a per-channel tuple (BGR). Without `out` the result is a new
+    array from cv2.copyMakeBorder; with `out` (shape (inp_dim, inp_dim) + img.shape[2:])
+    the image is resized straight into it and only the borders are filled.
+    """
+    new_w, new_h, left, top = letterbox_geometry(img.shape[0], img.shape[1], inp_dim)
+    right, bottom = inp_dim - new_w - left, inp_dim - new_h - top
+    if out is None:
+        pad = (pad_color,) * 4 if np.isscalar(pad_color) else tuple(pad_color)
+        return cv2.copyMakeBorder(cv2.resize(img, (new_w, new_h)), top, bottom, left, right,
+                                  cv2.BORDER_CONSTANT, value=pad)
+
+    assert out.shape == (inp_dim, inp_dim) + img.shape[2:], "out không đúng kích thước"
+    out[:top] = pad_color
+    out[top + new_h:] = pad_color
+    out[top:top + new_h, :left] = pad_color
+    out[top:top + new_h, left + new_w:] = pad_color
+    cv2.resize(img, (new_w, new_h), dst=out[top:top + new_h, left:left + new_w])
+    return out
+
+
+def letterbox_batch(images, inp_dim, pad_color=0, out=None):
+    """Letterbox images (same dtype and channels) into one (N, inp_dim, inp_dim, ...) array.
+
+    Returns (batch, params) where params[i] = (scale_x, scale_y, left, top) maps the boxes
+    of images[i] onto the batch (see letterbox_bboxes). `out` is reused when given.
+    """
+    shape = (len(images), inp_dim, inp_dim) + images[0].shape[2:]
+    if out is None:
+        out = np.empty(shape, dtype=images[0].dtype)
+    assert out.shape == shape, "out không đúng kích thước"
+
+    for i, img in enumerate(images):
+        letterbox_image(img, inp_dim, pad_color, out=out[i])
+    return out, letterbox_params([img.shape for img in images], inp_dim)
+
+
+def letterbox_params(shapes, inp_dim):
+    """(N, 4) float32 rows (scale_x, scale_y, left, top) for images of the given shapes"""
+    params = np.empty((len(shapes), 4), dtype=np.float32)
+    for i, (img_h, img_w) in enumerate(shape[:2] for shape in shapes):
+        new_w, new_h, left, top = letterbox_geometry(img_h, img_w, inp_dim)
+        params[i] = new_w / img_w, new_h / img_h, left, top
+    return params
+
+
+def letterbox_bboxes(bboxes_list, params):
+    """Map each image's boxes through its letterbox_params row, vectorized over the whole batch"""
+    bboxes_list = [np.asarray(bboxes, dtype=np.float32) for bboxes in bboxes_list]
+    columns = next((bboxes.shape[-1] for bboxes in bboxes_list if bboxes.size), 5)
+    bboxes_list = [bboxes.reshape(-1, columns) for bboxes in bboxes_list]
+    counts = [len(bboxes) for bboxes in bboxes_list]
+    if sum(counts) == 0:
+        return bboxes_list
+
+    boxes = np.concatenate([bboxes for bboxes in bboxes_list if len(bboxes)])
+    per_box = np.repeat(params, counts, axis=0)
+    boxes[:, [0, 2]] = boxes[:, [0, 2]] * per_box[:, 0:1] + per_box[:, 2:3]
+    boxes[:, [1, 3]] = boxes[:, [1, 3]] * per_box[:, 1:2] + per_box[:, 3:4]
+    return np.split(boxes, np.cumsum(counts)[:-1])
 
 
 def get_info_bbox_pascalvoc(xml_path, label_mapping):
@@ -204,12 +282,15 @@ def get_info_bbox_pascalvoc(xml_path, label_mapping):
 import numpy as np
 
 def get_info_bbox_yolo(img, txt_path):
+    img_h, img_w = img.shape[:2]
+    return parse_yolo_label(txt_path, img_w, img_h)
+
+
+def parse_yolo_label(txt_path, img_w, img_h):
+    """YOLO label file -> (N, 5) float32 pixel boxes for an img_w x img_h image"""
     # List to store the bounding boxes and their corresponding class information
     bboxes = []
     
-    # Read the image from file
-    image = img.copy()
-    
     # Read the bounding box information from the YOLO format file
     with open(txt_path, 'r') as f:
         lines = f.readlines()
@@ -225,9 +306,6 @@ def get_info_bbox_yolo(img, txt_path):
         id_class, x_center, y_center, bbox_width, bbox_height = map(float, values[:5])
         id_class = int(id_class)
         
-        # Convert from YOLO format (normalized) to pixel coordinates
-        img_h, img_w = image.shape[:2]
-        
         # Calculate pixel coordinates
         xmin = int((x_center - bbox_width / 2) * img_w)
         ymin = int((y_center - bbox_height / 2) * img_h)
@@ -362,43 +440,47 @@ def save_pascalvoc_format(img, bboxes, path_save_img, path_save_label, mapping_l
         # Save the image to the specified path
         cv2.imwrite(img_path, img)
         
-def save_sample(dest_type_dataset, img, bboxes, path_save_img, path_save_label, mapping_labels):
+def encode_sample(dest_type_dataset, img, bboxes, mapping_labels, path_save_img='', encoder=None):
+    """Encoded files of one sample as {extension: bytes}, empty if nothing should be written.
+
+    VOC samples without boxes are skipped, like save_sample always did. path_save_img only
+    fills the <filename> field of VOC annotations. The image is encoded with `encoder`
+    (utils.encoder.ImageEncoder), or as a default quality JPEG.
+    """
     if dest_type_dataset == 'yolo':
-        name = format(random.getrandbits(128), 'x')
-        img_path = os.path.join(path_save_img, name + '.jpg')
-        txt_path = os.path.join(path_save_label, name + '.txt')
-        
-        with open(txt_path, "w") as f:
-            # Convert and write each bounding box in YOLO format to the file
-            for box in list(bboxes):
-                # Convert the bounding box coordinates to YOLO format
-                class_index, xcen, ycen, w, h = bndbox2yololine(box, img)
-                
-                # Write the bounding box in YOLO format to the file
-                f.write("%d %.6f %.6f %.6f %.6f\n" % (class_index, xcen, ycen, w, h))
-        cv2.imwrite(img_path, img)
+        # Convert each bounding box to a YOLO line
+        lines = ["%d %.6f %.6f %.6f %.6f\n" % bndbox2yololine(box, img) for box in list(bboxes)]
+        label = ('.txt', ''.join(lines).encode())
     elif dest_type_dataset == 'voc':
-        name = format(random.getrandbits(128), 'x')
-        img_path = os.path.join(path_save_img, name + '.jpg')
-        xml_path = os.path.join(path_save_label, name + '.xml')
+        if len(bboxes) == 0:
+            return {}
         h, w = img.shape[:2]
         mapping_labels = list(mapping_labels.keys())
-        if len(bboxes) != 0:
-            voc_labels = []
-            
-            for xmin, ymin, xmax, ymax, id_class in bboxes:
-                voc = []
-                voc.append(mapping_labels[int(id_class)])  # Get the class name from the class ID
-                voc.append(int(round(xmin)))
-                voc.append(int(round(ymin)))
-                voc.append(int(round(xmax)))
-                voc.append(int(round(ymax)))
-                voc_labels.append(voc)
-
-            # Create XML tree for object annotations
-            root = create_xml_tree(path_save_img, w, h, voc_labels)
-            tree = ET.ElementTree(root)
-            tree.write(xml_path)
-            
-            # Save the image to the specified path
-            cv2.imwrite(img_path, img)
\ No newline at end of file
+        voc_labels = []
+        for xmin, ymin, xmax, ymax, id_class in bboxes:
+            # Get the class name from the class ID
+            voc_labels.append([mapping_labels[int(id_class)],
+                               int(round(xmin)), int(round(ymin)), int(round(xmax)), int(round(ymax))])
+        # Create XML tree for object annotations
+        root = create_xml_tree(path_save_img, w, h, voc_labels)
+        label = ('.xml', ET.tostring(root))
+    else:
+        return {}
+
+    if encoder is not None:
+        return {encoder.ext: encoder.encode(img), label[0]: label[1]}
+    ok, buf = cv2.imencode('.jpg', img)
+    if not ok:
+        raise IOError('Could not encode image')
+    return {'.jpg': buf.tobytes(), label[0]: label[1]}
+
+
+def save_sample(dest_type_dataset, img, bboxes, path_save_img, path_save_label, mapping_labels, name=None,
+                encoder=None):
+    # Random file name unless the caller picks a stable one
+    name = name or format(random.getrandbits(128), 'x')
+    files = encode_sample(dest_type_dataset, img, bboxes, mapping_labels, path_save_img, encoder)
+    for ext, data in files.items():
+        folder = path_save_label if ext in ('.txt', '.xml') else path_save_img
+        with open(os.path.join(folder, name + ext), 'wb') as f:
+            f.write(data)
@@ -0,0 +1,105 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class AsyncWriter:
+    """Run encode/write jobs (e.g. save_sample) on background threads.
+
+    Jobs go through a bounded queue, so submit() blocks once `queue_size` jobs are
+    pending and memory held by queued images stays bounded. The first failure is
+    re-raised from the next submit(), flush() or close() call.
+    """
+
+    def __init__(self, threads=2, queue_size=64):
+        assert threads >= 1, "threads phải >= 1"
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._errors = []
+        self._errors_lock = threading.Lock()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs), blocking while the queue is full"""
+        assert not self._closed, "AsyncWriter đã đóng"
+        self.raise_errors()
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def flush(self):
+        """Wait until every queued job has finished, then surface errors"""
+        self._queue.join()
+        self.raise_errors()
+
+    def close(self):
+        """Flush pending jobs and stop the worker threads"""
+        if self._closed:
+            return
+        self._queue.join()
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self.raise_errors()
+
+    def raise_errors(self):
+        with self._errors_lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            raise RuntimeError(f'{len(errors)} write job(s) failed, first error: {errors[0]}') from errors[0]
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                future, fn, args, kwargs = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except Exception as e:
+                    with self._errors_lock:
+                        self._errors.append(e)
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        # Already unwinding: stop the threads without masking the original exception
+        try:
+            self.close()
+        except RuntimeError:
+            pass
+
+
+def when_all_done(futures, callback):
+    """Call callback() once every future has completed successfully (never if one fails)"""
+    futures = list(futures)
+    if not futures:
+        callback()
+        return
+
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last and all(future.exception() is None for future in futures):
+            callback()
+
+    for future in futures:
+        future.add_done_callback(on_done)
@@ -3,7 +3,7 @@ import json
 import uuid
 import shutil
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_file
 from werkzeug.utils import secure_filename
 import cv2
 import numpy as np
@@ -15,21 +15,26 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from augmentation_service import AugmentationService
 from database import Database
+from job_queue import JobQueue
+from zip_stream import stream_zip, remove_partial_archives
+from utils.encoder import IMAGE_FORMATS
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 1000 * 1024 * 1024  # 100MB max
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
 app.config['DATABASE'] = 'tasks.db'
+app.config['AUGMENT_WORKERS'] = int(os.environ.get('AUGMENT_WORKERS', os.cpu_count() or 1))  # Threads per augment request
+app.config['WRITER_THREADS'] = int(os.environ.get('WRITER_THREADS', 2))  # Encode/write threads per augment request
+# Output format of augmented images (jpg, png, webp); unset keeps the source extension
+app.config['IMAGE_FORMAT'] = os.environ.get('IMAGE_FORMAT')
+app.config['JPEG_QUALITY'] = int(os.environ.get('JPEG_QUALITY', 95))
+app.config['MAX_CONCURRENT_JOBS'] = int(os.environ.get('MAX_CONCURRENT_JOBS', 1))  # Augment jobs run at once
 
 # Initialize services
 db = Database(app.config['DATABASE'])
 aug_service = AugmentationService()
 
-# Create necessary folders
-for folder in [app.config['UPLOAD_FOLDER'], app.config['OUTPUT_FOLDER']]:
-    os.makedirs(folder, exist_ok=True)
-
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp'}
 
 def allowed_file(filename):
@@ -110,7 +115,7 @@ def upload_files():
 
 @app.route('/api/preview/<task_id>', methods=['POST'])
 def preview_augmentation(task_id):
-    """Generate preview with random sample"""
+    """Generate preview with random sample (or the given `image` and `seed`)"""
     data = request.json
     selected_augmentations = data.get('augmentations', [])
     
@@ -130,7 +135,9 @@ def preview_augmentation(task_id):
     result = aug_service.generate_preview(
         task_folder,
         selected_augmentations,
-        task['label_format']
+        task['label_format'],
+        image=data.get('image'),
+        seed=data.get('seed')
     )
     
     if 'error' in result:
@@ -138,9 +145,75 @@ def preview_augmentation(task_id):
     
     return jsonify(result)
 
+def run_augment_job(job, progress, cancel):
+    """Run a queued augment job (see job_queue.JobQueue); resumed jobs keep the outputs already written"""
+    params = job['params']
+    task = db.get_task(job['task_id'])
+    if not task:
+        raise RuntimeError('Task not found in database')
+    
+    # Downloads are refused while the job runs; drop any archive cached from earlier, partial contents
+    remove_download_cache(job['output_id'])
+    try:
+        result = aug_service.apply_augmentations(
+            os.path.join(app.config['UPLOAD_FOLDER'], job['task_id']),
+            os.path.join(app.config['OUTPUT_FOLDER'], job['output_id']),
+            params['augmentations'],
+            task['label_format'],
+            workers=app.config['AUGMENT_WORKERS'],
+            writer_threads=app.config['WRITER_THREADS'],
+            encoder_settings=params.get('encoder'),
+            progress=progress,
+            cancel=cancel,
+            skip_existing=True
+        )
+    finally:
+        remove_download_cache(job['output_id'])
+    
+    if not result.get('cancelled'):
+        # Update task with augmentation info
+        db.add_augmentation(job['task_id'], {
+            'output_id': job['output_id'],
+            'augmentations': params['augmentations'],
+            'output_count': result['processed_count'],
+            'created_at': datetime.now().isoformat()
+        })
+    
+    return result
+
+job_queue = JobQueue(db, run_augment_job, app.config['MAX_CONCURRENT_JOBS'])
+
+# Encoder settings a client may send: key -> (type, min, max), ranges as in ImageEncoder
+ENCODER_FIELDS = {
+    'jpeg_quality': (int, 0, 100),
+    'jpeg_optimize': (bool, None, None),
+    'jpeg_progressive': (bool, None, None),
+    'png_compression': (int, 0, 9),
+    'webp_quality': (int, 1, 101),
+}
+
+def validate_encoder(encoder):
+    """Error message for client encoder settings that ImageEncoder would reject, or None"""
+    if not isinstance(encoder, dict):
+        return 'encoder must be an object'
+    for key, value in encoder.items():
+        if key == 'image_format':
+            if value not in IMAGE_FORMATS:
+                return f'encoder.image_format must be one of {", ".join(IMAGE_FORMATS)}'
+            continue
+        if key not in ENCODER_FIELDS:
+            return f'Unknown encoder setting: {key}'
+        kind, low, high = ENCODER_FIELDS[key]
+        # bool is an int, but not a valid quality
+        if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+            return f'encoder.{key} must be {"a boolean" if kind is bool else "an integer"}'
+        if low is not None and not low <= value <= high:
+            return f'encoder.{key} must be in [{low}, {high}]'
+    return None
+
 @app.route('/api/augment/<task_id>', methods=['POST'])
 def augment_task(task_id):
-    """Apply augmentation to all images in task"""
+    """Queue augmentation of all images in task, returns the job to poll at /api/jobs/<job_id>"""
     data = request.json
     selected_augmentations = data.get('augmentations', [])
     
@@ -155,50 +228,95 @@ def augment_task(task_id):
     if not task:
         return jsonify({'error': 'Task not found in database'}), 404
     
-    # Create output folder
-    output_id = str(uuid.uuid4())
-    output_folder = os.path.join(app.config['OUTPUT_FOLDER'], output_id)
+    encoder = data.get('encoder')
+    if encoder:
+        error = validate_encoder(encoder)
+        if error:
+            return jsonify({'error': error}), 400
     
-    # Apply augmentation
-    result = aug_service.apply_augmentations(
-        task_folder,
-        output_folder,
-        selected_augmentations,
-        task['label_format']
-    )
-    
-    if 'error' in result:
-        return jsonify(result), 400
+    # Output folder of the job
+    output_id = str(uuid.uuid4())
     
-    # Update task with augmentation info
-    augmentation_data = {
-        'output_id': output_id,
+    job = job_queue.submit(task_id, output_id, {
         'augmentations': selected_augmentations,
-        'output_count': result['processed_count'],
-        'created_at': datetime.now().isoformat()
-    }
-    
-    db.add_augmentation(task_id, augmentation_data)
+        'encoder': encoder or (
+            {'image_format': app.config['IMAGE_FORMAT'], 'jpeg_quality': app.config['JPEG_QUALITY']}
+            if app.config['IMAGE_FORMAT'] else None)
+    })
     
     return jsonify({
-        'output_id': output_id,
-        'message': 'Augmentation completed',
-        **result
-    })
+        'message': 'Augmentation queued',
+        **job
+    }), 202
+
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    """Get augment jobs, optionally of one task (?task_id=)"""
+    return jsonify(job_queue.list_jobs(request.args.get('task_id')))
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get job status and progress"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    job = job_queue.cancel(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Queue a cancelled or failed job again, keeping the outputs it already wrote"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] not in ('cancelled', 'failed'):
+        return jsonify({'error': f"Job is {job['status']}, only cancelled or failed jobs can be resumed"}), 409
+    return jsonify(job_queue.resume(job_id)), 202
+
+def output_generation(output_id):
+    """Changes whenever a job of the output is queued, started or finished (folder contents may differ)"""
+    return [(job['job_id'], job['status'], job['started_at'], job['finished_at'])
+            for job in db.get_jobs(output_id=output_id)]
+
+def remove_download_cache(output_id):
+    """Drop the cached zip of an output, after its folder changed or was deleted"""
+    zip_path = os.path.join(app.config['OUTPUT_FOLDER'], f'{output_id}.zip')
+    if os.path.exists(zip_path):
+        os.remove(zip_path)
 
 @app.route('/api/download/<output_id>')
 def download_results(output_id):
-    """Download augmented results as zip"""
+    """Download augmented results as zip.
+    
+    The first download streams the archive while it is built (images stored, not recompressed)
+    and caches it as outputs/<output_id>.zip; later downloads are served from the cache, with
+    Range requests so they can be resumed. Refused (409) while the output's job is unfinished.
+    The streamed archive is not cached if a job of the output ran while it was being built.
+    """
     output_folder = os.path.join(app.config['OUTPUT_FOLDER'], output_id)
     
     if not os.path.exists(output_folder):
         return jsonify({'error': 'Output not found'}), 404
+    if db.get_jobs(output_id=output_id, statuses=('queued', 'running')):
+        return jsonify({'error': 'Output is still being generated'}), 409
     
-    # Create zip file
+    download_name = f'augmented_{output_id}.zip'
     zip_path = f"{output_folder}.zip"
-    shutil.make_archive(output_folder, 'zip', output_folder)
-    
-    return send_file(zip_path, as_attachment=True, download_name=f'augmented_{output_id}.zip')
+    if os.path.exists(zip_path):
+        return send_file(os.path.abspath(zip_path), as_attachment=True, download_name=download_name,
+                         conditional=True)
+    
+    generation = output_generation(output_id)
+    return Response(stream_zip(output_folder, zip_path, lambda: output_generation(output_id) == generation),
+                    mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={download_name}'})
 
 @app.route('/api/tasks', methods=['GET'])
 def get_tasks():
@@ -209,6 +327,18 @@ def get_tasks():
 @app.route('/api/tasks/<task_id>', methods=['DELETE'])
 def delete_task(task_id):
     """Delete a task and its data"""
+    # Stop its jobs, waiting for running ones so nothing writes into the folders deleted below
+    jobs = job_queue.list_jobs(task_id)
+    for job in jobs:
+        job_queue.cancel(job['job_id'], wait=True)
+    
+    # Outputs to delete (of finished augmentations and of every job, finished or not), read before
+    # the task leaves the database
+    task = db.get_task(task_id)
+    output_ids = {job['output_id'] for job in jobs}
+    if task and 'augmentations' in task:
+        output_ids.update(aug['output_id'] for aug in task['augmentations'])
+    
     # Delete from database
     db.delete_task(task_id)
     
@@ -217,23 +347,35 @@ def delete_task(task_id):
     if os.path.exists(task_folder):
         shutil.rmtree(task_folder)
     
-    # Delete associated outputs
-    task = db.get_task(task_id)
-    if task and 'augmentations' in task:
-        for aug in task['augmentations']:
-            output_folder = os.path.join(app.config['OUTPUT_FOLDER'], aug['output_id'])
-            if os.path.exists(output_folder):
-                shutil.rmtree(output_folder)
+    # Delete associated outputs and their cached downloads
+    for output_id in output_ids:
+        output_folder = os.path.join(app.config['OUTPUT_FOLDER'], output_id)
+        if os.path.exists(output_folder):
+            shutil.rmtree(output_folder)
+        remove_download_cache(output_id)
     
     return jsonify({'message': 'Task deleted successfully'})
 
-@app.route('/api/preview-image/<path:filename>')
-def serve_preview_image(filename):
-    """Serve preview images"""
-    return send_from_directory(app.config['OUTPUT_FOLDER'], filename)
+def create_app():
+    """The app, ready to serve: call once in the process that serves the requests
+    (e.g. gunicorn 'app:create_app()'); importing this module has no side effects.
+    
+    Creates the upload/output folders, drops download archives a previous run left half-written
+    and the preview files older versions saved to outputs/previews (previews are inline now),
+    then starts the job workers, resuming the jobs of a previous run.
+    """
+    for folder in [app.config['UPLOAD_FOLDER'], app.config['OUTPUT_FOLDER']]:
+        os.makedirs(folder, exist_ok=True)
+    remove_partial_archives(app.config['OUTPUT_FOLDER'])
+    shutil.rmtree(os.path.join(app.config['OUTPUT_FOLDER'], 'previews'), ignore_errors=True)
+    job_queue.start()
+    return app
 
 if __name__ == '__main__':
     # Use environment variable or default to debug mode for local development
     import os as env_os
     debug_mode = env_os.environ.get('FLASK_ENV') != 'production'
+    # Under the debug reloader only the reloaded child, which serves the requests, starts the workers
+    if not debug_mode or env_os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        create_app()
     app.run(host='0.0.0.0', port=2222, debug=debug_mode)
@@ -4,47 +4,69 @@ import numpy as np
 import random
 import json
 import sys
+import base64
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 
 # Import augmentation modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from augmentations.brightness import AdjustBrightness
-from augmentations.contrast import AdjustContrast
-from augmentations.saturation import AdjustSaturation
-from augmentations.cutout import Cutout
-from augmentations.filters import Filters
-from augmentations.grid_mask import GridMask
-from augmentations.horizontal_flip import HorizontalFlip
-from augmentations.hsv import RandomHSV
-from augmentations.lighting_noise import LightingNoise
-from augmentations.noisy import Noisy
-from augmentations.resize import Resize
-from augmentations.rotate import Rotate
-from augmentations.scale import Scale
+from augmentations.registry import create_op
 from augmentations.sequence import Sequence
-from augmentations.shear import Shear
-from augmentations.translate import Translate
-from utils.utils import draw_rect, get_info_bbox_yolo, get_info_bbox_pascalvoc
+from utils.utils import draw_rect
+from utils.writer import AsyncWriter, when_all_done
+from utils.annotation_cache import AnnotationCache, read_image_size
+from utils.encoder import ImageEncoder, EncodeStats
+from utils.image_cache import ImageCache
 import xml.etree.ElementTree as ET
 
+# VOC uploads carry class names, mapped to ids with this default mapping
+DEFAULT_VOC_LABEL_MAPPING = {'person': 0, 'car': 1, 'dog': 2, 'cat': 3}
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+# Previews are generated at this longest side, and the last encoded ones kept in memory
+PREVIEW_MAX_SIZE = 640
+PREVIEW_CACHE_ENTRIES = 256
+PREVIEW_SAMPLE_CACHE_MB = 64
+PREVIEW_JPEG_QUALITY = 85
+
 
 class AugmentationService:
     def __init__(self):
+        # Ops are created through augmentations.registry, which imports their modules on first use
         self.augmentation_classes = {
-            'brightness': {'class': AdjustBrightness, 'params': {'brightness_min': 0.8, 'brightness_max': 1.2}, 'name': 'Brightness', 'description': 'Điều chỉnh độ sáng'},
-            'contrast': {'class': AdjustContrast, 'params': {'contrast_min': 0.8, 'contrast_max': 1.2}, 'name': 'Contrast', 'description': 'Điều chỉnh độ tương phản'},
-            'saturation': {'class': AdjustSaturation, 'params': {'saturation_min': 0.8, 'saturation_max': 1.2}, 'name': 'Saturation', 'description': 'Điều chỉnh độ bão hòa'},
-            'horizontal_flip': {'class': HorizontalFlip, 'params': {}, 'name': 'Horizontal Flip', 'description': 'Lật ảnh theo chiều ngang'},
-            'hsv': {'class': RandomHSV, 'params': {}, 'name': 'Random HSV', 'description': 'Điều chỉnh HSV ngẫu nhiên'},
-            'noisy': {'class': Noisy, 'params': {}, 'name': 'Noise', 'description': 'Thêm nhiễu vào ảnh'},
-            'rotate': {'class': Rotate, 'params': {'angle_min': -15, 'angle_max': 15}, 'name': 'Rotate', 'description': 'Xoay ảnh'},
-            'scale': {'class': Scale, 'params': {'scale_x_min': 0.8, 'scale_x_max': 1.2, 'scale_y_min': 0.8, 'scale_y_max': 1.2}, 'name': 'Scale', 'description': 'Thay đổi tỷ lệ ảnh'},
-            'shear': {'class': Shear, 'params': {'shear_min': -0.2, 'shear_max': 0.2}, 'name': 'Shear', 'description': 'Biến dạng nghiêng'},
-            'translate': {'class': Translate, 'params': {'translate_min': 0.1, 'translate_max': 0.2}, 'name': 'Translate', 'description': 'Dịch chuyển ảnh'},
-            'cutout': {'class': Cutout, 'params': {'amount': 0.3}, 'name': 'Cutout', 'description': 'Tạo vùng che ngẫu nhiên'},
-            'grid_mask': {'class': GridMask, 'params': {'prob': 0.7}, 'name': 'Grid Mask', 'description': 'Tạo lưới che'},
+            'brightness': {'params': {'brightness_min': 0.8, 'brightness_max': 1.2}, 'name': 'Brightness', 'description': 'Điều chỉnh độ sáng'},
+            'contrast': {'params': {'contrast_min': 0.8, 'contrast_max': 1.2}, 'name': 'Contrast', 'description': 'Điều chỉnh độ tương phản'},
+            'saturation': {'params': {'saturation_min': 0.8, 'saturation_max': 1.2}, 'name': 'Saturation', 'description': 'Điều chỉnh độ bão hòa'},
+            'horizontal_flip': {'params': {}, 'name': 'Horizontal Flip', 'description': 'Lật ảnh theo chiều ngang'},
+            'hsv': {'params': {}, 'name': 'Random HSV', 'description': 'Điều chỉnh HSV ngẫu nhiên'},
+            'noisy': {'params': {}, 'name': 'Noise', 'description': 'Thêm nhiễu vào ảnh'},
+            'rotate': {'params': {'angle_min': -15, 'angle_max': 15}, 'name': 'Rotate', 'description': 'Xoay ảnh'},
+            'scale': {'params': {'scale_x_min': 0.8, 'scale_x_max': 1.2, 'scale_y_min': 0.8, 'scale_y_max': 1.2}, 'name': 'Scale', 'description': 'Thay đổi tỷ lệ ảnh'},
+            'shear': {'params': {'shear_min': -0.2, 'shear_max': 0.2}, 'name': 'Shear', 'description': 'Biến dạng nghiêng'},
+            'translate': {'params': {'translate_min': 0.1, 'translate_max': 0.2}, 'name': 'Translate', 'description': 'Dịch chuyển ảnh'},
+            'cutout': {'params': {'amount': 0.3}, 'name': 'Cutout', 'description': 'Tạo vùng che ngẫu nhiên'},
+            'grid_mask': {'params': {'prob': 0.7}, 'name': 'Grid Mask', 'description': 'Tạo lưới che'},
         }
+        # Augmentation objects owned by the current thread, each with its own random Generator
+        self._thread_state = threading.local()
+        # Parsed labels per (labels folder, format), persisted next to the labels
+        self._annotation_caches = {}
+        self._annotation_lock = threading.Lock()
+        # Preview state: image listing per folder (with its mtime), downsampled samples, LRU of encoded
+        # previews keyed by (task, image, op, seed) and the threads that run the selected ops
+        self._image_listings = {}
+        self._preview_samples = ImageCache(lambda key: self.read_preview_sample(*key),
+                                           PREVIEW_SAMPLE_CACHE_MB * 2 ** 20)
+        self._preview_cache = OrderedDict()
+        self._preview_lock = threading.Lock()
+        self._preview_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1),
+                                                    thread_name_prefix='preview')
     
     def get_available_augmentations(self):
         """Return list of available augmentations"""
@@ -63,18 +85,43 @@ class AugmentationService:
         for aug_id in selected_augmentations:
             if aug_id in self.augmentation_classes:
                 aug_config = self.augmentation_classes[aug_id]
-                aug_obj = aug_config['class'](**aug_config['params'])
+                aug_obj = create_op(aug_id, **aug_config['params'])
                 augmentations.append(aug_obj)
         
-        return Sequence(augmentations, probs=1)
+        return Sequence(augmentations, probs=1, fuse_geometric=True)
     
-    def create_single_augmentation(self, aug_id):
+    def create_single_augmentation(self, aug_id, rng=None):
         """Create a single augmentation object"""
         if aug_id in self.augmentation_classes:
             aug_config = self.augmentation_classes[aug_id]
-            return aug_config['class'](**aug_config['params'])
+            return create_op(aug_id, **aug_config['params'], rng=rng)
         return None
     
+    def get_thread_augmentation(self, aug_id):
+        """Get the calling thread's augmentation object, creating it on first use"""
+        augmentations = getattr(self._thread_state, 'augmentations', None)
+        if augmentations is None:
+            augmentations = self._thread_state.augmentations = {}
+        if aug_id not in augmentations:
+            augmentations[aug_id] = self.create_single_augmentation(aug_id, rng=np.random.default_rng())
+        return augmentations[aug_id]
+    
+    def get_annotation_cache(self, labels_folder, label_format):
+        """Shared annotation cache of a labels folder, loaded on first use"""
+        key = (os.path.abspath(labels_folder), label_format)
+        with self._annotation_lock:
+            if key not in self._annotation_caches:
+                label_mapping = DEFAULT_VOC_LABEL_MAPPING if label_format == 'voc' else None
+                self._annotation_caches[key] = AnnotationCache(labels_folder, label_format, label_mapping)
+            return self._annotation_caches[key]
+    
+    def save_annotation_caches(self):
+        """Persist labels parsed since the last save"""
+        with self._annotation_lock:
+            caches = list(self._annotation_caches.values())
+        for cache in caches:
+            cache.save()
+    
     def read_image_and_label(self, img_path, label_path, label_format):
         """Read image and label"""
         # Read image
@@ -85,12 +132,9 @@ class AugmentationService:
         # Read label
         bboxes = None
         if label_path and os.path.exists(label_path):
-            if label_format == 'yolo':
-                bboxes = get_info_bbox_yolo(img, label_path)
-            elif label_format == 'voc':
-                # For VOC format, we need label mapping
-                label_mapping = {'person': 0, 'car': 1, 'dog': 2, 'cat': 3}  # Default mapping
-                bboxes = get_info_bbox_pascalvoc(label_path, label_mapping)
+            if label_format in ('yolo', 'voc'):
+                cache = self.get_annotation_cache(os.path.dirname(label_path), label_format)
+                bboxes, _ = cache.get(label_path, img_path)
         
         if bboxes is None or len(bboxes) == 0:
             bboxes = np.array([])
@@ -141,85 +185,245 @@ class AugmentationService:
         tree = ET.ElementTree(annotation)
         tree.write(output_path)
     
-    def generate_preview(self, task_folder, selected_augmentations, label_format):
-        """Generate preview with a random sample for each augmentation"""
+    def list_images(self, images_folder):
+        """Image files of a folder, cached until the folder changes"""
+        mtime = os.stat(images_folder).st_mtime_ns
+        with self._preview_lock:
+            cached = self._image_listings.get(images_folder)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        image_files = sorted(f for f in os.listdir(images_folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+        with self._preview_lock:
+            self._image_listings[images_folder] = (mtime, image_files)
+        return image_files
+    
+    def read_preview_sample(self, img_path, label_path, label_format, max_size=PREVIEW_MAX_SIZE, mtime=None):
+        """Image downsampled to max_size (longest side) with its boxes scaled to match.
+        
+        JPEGs are decoded at a reduced scale (1/2, 1/4 or 1/8) that stays above max_size, so a 4K
+        source never goes through a full resolution decode. mtime only tells cached samples apart.
+        """
+        h, w = read_image_size(img_path)
+        reduce = 1
+        while reduce < 8 and max(h, w) // (reduce * 2) >= max_size:
+            reduce *= 2
+        flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                 8: cv2.IMREAD_REDUCED_COLOR_8}[reduce]
+        img = cv2.imread(img_path, flags)
+        if img is None:
+            raise IOError(f'Could not read image: {img_path}')
+        
+        scale = min(1.0, max_size / max(img.shape[:2]))
+        if scale < 1.0:
+            size = (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale)))
+            img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        
+        bboxes = np.zeros((0, 5), dtype=np.float32)
+        if label_path and os.path.exists(label_path) and label_format in ('yolo', 'voc'):
+            cache = self.get_annotation_cache(os.path.dirname(label_path), label_format)
+            bboxes, _ = cache.get(label_path, img_path)
+            bboxes = bboxes.astype(np.float32).reshape(-1, 5)
+            bboxes[:, :4] *= np.array([img.shape[1] / w, img.shape[0] / h] * 2, dtype=np.float32)
+        return img, bboxes
+    
+    def encode_preview(self, img, bboxes):
+        """JPEG data URI of an image with its boxes drawn"""
+        img = draw_rect(img, bboxes, img) if len(bboxes) > 0 else img
+        _, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, PREVIEW_JPEG_QUALITY])
+        return 'data:image/jpeg;base64,' + base64.b64encode(buf).decode('ascii')
+    
+    def cached_preview(self, key, make):
+        """Entry of the preview LRU, computed by make() on a miss"""
+        with self._preview_lock:
+            entry = self._preview_cache.get(key)
+            if entry is not None:
+                self._preview_cache.move_to_end(key)
+                return entry
+        entry = make()
+        with self._preview_lock:
+            self._preview_cache[key] = entry
+            while len(self._preview_cache) > PREVIEW_CACHE_ENTRIES:
+                self._preview_cache.popitem(last=False)
+        return entry
+    
+    def generate_preview(self, task_folder, selected_augmentations, label_format, image=None, seed=None,
+                         max_size=PREVIEW_MAX_SIZE):
+        """Generate preview of each augmentation on one sample, downsampled to max_size.
+        
+        Picks a random image and seed unless given; both are returned so the same preview can be
+        asked for again (and served from the in-memory cache). Images are returned inline as data URIs.
+        """
         images_folder = os.path.join(task_folder, 'images')
         labels_folder = os.path.join(task_folder, 'labels')
         
         # Get random image
-        image_files = [f for f in os.listdir(images_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
+        image_files = self.list_images(images_folder)
         if not image_files:
             return {'error': 'No images found'}
-        
-        random_image = random.choice(image_files)
-        img_path = os.path.join(images_folder, random_image)
+        if image is None:
+            image = random.choice(image_files)
+        elif image not in image_files:
+            return {'error': 'Image not found'}
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+        img_path = os.path.join(images_folder, image)
         
         # Find corresponding label
-        base_name = os.path.splitext(random_image)[0]
+        base_name = os.path.splitext(image)[0]
         label_ext = '.txt' if label_format == 'yolo' else '.xml'
         label_path = os.path.join(labels_folder, base_name + label_ext)
         
-        # Read image and label
-        img, bboxes = self.read_image_and_label(img_path, label_path, label_format)
-        if img is None:
-            return {'error': 'Failed to read image'}
+        # Downsampled sample, decoded once (then cached) and only when some preview is not cached
+        mtime = os.stat(img_path).st_mtime_ns
+        sample_lock = threading.Lock()
         
-        # Save preview images
-        preview_folder = os.path.join('outputs', 'previews')
-        os.makedirs(preview_folder, exist_ok=True)
+        def read_sample():
+            with sample_lock:
+                return self._preview_samples.get((img_path, label_path, label_format, max_size, mtime))
         
-        preview_id = str(random.randint(100000, 999999))
+        base_key = (task_folder, image, mtime, max_size)
         
-        # Draw bboxes on original image
-        img_with_bbox = draw_rect(img, bboxes, img) if len(bboxes) > 0 else img
-        original_path = os.path.join(preview_folder, f'original_{preview_id}.jpg')
-        cv2.imwrite(original_path, img_with_bbox)
+        def original():
+            img, bboxes = read_sample()
+            return {'image': self.encode_preview(img, bboxes), 'bbox_count': len(bboxes)}
         
-        # Generate preview for each augmentation
-        augmented_images = []
-        for aug_id in selected_augmentations:
-            aug_obj = self.create_single_augmentation(aug_id)
-            if aug_obj is None:
-                continue
-            
-            # Apply single augmentation
-            if len(bboxes) > 0:
-                bboxes_copy = bboxes.copy()
-                aug_img, aug_bboxes = aug_obj.transform(img.copy(), bboxes_copy)
-            else:
-                # If no bboxes, just transform the image with empty bbox array
-                aug_img = img.copy()
-                aug_bboxes = np.array([]).reshape(0, 5)
-                # For augmentations that don't affect bbox, still transform the image
-                try:
-                    aug_img, aug_bboxes = aug_obj.transform(img.copy(), np.array([]).reshape(0, 5))
-                except:
-                    # If augmentation fails with empty bbox, just use original image
-                    aug_img = img.copy()
-            
-            # Draw bboxes
-            aug_img_with_bbox = draw_rect(aug_img, aug_bboxes, aug_img) if len(aug_bboxes) > 0 else aug_img
-            
-            # Save augmented image
-            aug_filename = f'aug_{aug_id}_{preview_id}.jpg'
-            aug_path = os.path.join(preview_folder, aug_filename)
-            cv2.imwrite(aug_path, aug_img_with_bbox)
-            
-            augmented_images.append({
+        def augmented(aug_id):
+            img, bboxes = read_sample()
+            # Each op gets its own Generator from (seed, op), so a preview is reproducible on its own
+            aug_obj = self.create_single_augmentation(aug_id, rng=np.random.default_rng(
+                [seed, list(self.augmentation_classes).index(aug_id)]))
+            aug_img, aug_bboxes = aug_obj.transform(img.copy(), bboxes.copy())
+            return {
                 'augmentation_id': aug_id,
                 'augmentation_name': self.augmentation_classes[aug_id]['name'],
-                'image_path': f'previews/{aug_filename}',
+                'image': self.encode_preview(aug_img, aug_bboxes),
                 'bbox_count': len(aug_bboxes)
-            })
+            }
+        
+        selected = [aug_id for aug_id in selected_augmentations if aug_id in self.augmentation_classes]
+        futures = [self._preview_executor.submit(self.cached_preview, base_key + ('original', None), original)]
+        futures += [self._preview_executor.submit(self.cached_preview, base_key + (aug_id, seed),
+                                                  lambda aug_id=aug_id: augmented(aug_id))
+                    for aug_id in selected]
+        try:
+            results = [future.result() for future in futures]
+        except IOError:
+            return {'error': 'Failed to read image'}
+        self.save_annotation_caches()
         
         return {
-            'original_image': f'previews/original_{preview_id}.jpg',
-            'original_bbox_count': len(bboxes),
-            'augmented_images': augmented_images
+            'image': image,
+            'seed': seed,
+            'original_image': results[0]['image'],
+            'original_bbox_count': results[0]['bbox_count'],
+            'augmented_images': results[1:]
         }
     
-    def apply_augmentations(self, task_folder, output_folder, selected_augmentations, label_format):
-        """Apply each augmentation separately to all images"""
+    def save_output(self, aug_img, aug_bboxes, output_img_path, output_label_path, output_img_name, label_format,
+                    encoder=None):
+        """Encode and save one augmented image with its label"""
+        if encoder is not None:
+            with open(output_img_path, 'wb') as f:
+                f.write(encoder.encode(aug_img))
+        elif not cv2.imwrite(output_img_path, aug_img):
+            raise IOError(f'Could not write image: {output_img_path}')
+        if label_format == 'yolo':
+            self.save_yolo_label(aug_bboxes, aug_img.shape, output_label_path)
+        else:
+            self.save_voc_label(aug_bboxes, aug_img.shape, output_label_path, output_img_name)
+    
+    def copy_original(self, src, dst):
+        """Byte-for-byte copy of an original file into the output, as a hardlink where possible"""
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    
+    def transform_sample(self, aug_obj, img, bboxes):
+        """Apply one augmentation to a copy of the sample"""
+        if len(bboxes) > 0:
+            return aug_obj.transform(img.copy(), bboxes.copy())
+        try:
+            return aug_obj.transform(img.copy(), np.array([]).reshape(0, 5))
+        except:
+            # If augmentation fails with empty bbox, just use original image
+            return img.copy(), np.array([]).reshape(0, 5)
+    
+    def augment_image(self, aug_ids, img_file, images_folder, labels_folder, output_images_folder,
+                      output_labels_folder, label_format, writer=None, encoder=None, skip_existing=False,
+                      cancel=None, futures=None):
+        """Copy one image with its label and save one output per augmentation, return the number saved.
+        
+        The image is decoded and its label parsed once, for all augmentations. With skip_existing, an
+        output whose label was already written (after its image) counts as saved. With a writer, the
+        Futures of the queued saves are appended to `futures` when given.
+        """
+        img_path = os.path.join(images_folder, img_file)
+        base_name = os.path.splitext(img_file)[0]
+        ext = encoder.ext if encoder is not None else os.path.splitext(img_file)[1]
+        label_ext = '.txt' if label_format == 'yolo' else '.xml'
+        label_path = os.path.join(labels_folder, base_name + label_ext)
+        
+        # Copy original image and label
+        output_label_path = os.path.join(output_labels_folder, f'original_{base_name}{label_ext}')
+        if not (skip_existing and os.path.exists(output_label_path)):
+            self.copy_original(img_path, os.path.join(output_images_folder, f'original_{img_file}'))
+            if os.path.exists(label_path):
+                self.copy_original(label_path, output_label_path)
+        saved = 1
+        
+        img = bboxes = None
+        for aug_id in aug_ids:
+            if cancel is not None and cancel.is_set():
+                break
+            aug_name = self.augmentation_classes[aug_id]['name'].replace(' ', '_').lower()
+            output_label_name = f'{aug_name}_{base_name}{label_ext}'
+            output_label_path = os.path.join(output_labels_folder, output_label_name)
+            if skip_existing and os.path.exists(output_label_path):
+                saved += 1
+                continue
+            
+            # Read image and label, once
+            if img is None:
+                img, bboxes = self.read_image_and_label(img_path, label_path, label_format)
+                if img is None:
+                    return saved
+            
+            aug_img, aug_bboxes = self.transform_sample(self.get_thread_augmentation(aug_id), img, bboxes)
+            
+            # Save augmented image and label with augmentation name prefix
+            output_img_name = f'{aug_name}_{base_name}{ext}'
+            output_img_path = os.path.join(output_images_folder, output_img_name)
+            save_args = (aug_img, aug_bboxes, output_img_path, output_label_path, output_img_name, label_format,
+                         encoder)
+            if writer is None:
+                self.save_output(*save_args)
+            else:
+                future = writer.submit(self.save_output, *save_args)
+                if futures is not None:
+                    futures.append(future)
+            saved += 1
+        
+        return saved
+    
+    def apply_augmentations(self, task_folder, output_folder, selected_augmentations, label_format, workers=1,
+                            writer_threads=0, encoder_settings=None, progress=None, cancel=None, skip_existing=False):
+        """Apply each augmentation separately to all images, on `workers` threads.
+        
+        Each image is decoded once and all selected augmentations are applied to it; originals are
+        copied byte for byte (hardlinked when the output is on the same filesystem).
+        With writer_threads > 0 encoding and file writes run on a background AsyncWriter.
+        encoder_settings (ImageEncoder kwargs, e.g. {'image_format': 'webp'}) picks the output
+        format of augmented images, which otherwise keep the source extension; encode time and
+        bytes are then returned in 'encode_stats'.
+        
+        progress(done, total) is called as source images are finished (all their outputs written). Once the threading.Event `cancel`
+        is set the remaining images are skipped and the result has 'cancelled': True. skip_existing
+        keeps augmented outputs already in output_folder (resuming an interrupted job).
+        """
+        encoder = ImageEncoder(**encoder_settings, stats=EncodeStats()) if encoder_settings else None
         images_folder = os.path.join(task_folder, 'images')
         labels_folder = os.path.join(task_folder, 'labels')
         
@@ -230,84 +434,52 @@ class AugmentationService:
         os.makedirs(output_labels_folder, exist_ok=True)
         
         # Get all images
-        image_files = [f for f in os.listdir(images_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
-        processed_count = 0
-        
-        # First, copy original images and labels
-        for img_file in image_files:
-            img_path = os.path.join(images_folder, img_file)
-            base_name = os.path.splitext(img_file)[0]
-            ext = os.path.splitext(img_file)[1]
-            label_ext = '.txt' if label_format == 'yolo' else '.xml'
-            label_path = os.path.join(labels_folder, base_name + label_ext)
-            
-            # Copy original image
-            output_img_path = os.path.join(output_images_folder, f'original_{img_file}')
-            img = cv2.imread(img_path)
-            if img is not None:
-                cv2.imwrite(output_img_path, img)
-            
-            # Copy original label
-            if os.path.exists(label_path):
-                output_label_path = os.path.join(output_labels_folder, f'original_{base_name}{label_ext}')
-                import shutil
-                shutil.copy2(label_path, output_label_path)
-            
-            processed_count += 1
+        image_files = [f for f in os.listdir(images_folder) if f.lower().endswith(IMAGE_EXTENSIONS)]
+        aug_ids = [aug_id for aug_id in selected_augmentations if aug_id in self.augmentation_classes]
+        total = len(image_files)
+        done = 0
+        done_lock = threading.Lock()
         
-        # Apply each augmentation separately
-        for aug_id in selected_augmentations:
-            aug_obj = self.create_single_augmentation(aug_id)
-            if aug_obj is None:
-                continue
-            
-            aug_name = self.augmentation_classes[aug_id]['name'].replace(' ', '_').lower()
+        def report():
+            nonlocal done
+            if progress is None:
+                return
+            with done_lock:
+                done += 1
+                progress(done, total)
+        
+        with (AsyncWriter(writer_threads) if writer_threads > 0 else nullcontext()) as writer:
+            def run(img_file):
+                if cancel is not None and cancel.is_set():
+                    return 0
+                futures = []
+                saved = self.augment_image(aug_ids, img_file, images_folder, labels_folder, output_images_folder,
+                                           output_labels_folder, label_format, writer, encoder, skip_existing, cancel,
+                                           futures)
+                if cancel is None or not cancel.is_set():
+                    # Finished once its queued writes are, not when they are queued
+                    when_all_done(futures, report)
+                return saved
             
-            for img_file in image_files:
-                img_path = os.path.join(images_folder, img_file)
-                base_name = os.path.splitext(img_file)[0]
-                ext = os.path.splitext(img_file)[1]
-                label_ext = '.txt' if label_format == 'yolo' else '.xml'
-                label_path = os.path.join(labels_folder, base_name + label_ext)
-                
-                # Read image and label
-                img, bboxes = self.read_image_and_label(img_path, label_path, label_format)
-                if img is None:
-                    continue
-                
-                # Apply augmentation
-                if len(bboxes) > 0:
-                    bboxes_copy = bboxes.copy()
-                    aug_img, aug_bboxes = aug_obj.transform(img.copy(), bboxes_copy)
-                else:
-                    # If no bboxes, just transform the image
-                    aug_img = img.copy()
-                    aug_bboxes = np.array([]).reshape(0, 5)
-                    try:
-                        aug_img, aug_bboxes = aug_obj.transform(img.copy(), np.array([]).reshape(0, 5))
-                    except:
-                        # If augmentation fails with empty bbox, just use original image
-                        aug_img = img.copy()
-                
-                # Save augmented image with augmentation name prefix
-                output_img_name = f'{aug_name}_{base_name}{ext}'
-                output_img_path = os.path.join(output_images_folder, output_img_name)
-                cv2.imwrite(output_img_path, aug_img)
-                
-                # Save augmented label
-                output_label_name = f'{aug_name}_{base_name}{label_ext}'
-                output_label_path = os.path.join(output_labels_folder, output_label_name)
-                if label_format == 'yolo':
-                    self.save_yolo_label(aug_bboxes, aug_img.shape, output_label_path)
-                else:
-                    self.save_voc_label(aug_bboxes, aug_img.shape, output_label_path, output_img_name)
-                
-                processed_count += 1
+            if workers > 1:
+                with ThreadPoolExecutor(workers) as pool:
+                    processed_count = sum(pool.map(run, image_files))
+            else:
+                processed_count = sum(map(run, image_files))
+        self.save_annotation_caches()
         
-        return {
+        result = {
             'processed_count': processed_count,
             'output_folder': output_folder,
             'original_count': len(image_files),
             'augmented_count': len(image_files) * len(selected_augmentations),
             'total_count': len(image_files) + len(image_files) * len(selected_augmentations)
         }
+        if cancel is not None and cancel.is_set():
+            result['cancelled'] = True
+        if encoder is not None:
+            result['encode_stats'] = {
+                name: {'count': count, 'encode_ms': round(seconds / count * 1000, 3), 'bytes': nbytes}
+                for name, (count, seconds, nbytes) in encoder.stats.drain().items() if count
+            }
+        return result
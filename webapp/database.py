@@ -42,6 +42,25 @@ class Database:
             )
         ''')
         
+        # Background augmentation jobs (see job_queue.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                task_id TEXT NOT NULL,
+                output_id TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                result TEXT,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT,
+                FOREIGN KEY (task_id) REFERENCES tasks (task_id) ON DELETE CASCADE
+            )
+        ''')
+        
         conn.commit()
         conn.close()
     
@@ -146,6 +165,7 @@ class Database:
         cursor = conn.cursor()
         
         cursor.execute('DELETE FROM augmentations WHERE task_id = ?', (task_id,))
+        cursor.execute('DELETE FROM jobs WHERE task_id = ?', (task_id,))
         cursor.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
         
         conn.commit()
@@ -160,3 +180,73 @@ class Database:
         
         conn.commit()
         conn.close()
+    
+    def create_job(self, job_data):
+        """Create a queued job"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT INTO jobs (job_id, task_id, output_id, params, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (
+            job_data['job_id'],
+            job_data['task_id'],
+            job_data['output_id'],
+            json.dumps(job_data['params']),
+            job_data.get('status', 'queued'),
+            job_data['created_at']
+        ))
+        
+        conn.commit()
+        conn.close()
+    
+    def update_job(self, job_id, **fields):
+        """Set some columns of a job (result is stored as JSON)"""
+        if 'result' in fields and fields['result'] is not None:
+            fields['result'] = json.dumps(fields['result'])
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+        cursor.execute(f'UPDATE jobs SET {assignments} WHERE job_id = ?', (*fields.values(), job_id))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_job(self, job_id):
+        """Get a job by ID"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return self._job_from_row(row) if row else None
+    
+    def get_jobs(self, task_id=None, statuses=None, output_id=None):
+        """Jobs, oldest first, optionally of one task or output and/or with one of the given statuses"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        query, args = 'SELECT * FROM jobs WHERE 1 = 1', []
+        if task_id is not None:
+            query += ' AND task_id = ?'
+            args.append(task_id)
+        if output_id is not None:
+            query += ' AND output_id = ?'
+            args.append(output_id)
+        if statuses:
+            query += f' AND status IN ({", ".join("?" * len(statuses))})'
+            args.extend(statuses)
+        cursor.execute(query + ' ORDER BY created_at', args)
+        rows = cursor.fetchall()
+        conn.close()
+        return [self._job_from_row(row) for row in rows]
+    
+    @staticmethod
+    def _job_from_row(row):
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
@@ -0,0 +1,151 @@
+import time
+import uuid
+import queue
+import threading
+from datetime import datetime
+
+# Running jobs report progress to memory on every image, to the database at most this often (seconds)
+PROGRESS_INTERVAL = 1.0
+
+FINISHED_STATUSES = ('done', 'failed', 'cancelled')
+
+
+class JobQueue:
+    """Background augmentation jobs, run on `max_concurrent` worker threads and persisted in the
+    jobs table of `db`.
+
+    submit() stores a queued job and returns at once. A worker calls run_job(job, progress, cancel):
+    progress(done, total) reports source images finished and cancel is a threading.Event set by cancel().
+    run_job's return value is stored as the job's result. start() re-queues the jobs a previous
+    server left queued or running, and resume() a cancelled or failed job, so they are run again
+    (into the same output folder).
+    """
+
+    def __init__(self, db, run_job, max_concurrent=1):
+        self.db = db
+        self.run_job = run_job
+        self.max_concurrent = max(1, int(max_concurrent))
+        self._queue = queue.Queue()
+        # Live progress of running jobs: job_id -> {'done', 'total', 'start', 'saved', 'cancel', 'finished'}
+        self._live = {}
+        # Serializes status changes, so a job is never both cancelled and started
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Resume unfinished jobs and start the worker threads (once)"""
+        with self._lock:
+            if self._threads:
+                return
+            for job in self.db.get_jobs(statuses=('queued', 'running')):
+                self.db.update_job(job['job_id'], status='queued')
+                self._queue.put(job['job_id'])
+            self._threads = [threading.Thread(target=self._work, name=f'augment-job-{i}', daemon=True)
+                             for i in range(self.max_concurrent)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, task_id, output_id, params):
+        """Queue a job and return it"""
+        job_id = str(uuid.uuid4())
+        self.db.create_job({
+            'job_id': job_id,
+            'task_id': task_id,
+            'output_id': output_id,
+            'params': params,
+            'created_at': datetime.now().isoformat()
+        })
+        self._queue.put(job_id)
+        return self.get(job_id)
+
+    def cancel(self, job_id, wait=False):
+        """Cancel a queued job, or ask a running one to stop after its current images; return the job.
+        
+        With wait, a running job is waited for until it has stopped writing.
+        """
+        with self._lock:
+            job = self.db.get_job(job_id)
+            if job is None:
+                return None
+            live = self._live.get(job_id)
+            if live is not None:
+                live['cancel'].set()
+            elif job['status'] == 'queued':
+                self.db.update_job(job_id, status='cancelled', finished_at=datetime.now().isoformat())
+        if live is not None and wait:
+            live['finished'].wait()
+        return self.get(job_id)
+
+    def resume(self, job_id):
+        """Queue a cancelled or failed job again; it continues in the same output folder. Return the job"""
+        with self._lock:
+            job = self.db.get_job(job_id)
+            if job is None:
+                return None
+            if job['status'] in ('cancelled', 'failed'):
+                self.db.update_job(job_id, status='queued', error=None, finished_at=None)
+                self._queue.put(job_id)
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """The job with its live progress, throughput (source images/s) and eta (seconds, while running)"""
+        job = self.db.get_job(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            live = dict(self._live.get(job_id) or {})
+        if live:
+            job['done'], job['total'] = live['done'], live['total']
+            elapsed = time.perf_counter() - live['start']
+        elif job['started_at'] and job['finished_at']:
+            elapsed = (datetime.fromisoformat(job['finished_at']) -
+                       datetime.fromisoformat(job['started_at'])).total_seconds()
+        else:
+            elapsed = 0
+        job['throughput'] = round(job['done'] / elapsed, 2) if elapsed > 0 else None
+        job['eta'] = round((job['total'] - job['done']) / job['throughput'], 1) \
+            if live and job['throughput'] else None
+        return job
+
+    def list_jobs(self, task_id=None):
+        return [self.get(job['job_id']) for job in self.db.get_jobs(task_id=task_id)]
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self.db.get_job(job_id)
+            if job is None or job['status'] != 'queued':
+                # Cancelled (or deleted) while waiting
+                return
+            live = self._live[job_id] = {'done': 0, 'total': 0, 'start': time.perf_counter(), 'saved': 0.0,
+                                         'cancel': threading.Event(), 'finished': threading.Event()}
+            self.db.update_job(job_id, status='running', started_at=datetime.now().isoformat())
+
+        def progress(done, total):
+            now = time.perf_counter()
+            with self._lock:
+                live['done'], live['total'] = done, total
+                persist = now - live['saved'] >= PROGRESS_INTERVAL
+                if persist:
+                    live['saved'] = now
+            if persist:
+                self.db.update_job(job_id, done=done, total=total)
+
+        result, error = None, None
+        try:
+            result = self.run_job(job, progress, live['cancel'])
+            status = 'cancelled' if live['cancel'].is_set() else 'done'
+        except Exception as e:
+            status, error = 'failed', f'{type(e).__name__}: {e}'
+        with self._lock:
+            self._live.pop(job_id, None)
+            self.db.update_job(job_id, status=status, done=live['done'], total=live['total'], error=error,
+                               result=result, finished_at=datetime.now().isoformat())
+        live['finished'].set()
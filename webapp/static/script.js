@@ -182,7 +182,7 @@ async function previewAugmentation() {
             previewContainer.innerHTML = `
                 <div class="preview-item">
                     <h3>Ảnh gốc</h3>
-                    <img src="/api/preview-image/${result.original_image}" alt="Original Image">
+                    <img src="${result.original_image}" alt="Original Image">
                     <p>Số bbox: ${result.original_bbox_count}</p>
                 </div>
             `;
@@ -193,7 +193,7 @@ async function previewAugmentation() {
                 augItem.className = 'preview-item';
                 augItem.innerHTML = `
                     <h3>${aug.augmentation_name}</h3>
-                    <img src="/api/preview-image/${aug.image_path}" alt="${aug.augmentation_name}">
+                    <img src="${aug.image}" alt="${aug.augmentation_name}">
                     <p>Số bbox: ${aug.bbox_count}</p>
                 `;
                 previewContainer.appendChild(augItem);
@@ -232,9 +232,10 @@ async function applyAugmentation() {
             })
         });
         
-        const result = await response.json();
+        const job = await response.json();
         
         if (response.ok) {
+            const result = await waitForJob(job.job_id);
             currentOutputId = result.output_id;
             
             // Show results
@@ -259,10 +260,10 @@ async function applyAugmentation() {
             // Reload task history
             loadTaskHistory();
         } else {
-            showError(result.error);
+            showError(job.error);
         }
     } catch (error) {
-        showError('Lỗi khi áp dụng augmentation');
+        showError(error.message || 'Lỗi khi áp dụng augmentation');
     } finally {
         showLoading(false);
     }
@@ -392,16 +393,17 @@ async function applyReaugmentation() {
             })
         });
         
-        const result = await response.json();
+        const job = await response.json();
         
         if (response.ok) {
+            const result = await waitForJob(job.job_id);
             showSuccess(`Đã xử lý thành công ${result.processed_count} ảnh`);
             loadTaskHistory();
         } else {
-            showError(result.error);
+            showError(job.error);
         }
     } catch (error) {
-        showError('Lỗi khi áp dụng augmentation');
+        showError(error.message || 'Lỗi khi áp dụng augmentation');
     } finally {
         showLoading(false);
     }
@@ -443,6 +445,42 @@ function closeModal() {
 // UI Helper functions
 function showLoading(show) {
     document.getElementById('loading').style.display = show ? 'flex' : 'none';
+    if (!show) {
+        document.querySelector('#loading p').textContent = 'Đang xử lý...';
+    }
+}
+
+// Poll an augment job until it finishes, showing its progress; returns the job result
+async function waitForJob(jobId) {
+    const loadingText = document.querySelector('#loading p');
+    
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`);
+        const job = await response.json();
+        
+        if (!response.ok) {
+            throw new Error(job.error);
+        }
+        if (job.status === 'done') {
+            return { output_id: job.output_id, ...job.result };
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error || 'Lỗi khi áp dụng augmentation');
+        }
+        if (job.status === 'cancelled') {
+            throw new Error('Job đã bị hủy');
+        }
+        
+        if (job.status === 'queued') {
+            loadingText.textContent = 'Đang chờ trong hàng đợi...';
+        } else if (job.total > 0) {
+            const eta = job.eta !== null ? ` - còn khoảng ${Math.ceil(job.eta)}s` : '';
+            const speed = job.throughput !== null ? ` (${job.throughput} ảnh/s)` : '';
+            loadingText.textContent = `Đang xử lý ${job.done}/${job.total}${speed}${eta}`;
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
 }
 
 function showSuccess(message) {
@@ -0,0 +1,127 @@
+import os
+import time
+import zipfile
+
+# Already compressed formats are stored as is, deflating them costs CPU for ~0% gain
+STORED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.zip', '.tar', '.npz'}
+
+CHUNK_SIZE = 1024 * 1024
+
+# A .part file not written for this long was left by a stream that died (or stalled), and is
+# taken over by the next download
+STALE_PART_SECONDS = 600
+
+
+class _ChunkWriter:
+    """Unseekable file object that collects written bytes until the generator takes them"""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_folder(folder):
+    """(path, arcname) of every file under folder, in a stable order"""
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            yield path, os.path.relpath(path, folder)
+
+
+def remove_partial_archives(folder):
+    """Delete the .part files under folder, left by streams of a previous run"""
+    for name in os.listdir(folder):
+        if name.endswith('.part'):
+            try:
+                os.remove(os.path.join(folder, name))
+            except FileNotFoundError:
+                pass
+
+
+def _open_part(part_path):
+    """part_path opened for writing by this stream only, or None while another stream writes it"""
+    try:
+        return open(part_path, 'xb')
+    except FileExistsError:
+        pass
+    try:
+        if time.time() - os.path.getmtime(part_path) < STALE_PART_SECONDS:
+            return None
+        os.remove(part_path)
+    except FileNotFoundError:
+        pass
+    try:
+        return open(part_path, 'xb')
+    except FileExistsError:
+        return None
+
+
+def _still_owns(part_path, f):
+    """False once the .part file was taken over or removed by someone else"""
+    try:
+        return os.path.samestat(os.stat(part_path), os.fstat(f.fileno()))
+    except FileNotFoundError:
+        return False
+
+
+def stream_zip(folder, tee_path=None, is_current=None):
+    """Yield a ZIP archive of folder chunk by chunk, while it is built.
+
+    Images are ZIP_STORED, other files (labels) deflated. With tee_path the archive is also
+    written there, and only kept when the whole archive was generated and is_current() (if
+    given) still holds, i.e. folder did not change meanwhile. Only one stream at a
+    time writes tee_path (others just stream), so concurrent downloads don't each use disk;
+    a tee_path.part left behind is taken over once it is STALE_PART_SECONDS old.
+    """
+    writer = _ChunkWriter()
+    part_path = tee_path + '.part' if tee_path else None
+    tee = _open_part(part_path) if part_path else None
+
+    def take():
+        data = writer.take()
+        if tee is not None:
+            tee.write(data)
+        return data
+
+    complete = False
+    try:
+        with zipfile.ZipFile(writer, 'w', allowZip64=True) as zf:
+            for path, arcname in iter_folder(folder):
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                stored = os.path.splitext(path)[1].lower() in STORED_EXTENSIONS
+                info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+                with open(path, 'rb') as src, zf.open(info, 'w', force_zip64=info.file_size >= 2 ** 31) as dst:
+                    for block in iter(lambda: src.read(CHUNK_SIZE), b''):
+                        dst.write(block)
+                        if writer.chunks:
+                            yield take()
+                if writer.chunks:
+                    yield take()
+        # Central directory, written on close
+        yield take()
+        complete = True
+    finally:
+        if tee is not None:
+            owned = _still_owns(part_path, tee)
+            tee.close()
+            if owned and complete and (is_current is None or is_current()):
+                os.replace(part_path, tee_path)
+            elif owned:
+                os.remove(part_path)